@@ -2,6 +2,7 @@ import glob
 import json
 import multiprocessing as mp
 import os
+import shutil
 import subprocess
 
 import const
@@ -64,29 +65,24 @@ def get_project_head_status_data(collect_random=False):
 def get_project_commit_hist_helper(project, github_url, overwrite=True):
     # clone repo
     trunk = os.path.join(const.REPOBUFDIR, f"{project}_trunk")
-    current_dir = os.path.dirname(os.path.realpath(__file__))
     if not os.path.exists(trunk):
         slug = get_slug_from_github_url(github_url)
         link = GITHUB_HTTP_URL.format(slug=slug)
-        os.chdir(const.REPOBUFDIR)
         try:
-            subprocess.check_output(f"git clone {link} {project}_trunk", timeout=60, shell=True)
+            subprocess.run(["git", "clone", link, f"{project}_trunk"], cwd=const.REPOBUFDIR, timeout=60, check=True, capture_output=True)
         except Exception as e:
             print("[ERROR] UNABLE TO CLONE", project, e)
-        os.chdir(current_dir)
 
     if os.path.exists(trunk):
         # get a list of commits
-        os.chdir(trunk)
         output = ""
         try:
             output = subprocess.check_output(
-                "git log --since=\"2024-01-01\" --pretty=format:\"%H,%at,%as\"",
-                shell=True)
+                ["git", "log", "--since=2024-01-01", "--pretty=format:%H,%at,%as"],
+                cwd=trunk)
             output = output.decode("utf-8", errors="ignore")
         except Exception as e:
             print("[ERROR] UNABLE TO GET COMMIT SHAS", e)
-        os.chdir(current_dir)
         print(project, github_url, "output length", len(output))
 
         # save commit history into csv
@@ -100,7 +96,7 @@ def get_project_commit_hist_helper(project, github_url, overwrite=True):
                     f.write(output + "\n")
 
         # remove repo
-        os.system(f"rm -rf {trunk}")
+        shutil.rmtree(trunk, ignore_errors=True)
     pass
 
 
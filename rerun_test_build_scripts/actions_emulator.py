@@ -0,0 +1,550 @@
+"""Local stand-in for the GitHub API and GitHub Actions, to run the rerun scripts against local forks.
+
+Repos (forks and their upstreams) are bare repos under {root}/repos/{slug}.git, which the scripts
+clone and push to once local_const.GITHUB_SSH_URL points at them. Every push to a branch starts one
+workflow run per workflow file of the pushed commit. Runs are listed after a registration delay,
+wait in a queue while the fork has max_concurrent_runs runs in progress, and complete after the
+duration of the original build in lite_test_run_metadata.csv (found from the `run_id=` commit
+message) times time_scale, with the conclusion of the original build. Durations, conclusions,
+logs and test reports only depend on the build, the workflow and the seed.
+
+The API serves what the rerun scripts use: listing runs (branch, head_sha, status filters, ETags),
+run logs, jobs and job logs, test report artifacts, cancelling runs and /rate_limit. Each token
+has rate_limit requests per rate_limit_window seconds, after which requests get 403 like on GitHub.
+If webhook_port is set, workflow_run events are posted to the run_watcher receiver on that port.
+
+Usage:
+    python3 actions_emulator.py add ROOT SLUG SOURCE_REPO
+    python3 actions_emulator.py serve ROOT PORT [TIME_SCALE]
+then run the scripts with RERUN_GITHUB_API_URL=http://127.0.0.1:PORT,
+RERUN_GITHUB_CLONE_URL=ROOT/repos/{slug}.git and RERUN_GITHUB_TOKENS set to any token.
+"""
+
+import datetime
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import compact_test_report
+import local_const
+import local_utils
+import process_runner
+import rerun_journal
+import run_watcher
+
+# Duration of builds missing from the dataset, in seconds before time_scale.
+DEFAULT_DURATION = 600
+# GitHub Actions jobs are cancelled after 6 hours.
+MAX_DURATION = 6 * 3600
+NUM_TESTS = 20
+SCAN_INTERVAL = 0.2
+GITHUB_RATE_LIMIT = 5000
+
+
+def now_string() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def load_builds(dataset_file: str=os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv")) -> Dict[int, dict]:
+    """Duration in seconds and conclusion of the builds of the dataset, by run_id."""
+    if not os.path.exists(dataset_file):
+        return {}
+    builds = {}
+    for build in pd.read_csv(dataset_file).to_dict("records"):
+        started_at = local_utils.timestring_to_timestamp(build["run_started_at"]).timestamp()
+        updated_at = local_utils.timestring_to_timestamp(build["run_updated_at"]).timestamp()
+        builds[int(build["run_id"])] = {
+            "duration": min(max(updated_at - started_at, 1), MAX_DURATION),
+            "conclusion": build["run_conclusion"],
+        }
+    return builds
+
+
+def get_repo_dir(root: str, slug: str) -> str:
+    return os.path.join(root, "repos", f"{slug}.git")
+
+
+def add_repo(root: str, slug: str, source: str) -> str:
+    """Create the bare repo of slug as a copy of the source repo, with all its branches."""
+    repo_dir = get_repo_dir(root, slug)
+    process_runner.remove(repo_dir)
+    os.makedirs(os.path.dirname(repo_dir), exist_ok=True)
+    process_runner.run(["git", "clone", "--bare", source, repo_dir])
+    # Let the scripts make blobless partial clones, as from GitHub.
+    process_runner.git(repo_dir, ["config", "uploadpack.allowFilter", "true"])
+    process_runner.git(repo_dir, ["config", "uploadpack.allowAnySHA1InWant", "true"])
+    return repo_dir
+
+
+class Emulator:
+    def __init__(
+            self,
+            root: str,
+            builds: Dict[int, dict]=None,
+            time_scale: float=0.01,
+            max_concurrent_runs: int=20,
+            registration_delay: float=1.0,
+            rate_limit: int=GITHUB_RATE_LIMIT,
+            rate_limit_window: float=3600,
+            webhook_port: int=None,
+            seed: int=0,
+            ) -> None:
+        """
+        builds: durations and conclusions of the original builds, load_builds() by default
+        time_scale: emulated duration of a run per second of the original build
+        max_concurrent_runs: runs in progress per fork, later runs are queued
+        registration_delay: seconds before a pushed run is listed
+        rate_limit: API requests per token per rate_limit_window seconds
+        webhook_port: port of a run_watcher.WebhookReceiver to post workflow_run events to
+        """
+        self.root = root
+        self.builds = load_builds() if builds is None else builds
+        self.time_scale = time_scale
+        self.max_concurrent_runs = max_concurrent_runs
+        self.registration_delay = registration_delay
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.webhook_port = webhook_port
+        self.seed = seed
+        self.base_url = None
+        self.lock = threading.Lock()
+        # run id -> run as listed by the API, and the emulation state of each run.
+        self.runs = {}
+        self.states = {}
+        self.next_id = 1
+        # (repo dir, branch) -> head sha at the last scan.
+        self.heads = {}
+        # token -> (window start, requests in window)
+        self.token_usage = {}
+        self.stats = {"pushes": 0, "runs": 0, "completed": 0, "cancelled": 0, "requests": 0, "not_modified": 0, "rate_limited": 0}
+        self.started_at = time.time()
+        self.stopped = threading.Event()
+        os.makedirs(os.path.join(root, "repos"), exist_ok=True)
+        # Pushes made before the emulator started do not start runs.
+        self.scan_pushes(start_runs=False)
+
+    def get_repos(self) -> Dict[str, str]:
+        """slug -> bare repo dir."""
+        repos = {}
+        repos_dir = os.path.join(self.root, "repos")
+        for owner in os.listdir(repos_dir):
+            if not os.path.isdir(os.path.join(repos_dir, owner)):
+                continue
+            for name in os.listdir(os.path.join(repos_dir, owner)):
+                if name.endswith(".git"):
+                    repos[f"{owner}/{name[:-len('.git')]}"] = os.path.join(repos_dir, owner, name)
+        return repos
+
+    def scan_pushes(self, start_runs: bool=True) -> None:
+        for slug, repo_dir in self.get_repos().items():
+            refs = process_runner.git(repo_dir, ["for-each-ref", "--format=%(refname:short) %(objectname)", "refs/heads"])
+            for line in refs.splitlines():
+                branch, sha = line.split(" ")
+                if self.heads.get((repo_dir, branch)) == sha:
+                    continue
+                self.heads[(repo_dir, branch)] = sha
+                if start_runs:
+                    self.start_push_runs(slug, repo_dir, branch, sha)
+
+    def get_workflows(self, repo_dir: str, sha: str) -> List[dict]:
+        listing = process_runner.git(repo_dir, ["ls-tree", "--name-only", sha, f"{local_const.GITHUB_WORKFLOW_DIR}/"], check=False)
+        workflows = []
+        for path in listing.splitlines():
+            if not path.endswith((".yml", ".yaml")):
+                continue
+            content = process_runner.git(repo_dir, ["show", f"{sha}:{path}"])
+            match = re.search(r"^name:\s*['\"]?(.*?)['\"]?\s*$", content, re.MULTILINE)
+            name = match.group(1) if match else os.path.splitext(os.path.basename(path))[0]
+            workflows.append({"name": name, "path": path, "compact": compact_test_report.SCRIPT_PATH in content})
+        return workflows
+
+    def start_push_runs(self, slug: str, repo_dir: str, branch: str, sha: str) -> None:
+        title = process_runner.git(repo_dir, ["log", "-1", "--format=%s", sha])
+        workflows = self.get_workflows(repo_dir, sha)
+        events = []
+        with self.lock:
+            self.stats["pushes"] += 1
+            for workflow in workflows:
+                run_id = self.next_id
+                self.next_id += 1
+                run = {
+                    "id": run_id,
+                    "name": workflow["name"],
+                    "display_title": title,
+                    "path": workflow["path"],
+                    "head_branch": branch,
+                    "head_sha": sha,
+                    "event": "push",
+                    "status": "queued",
+                    "conclusion": None,
+                    "run_attempt": 1,
+                    "created_at": now_string(),
+                    "updated_at": now_string(),
+                    "run_started_at": now_string(),
+                    "html_url": f"{self.base_url}/{slug}/actions/runs/{run_id}",
+                    "repository": {"full_name": slug},
+                    "head_repository": {"full_name": slug},
+                }
+                duration, conclusion = self.get_outcome(run)
+                self.runs[run_id] = run
+                self.states[run_id] = {
+                    "slug": slug,
+                    "listed_at": time.time() + self.registration_delay,
+                    "duration": duration,
+                    "conclusion": conclusion,
+                    "compact": workflow["compact"],
+                    "end_at": None,
+                }
+                self.stats["runs"] += 1
+                events.append((slug, dict(run), "requested"))
+        self.send_events(events)
+
+    def get_outcome(self, run: dict) -> tuple:
+        """Emulated duration and conclusion of a run, from its original build."""
+        try:
+            build = self.builds.get(rerun_journal.get_origin_run_id(run))
+        except ValueError:
+            build = None
+        rng = random.Random(f"{self.seed} {run['display_title']} {run['name']}")
+        duration = build["duration"] if build is not None else DEFAULT_DURATION
+        conclusion = build["conclusion"] if build is not None else "success"
+        # Orders of a build take slightly different times.
+        return duration * rng.uniform(0.9, 1.1) * self.time_scale, conclusion
+
+    def advance(self) -> None:
+        """Start queued runs where a fork has room, and complete finished runs."""
+        events = []
+        now = time.time()
+        with self.lock:
+            in_progress = {}
+            for run_id, run in self.runs.items():
+                state = self.states[run_id]
+                if run["status"] == "in_progress" and now >= state["end_at"]:
+                    run.update({"status": "completed", "conclusion": state["conclusion"], "updated_at": now_string()})
+                    self.stats["completed"] += 1
+                    events.append((state["slug"], dict(run), "completed"))
+                if run["status"] == "in_progress":
+                    in_progress[state["slug"]] = in_progress.get(state["slug"], 0) + 1
+            for run_id in sorted(self.runs):
+                run, state = self.runs[run_id], self.states[run_id]
+                if run["status"] != "queued" or now < state["listed_at"]:
+                    continue
+                if in_progress.get(state["slug"], 0) >= self.max_concurrent_runs:
+                    continue
+                in_progress[state["slug"]] = in_progress.get(state["slug"], 0) + 1
+                state["end_at"] = now + state["duration"]
+                run.update({"status": "in_progress", "run_started_at": now_string(), "updated_at": now_string()})
+                events.append((state["slug"], dict(run), "in_progress"))
+        self.send_events(events)
+
+    def send_events(self, events: List[tuple]) -> None:
+        if self.webhook_port is None:
+            return
+        for slug, run, action in events:
+            try:
+                run_watcher.send_workflow_run_event(self.webhook_port, slug, run, action, local_const.WEBHOOK_SECRET)
+            except OSError as e:
+                print(f"[emulator] Failed to send {action} event of {run['id']}: {e}")
+
+    def loop(self) -> None:
+        while not self.stopped.is_set():
+            self.scan_pushes()
+            self.advance()
+            self.stopped.wait(SCAN_INTERVAL)
+
+    def cancel(self, run_id: int) -> bool:
+        with self.lock:
+            run = self.runs.get(run_id)
+            if run is None or run["status"] == "completed":
+                return False
+            run.update({"status": "completed", "conclusion": "cancelled", "updated_at": now_string()})
+            self.stats["cancelled"] += 1
+            event = (self.states[run_id]["slug"], dict(run), "completed")
+        self.send_events([event])
+        return True
+
+    def use_token(self, token: str) -> bool:
+        """Count a request of token, return False if it is over the rate limit."""
+        with self.lock:
+            window_start, used = self.token_usage.get(token, (time.time(), 0))
+            if time.time() - window_start >= self.rate_limit_window:
+                window_start, used = time.time(), 0
+            if used >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return False
+            self.token_usage[token] = (window_start, used + 1)
+            return True
+
+    def get_rate_limit(self, token: str) -> dict:
+        with self.lock:
+            window_start, used = self.token_usage.get(token, (time.time(), 0))
+            if time.time() - window_start >= self.rate_limit_window:
+                window_start, used = time.time(), 0
+        core = {"limit": self.rate_limit, "remaining": self.rate_limit - used, "reset": int(window_start + self.rate_limit_window), "used": used}
+        return {"resources": {"core": core}, "rate": core}
+
+    def list_runs(self, slug: str, params: dict) -> dict:
+        now = time.time()
+        with self.lock:
+            runs = [
+                dict(run) for run_id, run in sorted(self.runs.items(), reverse=True)
+                if self.states[run_id]["slug"] == slug and now >= self.states[run_id]["listed_at"]
+            ]
+        if "branch" in params:
+            runs = [run for run in runs if run["head_branch"] == params["branch"]]
+        if "head_sha" in params:
+            runs = [run for run in runs if run["head_sha"] == params["head_sha"]]
+        if "status" in params:
+            runs = [run for run in runs if params["status"] in [run["status"], run["conclusion"]]]
+        per_page = int(params.get("per_page", 30))
+        page = int(params.get("page", 1))
+        return {"total_count": len(runs), "workflow_runs": runs[(page - 1) * per_page:page * per_page]}
+
+    def get_completed_run(self, slug: str, run_id: int) -> dict:
+        with self.lock:
+            run = self.runs.get(run_id)
+            if run is None or self.states[run_id]["slug"] != slug or run["status"] != "completed":
+                return None
+            return dict(run)
+
+    def get_steps(self, run: dict) -> List[dict]:
+        """Steps of the job of a completed run, spread over its duration."""
+        started_at = local_utils.timestring_to_timestamp(run["run_started_at"])
+        updated_at = local_utils.timestring_to_timestamp(run["updated_at"])
+        step_names = ["Set up job", "Install packages", "Restore pytest-ranking cache", "Run tests", "Save pytest-ranking cache", "Complete job"]
+        step_time = (updated_at - started_at) / len(step_names)
+        steps = []
+        for i, name in enumerate(step_names):
+            steps.append({
+                "name": name,
+                "number": i + 1,
+                "status": "completed",
+                "conclusion": run["conclusion"] if name == "Run tests" else "success",
+                "started_at": (started_at + step_time * i).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "completed_at": (started_at + step_time * (i + 1)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            })
+        return steps
+
+    def get_job_log(self, run: dict) -> str:
+        rng = random.Random(f"{self.seed} {run['display_title']} {run['name']} log")
+        lines = []
+        for step in self.get_steps(run):
+            timestamp = step["started_at"][:-1] + ".0000000Z"
+            lines.append(f"{timestamp} ##[group]Run {step['name']}")
+            if step["name"] == "Run tests":
+                lines.append(f"{timestamp} test order compute time (s): {rng.uniform(0.1, 2):.3f}")
+                lines.append(f"{timestamp} feature collection time (s): {rng.uniform(0.1, 2):.3f}")
+                lines.append(f"{timestamp} {NUM_TESTS} tests, {run['conclusion']}")
+            if step["name"] == "Save pytest-ranking cache":
+                lines.append(f"{timestamp} Cache Size: ~0 MB ({rng.randint(1000, 100000)} B)")
+            lines.append(f"{timestamp} ##[endgroup]")
+        return "\n".join(lines) + "\n"
+
+    def get_run_log(self, run: dict) -> bytes:
+        """Log zip of a run, laid out like GitHub's: the job log at the root, step logs in a folder per job."""
+        log_lines = self.get_job_log(run).splitlines(keepends=True)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            zip_ref.writestr("0_default.txt", "".join(log_lines))
+            for step in self.get_steps(run):
+                step_lines = [line for line in log_lines if line[:19] == step["started_at"][:19]]
+                zip_ref.writestr(f"default/{step['number']}_{step['name']}.txt", "".join(step_lines))
+        return buffer.getvalue()
+
+    def get_test_report(self, run: dict, order: str) -> dict:
+        rng = random.Random(f"{self.seed} {run['display_title']} {order} report")
+        tests = []
+        for i in range(NUM_TESTS):
+            failed = run["conclusion"] == "failure" and i == 0
+            tests.append({
+                "nodeid": f"tests/test_emulated.py::test_{i}",
+                "outcome": "failed" if failed else "passed",
+                "setup": {"duration": rng.uniform(0, 0.01), "outcome": "passed"},
+                "call": {"duration": rng.uniform(0, 1), "outcome": "failed" if failed else "passed"},
+                "teardown": {"duration": rng.uniform(0, 0.01), "outcome": "passed"},
+            })
+        rng.shuffle(tests)
+        num_failed = sum(test["outcome"] == "failed" for test in tests)
+        summary = {"passed": NUM_TESTS - num_failed, "total": NUM_TESTS, "collected": NUM_TESTS}
+        if num_failed:
+            summary["failed"] = num_failed
+        return {"duration": sum(test["call"]["duration"] for test in tests), "summary": summary, "tests": tests}
+
+    def get_artifacts(self, run: dict) -> List[dict]:
+        if run["conclusion"] not in ["success", "failure"]:
+            return []
+        orders = local_const.CI_WORKFLOW_NAMES if run["name"] == local_const.WF_ALL_ORDERS else [run["name"]]
+        artifacts = []
+        for i, order in enumerate(orders):
+            name = local_const.ORDER_ARTIFACT_NAME.format(order=order) if run["name"] == local_const.WF_ALL_ORDERS else local_const.ARTIFACT_NAME
+            # Artifact ids encode the run and the order.
+            artifact_id = run["id"] * 100 + i
+            artifacts.append({
+                "id": artifact_id,
+                "name": name,
+                "archive_download_url": f"{self.base_url}/repos/{run['repository']['full_name']}/actions/artifacts/{artifact_id}/zip",
+                "expired": False,
+                "workflow_run": {"id": run["id"], "head_branch": run["head_branch"], "head_sha": run["head_sha"]},
+            })
+        return artifacts
+
+    def get_artifact_zip(self, slug: str, artifact_id: int) -> bytes:
+        run = self.get_completed_run(slug, artifact_id // 100)
+        if run is None:
+            return None
+        orders = local_const.CI_WORKFLOW_NAMES if run["name"] == local_const.WF_ALL_ORDERS else [run["name"]]
+        if artifact_id % 100 >= len(orders):
+            return None
+        report = self.get_test_report(run, orders[artifact_id % 100])
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            if self.states[run["id"]]["compact"]:
+                zip_ref.writestr(compact_test_report.COMPACT_REPORT_FILE_NAME, compact_test_report.compact_report(report))
+            else:
+                zip_ref.writestr(compact_test_report.REPORT_FILE_NAME, json.dumps(report))
+        return buffer.getvalue()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        minutes = (time.time() - self.started_at) / 60
+        stats["completed_per_minute"] = stats["completed"] / minutes if minutes > 0 else 0
+        return stats
+
+    def handle(self, method: str, path: str, params: dict, headers) -> tuple:
+        """Answer an API request, return (status, body, extra headers)."""
+        if path == "/_emulator/stats":
+            return 200, self.get_stats(), {}
+        token = headers.get("Authorization", "anonymous")
+        if path == "/rate_limit":
+            return 200, self.get_rate_limit(token), {}
+        if not self.use_token(token):
+            return 403, {"message": "API rate limit exceeded for user."}, {}
+        with self.lock:
+            self.stats["requests"] += 1
+        match = re.match(r"^/repos/([^/]+/[^/]+)/actions/(runs|jobs|artifacts)(?:/(\d+))?(?:/(\w+))?$", path)
+        if match is None:
+            return 404, {"message": "Not Found"}, {}
+        slug, kind, item_id, action = match.group(1), match.group(2), match.group(3), match.group(4)
+        item_id = int(item_id) if item_id is not None else None
+        if method == "POST":
+            if kind == "runs" and action == "cancel":
+                return (202, {}, {}) if self.cancel(item_id) else (409, {"message": "Cannot cancel a workflow run that is completed."}, {})
+            return 404, {"message": "Not Found"}, {}
+        if kind == "runs" and item_id is None:
+            return 200, self.list_runs(slug, params), {}
+        if kind == "artifacts" and action == "zip":
+            artifact = self.get_artifact_zip(slug, item_id)
+            return (200, artifact, {"Content-Type": "application/zip"}) if artifact is not None else (404, {"message": "Not Found"}, {})
+        if kind == "runs" and action is None:
+            with self.lock:
+                run = self.runs.get(item_id)
+                run = dict(run) if run is not None and self.states[item_id]["slug"] == slug else None
+            return (200, run, {}) if run is not None else (404, {"message": "Not Found"}, {})
+        # Logs, jobs and artifacts are there once the run is completed, job ids are the run ids.
+        run = self.get_completed_run(slug, item_id)
+        if run is None:
+            return 404, {"message": "Not Found"}, {}
+        if kind == "runs" and action == "logs":
+            return 200, self.get_run_log(run), {"Content-Type": "application/zip"}
+        if kind == "runs" and action == "artifacts":
+            artifacts = self.get_artifacts(run)
+            return 200, {"total_count": len(artifacts), "artifacts": artifacts}, {}
+        if kind == "runs" and action == "jobs":
+            job = {"id": run["id"], "run_id": run["id"], "name": "default", "status": "completed", "conclusion": run["conclusion"], "steps": self.get_steps(run)}
+            return 200, {"total_count": 1, "jobs": [job]}, {}
+        if kind == "jobs" and action == "logs":
+            return 200, self.get_job_log(run).encode("utf-8"), {"Content-Type": "text/plain"}
+        return 404, {"message": "Not Found"}, {}
+
+    def start(self, port: int=0) -> "Emulator":
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self, method: str) -> None:
+                if method == "POST":
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                url = urllib.parse.urlparse(self.path)
+                params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+                status, body, headers = emulator.handle(method, url.path, params, self.headers)
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                    headers["Content-Type"] = "application/json"
+                    if status == 200 and method == "GET":
+                        # Conditional requests, as used by run_watcher, get 304 while nothing changed.
+                        etag = '"' + hashlib.sha256(body).hexdigest() + '"'
+                        headers["ETag"] = etag
+                        if self.headers.get("If-None-Match") == etag:
+                            with emulator.lock:
+                                emulator.stats["not_modified"] += 1
+                            self.send_response(304)
+                            self.send_header("ETag", etag)
+                            self.end_headers()
+                            return
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond("GET")
+
+            def do_POST(self):
+                self.respond("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self.loop, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) == 4 and args[0] == "add":
+        print(f"[emulator] Created {add_repo(args[1], args[2], args[3])}")
+    elif len(args) in [3, 4] and args[0] == "serve":
+        emulator = Emulator(args[1], time_scale=float(args[3]) if len(args) == 4 else 0.01, webhook_port=local_const.WEBHOOK_PORT).start(int(args[2]))
+        print(f"[emulator] Serving at {emulator.base_url}, use:")
+        print(f"export RERUN_GITHUB_API_URL={emulator.base_url}")
+        print(f"export RERUN_GITHUB_CLONE_URL={os.path.abspath(args[1])}/repos/{{slug}}.git")
+        print("export RERUN_GITHUB_TOKENS=emulated")
+        try:
+            while True:
+                time.sleep(60)
+                print(f"[emulator] {emulator.get_stats()}")
+        except KeyboardInterrupt:
+            emulator.stop()
+    else:
+        exit(
+            "Invalid command, example commands: python3 actions_emulator.py add emulator owner/fork ./fork_repo, "
+            + "python3 actions_emulator.py serve emulator 8900 0.01"
+        )
@@ -0,0 +1,186 @@
+"""Atomic writes of downloaded artifacts, with a per-directory manifest of their sizes and checksums.
+
+Files are written to a temp file and renamed into place, so a crash never leaves a truncated
+artifact under its final name. Each directory keeps an append-only `.manifest.jsonl`, used to
+tell complete downloads from files written before the manifest existed or modified since.
+
+Usage: python3 artifact_manifest.py verify|repair DIR [DIR ...]
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import zipfile
+
+MANIFEST_FILE = ".manifest.jsonl"
+TEMP_SUFFIX = ".tmp"
+
+LOCK = threading.Lock()
+# Loaded manifests, directory -> {file name: entry}.
+MANIFESTS = {}
+
+
+def get_checksum(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_manifest(directory: str) -> dict:
+    directory = os.path.abspath(directory)
+    with LOCK:
+        if directory not in MANIFESTS:
+            manifest = {}
+            manifest_file = os.path.join(directory, MANIFEST_FILE)
+            if os.path.exists(manifest_file):
+                with open(manifest_file, "r") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # A crash mid-append leaves at most one broken last line.
+                            continue
+                        if entry.get("deleted"):
+                            manifest.pop(entry["name"], None)
+                        else:
+                            manifest[entry["name"]] = entry
+            MANIFESTS[directory] = manifest
+        return MANIFESTS[directory]
+
+
+def append_manifest_entries(directory: str, entries: list) -> None:
+    directory = os.path.abspath(directory)
+    manifest = load_manifest(directory)
+    with LOCK:
+        with open(os.path.join(directory, MANIFEST_FILE), "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+                if entry.get("deleted"):
+                    manifest.pop(entry["name"], None)
+                else:
+                    manifest[entry["name"]] = entry
+
+
+def make_entry(path: str, checksum: str=None) -> dict:
+    stat = os.stat(path)
+    return {
+        "name": os.path.basename(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": checksum if checksum is not None else get_checksum(path),
+    }
+
+
+def atomic_write(path: str, data) -> None:
+    """Write str or bytes to path via a temp file and rename, then record it in the manifest."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    content = data.encode("utf-8") if isinstance(data, str) else data
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}{TEMP_SUFFIX}"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    append_manifest_entries(directory, [make_entry(path, hashlib.sha256(content).hexdigest())])
+
+
+def atomic_write_json(path: str, info) -> None:
+    atomic_write(path, json.dumps(info, indent=2))
+
+
+def is_complete(path: str) -> bool:
+    """Whether a download can be skipped.
+
+    Files in the manifest must still have their recorded size, files predating the manifest
+    are trusted here and left to `verify` to check.
+    """
+    if not os.path.exists(path):
+        return False
+    entry = load_manifest(os.path.dirname(os.path.abspath(path))).get(os.path.basename(path))
+    if entry is None:
+        return True
+    return os.path.getsize(path) == entry["size"]
+
+
+def is_valid_content(path: str) -> bool:
+    """Check files without a manifest entry by parsing them according to their type."""
+    if os.path.getsize(path) == 0:
+        return False
+    try:
+        if path.endswith(".json"):
+            with open(path, "r") as f:
+                json.load(f)
+        elif path.endswith(".zip"):
+            with zipfile.ZipFile(path) as zip_ref:
+                return zip_ref.testzip() is None
+    except (ValueError, zipfile.BadZipFile, OSError):
+        return False
+    return True
+
+
+def verify_directory(directory: str, repair: bool=False) -> dict:
+    """Recheck the suspicious files of a directory: without manifest entry, or changed since recorded.
+
+    With repair, corrupt files and leftover temp files are deleted so the next download refetches them,
+    and valid files predating the manifest are added to it.
+    """
+    manifest = load_manifest(directory)
+    result = {"ok": 0, "rechecked": 0, "corrupt": [], "temp": [], "missing": []}
+    new_entries = []
+    names = set()
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name == MANIFEST_FILE or not os.path.isfile(path):
+            continue
+        if name.endswith(TEMP_SUFFIX):
+            result["temp"].append(path)
+            continue
+        names.add(name)
+        entry = manifest.get(name)
+        stat = os.stat(path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            result["ok"] += 1
+            continue
+        result["rechecked"] += 1
+        if entry is not None:
+            is_valid = entry["size"] == stat.st_size and get_checksum(path) == entry["sha256"]
+        else:
+            is_valid = is_valid_content(path)
+        if is_valid:
+            new_entries.append(make_entry(path))
+        else:
+            result["corrupt"].append(path)
+    result["missing"] = [os.path.join(directory, name) for name in manifest if name not in names]
+
+    if repair:
+        for path in result["temp"] + result["corrupt"]:
+            os.remove(path)
+        new_entries += [{"name": os.path.basename(path), "deleted": True} for path in result["corrupt"] + result["missing"]]
+        if len(new_entries) > 0:
+            append_manifest_entries(directory, new_entries)
+    return result
+
+
+def runner_verify(paths: list, repair: bool=False) -> None:
+    for path in paths:
+        for directory, _, _ in os.walk(path):
+            result = verify_directory(directory, repair)
+            if result["rechecked"] + len(result["temp"]) + len(result["missing"]) == 0:
+                continue
+            print(
+                f"[manifest] {directory}: ok {result['ok']}, rechecked {result['rechecked']}, "
+                + f"corrupt {len(result['corrupt'])}, temp {len(result['temp'])}, missing {len(result['missing'])}"
+            )
+            for file in result["corrupt"]:
+                print(f"[manifest] {'removed' if repair else 'corrupt'}: {file}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ["verify", "repair"]:
+        exit("Invalid command, example command: python3 artifact_manifest.py verify download_repo_data")
+    runner_verify(sys.argv[2:], repair=sys.argv[1] == "repair")
@@ -0,0 +1,170 @@
+"""Pick the builds of a project to rerun under a budget of runner minutes, covering as many failed builds as possible.
+
+Each failed build needs the builds before it back to the last success build (its baseline, whose
+rerun starts the pytest-ranking cache the failed build is ranked with). Failed builds are added
+one at a time, always the one whose missing builds cost the fewest minutes, until the next one
+does not fit in the budget. The selected builds are rerun in time order.
+
+The minutes of a build are estimated per order job:
+- from earlier reruns of the project, if any: the job setup time plus the build's test count
+  (that of the nearest rerun build) times the time per test,
+- otherwise from the duration of the build in history.
+
+Usage: python3 budget_planner.py PROJECT BUDGET_MINUTES
+"""
+
+import json
+import os
+import statistics
+import sys
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import local_utils
+import snapshot_dedup
+
+PARSED_RERUN_METADATA = os.path.join(script_dir, "eval_results", "parsed_rerun_results", "rerun_metadata.csv")
+# GitHub Actions jobs are cancelled after 6 hours, longer durations in history include re-runs.
+MAX_JOB_MINUTES = 360
+
+
+def get_minutes(started_at: str, updated_at: str) -> float:
+    seconds = local_utils.timestring_to_timestamp(updated_at).timestamp() - local_utils.timestring_to_timestamp(started_at).timestamp()
+    return min(max(seconds / 60, 0), MAX_JOB_MINUTES)
+
+
+def load_rerun_stats(project: str, workflowrun_dir: str, parsed_file: str=PARSED_RERUN_METADATA) -> dict:
+    """Test counts of the rerun builds of a project, seconds per test, and minutes of a job outside of pytest.
+
+    Test counts and pytest durations come from the parsed rerun results, job durations from the run metadata.
+    """
+    stats = {"tests": {}, "seconds_per_test": None, "setup_minutes": None}
+    if not os.path.exists(parsed_file):
+        return stats
+    df = pd.read_csv(parsed_file)
+    if "total" not in df.columns:
+        return stats
+    df = df[(df["project"] == project) & (df["total"] > 0)]
+    if len(df.index) == 0:
+        return stats
+    stats["tests"] = df.groupby("run_id")["total"].mean().to_dict()
+    stats["seconds_per_test"] = statistics.median((df["duration"] / df["total"]).tolist())
+    setup_minutes = []
+    for row in df.to_dict("records"):
+        run_meta_file = os.path.join(workflowrun_dir, str(int(row["run_id"])), local_const.RUN_META_FILE.format(run_name=row["order"]))
+        if not os.path.exists(run_meta_file):
+            continue
+        with open(run_meta_file, "r") as f:
+            info = json.load(f)
+        if info.get("name") != row["order"] or "run_started_at" not in info or "updated_at" not in info:
+            continue
+        setup_minutes.append(max(get_minutes(info["run_started_at"], info["updated_at"]) - row["duration"] / 60, 0))
+    if setup_minutes:
+        stats["setup_minutes"] = statistics.median(setup_minutes)
+    return stats
+
+
+def estimate_costs(builds: List[dict], stats: dict, num_orders: int=len(local_const.CI_WORKFLOW_NAMES), consolidated: bool=False) -> Dict[int, float]:
+    """Estimated runner minutes of rerunning each build, by run_id.
+
+    consolidated: the orders run in one job, which sets up once
+    """
+    known = sorted(
+        (local_utils.timestring_to_timestamp(build["run_started_at"]).timestamp(), stats["tests"][int(build["run_id"])])
+        for build in builds if int(build["run_id"]) in stats["tests"]
+    )
+    costs = {}
+    for build in builds:
+        run_id = int(build["run_id"])
+        if len(known) == 0 or stats["seconds_per_test"] is None or stats["setup_minutes"] is None:
+            costs[run_id] = get_minutes(build["run_started_at"], build["run_updated_at"]) * num_orders
+            continue
+        started_at = local_utils.timestring_to_timestamp(build["run_started_at"]).timestamp()
+        _, tests = min(known, key=lambda item: abs(item[0] - started_at))
+        test_minutes = stats["tests"].get(run_id, tests) * stats["seconds_per_test"] / 60
+        num_setups = 1 if consolidated else num_orders
+        costs[run_id] = stats["setup_minutes"] * num_setups + test_minutes * num_orders
+    return costs
+
+
+def get_requirements(builds: List[dict], i: int) -> List[int]:
+    """Indices of the builds to rerun for failed build i: itself and the builds back to the last success build before it."""
+    required = [i]
+    j = i - 1
+    while j >= 0 and builds[j]["run_conclusion"] != "success":
+        required.append(j)
+        j -= 1
+    if j >= 0:
+        required.append(j)
+    return sorted(required)
+
+
+def select_builds(
+        builds: List[dict],
+        costs: Dict[int, float],
+        budget_minutes: float,
+        is_done: Callable[[int], bool]=lambda run_id: False,
+        duplicate_of: Optional[Dict[int, int]]=None,
+        ) -> dict:
+    """Select the builds to rerun within budget_minutes.
+
+    is_done: whether a build already has rerun results, it is neither rerun again nor counted
+    duplicate_of: builds rerun through an earlier build of the same snapshot, see snapshot_dedup
+    Return the selected run_ids in time order, their estimated minutes and the number of failed builds covered.
+    """
+    duplicate_of = duplicate_of if duplicate_of is not None else {}
+    index_of = {int(build["run_id"]): i for i, build in enumerate(builds)}
+    done = set(i for i, build in enumerate(builds) if is_done(build["run_id"]))
+    targets = [i for i, build in enumerate(builds) if build["run_conclusion"] == "failure" and i not in done]
+    requirements = {}
+    for i in targets:
+        required = set()
+        for j in get_requirements(builds, i):
+            run_id = int(builds[j]["run_id"])
+            required.add(index_of[duplicate_of[run_id]] if run_id in duplicate_of else j)
+        requirements[i] = required - done
+    selected = set()
+    minutes = 0
+    num_covered = 0
+    while targets:
+        # The failed build covered for the fewest extra minutes.
+        extra = {i: sum(costs[int(builds[j]["run_id"])] for j in requirements[i] - selected) for i in targets}
+        best = min(targets, key=lambda i: (extra[i], i))
+        if minutes + extra[best] > budget_minutes:
+            break
+        selected |= requirements[best]
+        minutes += extra[best]
+        num_covered += 1
+        targets.remove(best)
+    return {
+        "run_ids": [int(builds[i]["run_id"]) for i in sorted(selected)],
+        "minutes": minutes,
+        "num_failures": num_covered,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        exit("Invalid command, example command: python3 budget_planner.py ipython 3000")
+    project, budget_minutes = sys.argv[1], float(sys.argv[2])
+    df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
+    builds = df[df["project"] == project].to_dict("records")
+    workflowrun_dir = os.path.join(local_const.RERUN_DIR, project, local_const.WORKFLOWRUN_DIR)
+    costs = estimate_costs(builds, load_rerun_stats(project, workflowrun_dir))
+    selection = select_builds(
+        builds, costs, budget_minutes,
+        is_done=lambda run_id: snapshot_dedup.has_results(os.path.join(workflowrun_dir, str(int(run_id)))),
+        duplicate_of=snapshot_dedup.get_duplicate_of(builds))
+    num_failures = sum(build["run_conclusion"] == "failure" for build in builds)
+    print(
+        f"[budget] {project}: {len(selection['run_ids'])} builds for {selection['minutes']:.0f} of {budget_minutes:.0f} minutes, "
+        + f"covering {selection['num_failures']} of {num_failures} failed builds"
+    )
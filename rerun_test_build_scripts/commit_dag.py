@@ -0,0 +1,182 @@
+"""Commit DAG index of a project, built from the parent_shas of workflow runs in metadata.csv."""
+
+import ast
+import json
+import os
+import sys
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import local_utils
+
+COMMIT_DAG_FOLDER = "commit_dag"
+
+NEAREST_BUILT = "built"
+NEAREST_SUCCESS = "success"
+
+
+class CommitDag:
+    def __init__(self, parents: Dict[str, List[str]], builds: Dict[str, List[dict]]) -> None:
+        """
+        parents: parent shas per commit, parents not seen in the dataset are leaf nodes
+        builds: test runs per commit, as dicts with run_id, run_started_at and run_conclusion
+        """
+        self.parents = parents
+        self.builds = builds
+        for shas in list(parents.values()):
+            for sha in shas:
+                self.parents.setdefault(sha, [])
+        self.generation = self.compute_generations()
+        # Nearest proper ancestors with a build, looked up in O(1).
+        self.nearest = {
+            NEAREST_BUILT: self.compute_nearest(lambda sha: len(self.builds.get(sha, [])) > 0),
+            NEAREST_SUCCESS: self.compute_nearest(
+                lambda sha: any(b["run_conclusion"] == "success" for b in self.builds.get(sha, []))),
+        }
+
+    def compute_generations(self) -> Dict[str, int]:
+        """Generation number: 0 for commits without known parents, else 1 + max generation of parents."""
+        generation = {}
+        for root in self.parents:
+            if root in generation:
+                continue
+            # Iterative post-order, histories are too deep for recursion.
+            stack = [root]
+            while stack:
+                sha = stack[-1]
+                pending = [p for p in self.parents[sha] if p not in generation]
+                if pending:
+                    stack += pending
+                    continue
+                stack.pop()
+                generation[sha] = 1 + max((generation[p] for p in self.parents[sha]), default=-1)
+        return generation
+
+    def sort_key(self, sha: str) -> tuple:
+        """Closeness of an ancestor: higher generation first, then later build."""
+        started_at = max((b["run_started_at"] for b in self.builds.get(sha, [])), default="")
+        return (self.generation[sha], started_at)
+
+    def compute_nearest(self, accept: Callable[[str], bool]) -> Dict[str, Optional[str]]:
+        nearest = {}
+        for sha in sorted(self.parents, key=lambda x: self.generation[x]):
+            candidates = []
+            for p in self.parents[sha]:
+                candidate = p if accept(p) else nearest[p]
+                if candidate is not None:
+                    candidates.append(candidate)
+            nearest[sha] = max(candidates, key=self.sort_key) if candidates else None
+        return nearest
+
+    def nearest_built_ancestor(self, sha: str, kind: str=NEAREST_BUILT) -> Optional[str]:
+        """Nearest proper ancestor with a test run (kind="built") or a successful one (kind="success")."""
+        return self.nearest[kind].get(sha)
+
+    def is_ancestor(self, ancestor: str, sha: str) -> bool:
+        """Whether ancestor is reachable from sha, pruning commits older than the ancestor."""
+        if ancestor not in self.generation or sha not in self.generation:
+            return False
+        target_generation = self.generation[ancestor]
+        stack, seen = [sha], {sha}
+        while stack:
+            current = stack.pop()
+            if current == ancestor:
+                return True
+            for p in self.parents[current]:
+                if p not in seen and self.generation[p] >= target_generation:
+                    seen.add(p)
+                    stack.append(p)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "parents": self.parents,
+            "builds": self.builds,
+            "generation": self.generation,
+            "nearest": self.nearest,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CommitDag":
+        dag = cls.__new__(cls)
+        dag.parents = data["parents"]
+        dag.builds = data["builds"]
+        dag.generation = data["generation"]
+        dag.nearest = data["nearest"]
+        return dag
+
+
+def parse_parent_shas(value) -> List[str]:
+    """parent_shas are written to csv as the repr of a python list."""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or value == "":
+        return []
+    return ast.literal_eval(value)
+
+
+def build_commit_dag(project: str, df: pd.DataFrame=None) -> CommitDag:
+    """Build the commit DAG of a project from metadata.csv, test runs with a conclusion count as builds."""
+    if df is None:
+        df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "metadata.csv"))
+    df = df[df["project"] == project]
+    parents, builds = {}, {}
+    for run in df.to_dict("records"):
+        head_sha = run["head_sha"]
+        parent_shas = parse_parent_shas(run["parent_shas"])
+        # Runs without commit metadata have no parents, do not let them hide known ones.
+        if len(parent_shas) > 0 or head_sha not in parents:
+            parents[head_sha] = parent_shas
+        if run["is_test_run"] == True and run["run_conclusion"] in ["success", "failure"]:
+            builds.setdefault(head_sha, []).append({
+                "run_id": int(run["run_id"]),
+                "run_started_at": run["run_started_at"],
+                "run_conclusion": run["run_conclusion"],
+            })
+    return CommitDag(parents, builds)
+
+
+def get_commit_dag_file(project: str) -> str:
+    return os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, COMMIT_DAG_FOLDER, f"{project}.json")
+
+
+def save_commit_dag(project: str, dag: CommitDag, source: dict) -> None:
+    dag_file = get_commit_dag_file(project)
+    os.makedirs(os.path.dirname(dag_file), exist_ok=True)
+    with open(dag_file, "w") as f:
+        json.dump(dict(dag.to_dict(), source=source), f)
+
+
+def load_commit_dag(project: str) -> CommitDag:
+    """Load the persisted DAG of a project, building and saving it on first use or if metadata.csv changed since."""
+    dag_file = get_commit_dag_file(project)
+    source = local_utils.get_file_stamp(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "metadata.csv"))
+    if os.path.exists(dag_file):
+        data = json.load(open(dag_file, "r"))
+        if data.get("source") == source:
+            return CommitDag.from_dict(data)
+    dag = build_commit_dag(project)
+    save_commit_dag(project, dag, source)
+    return dag
+
+
+def runner_build_commit_dags() -> None:
+    """Build and persist the commit DAG of every project in metadata.csv."""
+    source = local_utils.get_file_stamp(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "metadata.csv"))
+    df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "metadata.csv"))
+    for project in df["project"].drop_duplicates().values.tolist():
+        dag = build_commit_dag(project, df)
+        save_commit_dag(project, dag, source)
+        print(f"[commit-dag] {project}: {len(dag.parents)} commits, {len(dag.builds)} built commits")
+
+
+if __name__ == "__main__":
+    runner_build_commit_dags()
@@ -0,0 +1,131 @@
+"""Compact test report: only the fields of pytest-json-report's test-report.json that the analysis uses.
+
+The full report carries tracebacks, captured output and metadata of every test, tens of MB per
+order for large suites. The compact report is line-delimited JSON next to it (test-report.jsonl):
+a header line with the session duration, the summary and the field names, then one array per test
+with its nodeid, outcome, setup/call/teardown durations (null for stages that did not run) and the
+pytest-xdist worker that ran it (null without xdist).
+
+The workflows run this file as a script after the tests and upload the compact report in place of
+the full one, see add_compact_report_steps. It only depends on the standard library.
+
+Usage: python compact_test_report.py REPORT_FILE [REPORT_FILE ...]
+"""
+
+import json
+import os
+import re
+import sys
+from typing import Iterable, List
+
+FORMAT = "compact-test-report/1"
+FIELDS = ["nodeid", "outcome", "setup", "call", "teardown", "worker"]
+STAGES = ["setup", "call", "teardown"]
+REPORT_FILE_NAME = "test-report.json"
+COMPACT_REPORT_FILE_NAME = "test-report.jsonl"
+# Copied next to the workflows, GitHub ignores files other than yml under .github/workflows.
+SCRIPT_PATH = ".github/workflows/compact_test_report.py"
+
+
+def get_worker(test: dict) -> str:
+    """pytest-xdist worker of a test, e.g., gw3, from the `[gw3] ...` setup longrepr."""
+    longrepr = test.get("setup", {}).get("longrepr")
+    if isinstance(longrepr, str) and longrepr.startswith("[gw"):
+        return longrepr[1:4]
+    return None
+
+
+def compact_report(report: dict) -> str:
+    header = {
+        "format": FORMAT,
+        "duration": report["duration"],
+        "summary": report["summary"],
+        "fields": FIELDS,
+    }
+    lines = [json.dumps(header)]
+    for test in report["tests"]:
+        durations = [test[stage]["duration"] if stage in test else None for stage in STAGES]
+        lines.append(json.dumps([test["nodeid"], test["outcome"]] + durations + [get_worker(test)]))
+    return "\n".join(lines) + "\n"
+
+
+def read_compact_report(lines: Iterable[str]) -> dict:
+    """Read a compact report, tests are dicts of FIELDS."""
+    lines = iter(lines)
+    header = json.loads(next(lines))
+    if header.get("format") != FORMAT:
+        raise ValueError(f"not a {FORMAT} report: {header.get('format')}")
+    fields = header["fields"]
+    return {
+        "duration": header["duration"],
+        "summary": header["summary"],
+        "tests": [dict(zip(fields, json.loads(line))) for line in lines if line.strip() != ""],
+    }
+
+
+def write_compact_report(report_file: str) -> str:
+    """Write the compact report of a test-report.json next to it, return its path."""
+    with open(report_file, "r") as f:
+        report = json.load(f)
+    compact_file = os.path.join(os.path.dirname(report_file), COMPACT_REPORT_FILE_NAME)
+    with open(compact_file, "w") as f:
+        f.write(compact_report(report))
+    return compact_file
+
+
+def add_compact_report_step(workflow: str) -> str:
+    """Compact the test report of a workflow before its upload, and upload the compact report instead."""
+    lines = workflow.splitlines(keepends=True)
+    uploads = [
+        i for i, line in enumerate(lines)
+        if re.match(rf"^\s*(path:\s*)?\S*{re.escape(REPORT_FILE_NAME)}\s*$", line)
+    ]
+    if len(uploads) != 1:
+        raise ValueError(f"expected one upload of {REPORT_FILE_NAME}, found {len(uploads)}")
+    upload = uploads[0]
+    report_path = lines[upload].strip().split()[-1]
+    lines[upload] = lines[upload].rstrip()[:-len(REPORT_FILE_NAME)] + COMPACT_REPORT_FILE_NAME + "\n"
+    # The upload step starts at the last list item indented less than its path.
+    path_indent = len(lines[upload]) - len(lines[upload].lstrip(" "))
+    step_start = next(
+        i for i in range(upload, -1, -1)
+        if lines[i].lstrip().startswith("- ") and len(lines[i]) - len(lines[i].lstrip(" ")) < path_indent
+    )
+    pad = " " * (len(lines[step_start]) - len(lines[step_start].lstrip(" ")))
+    step = (
+        f"{pad}- name: Compact test report\n"
+        f"{pad}  if: always()\n"
+        f"{pad}  run: python {SCRIPT_PATH} {report_path}\n"
+    )
+    return "".join(lines[:step_start]) + step + "".join(lines[step_start:])
+
+
+def add_compact_report_steps(workflow_dir: str) -> List[str]:
+    """Add the compact report step to the workflows of workflow_dir uploading a test report, return their names.
+
+    Raises ValueError, before any workflow is written, if one of them cannot be edited.
+    """
+    edited = {}
+    for name in sorted(os.listdir(workflow_dir)):
+        if not name.endswith((".yml", ".yaml")):
+            continue
+        with open(os.path.join(workflow_dir, name), "r") as f:
+            workflow = f.read()
+        if REPORT_FILE_NAME not in workflow:
+            continue
+        edited[name] = add_compact_report_step(workflow)
+    for name, workflow in edited.items():
+        with open(os.path.join(workflow_dir, name), "w") as f:
+            f.write(workflow)
+    return list(edited)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        exit("Invalid command, example command: python compact_test_report.py ./test-report.json")
+    for report_file in sys.argv[1:]:
+        if not os.path.exists(report_file):
+            # No report if the tests did not run, the upload step warns about it.
+            print(f"{report_file} not found")
+            continue
+        print(f"Wrote {write_compact_report(report_file)}")
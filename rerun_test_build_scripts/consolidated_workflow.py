@@ -0,0 +1,183 @@
+"""Merge the per-order workflows of a project into one workflow that installs once and runs all orders.
+
+The workflows of the orders in modified_ci_files_for_rerun.zip only differ in their name and in the
+steps from the pytest-ranking cache restore on (test command, cache paths). The merged workflow keeps
+the steps before them once (checkout, Python setup, dependency install), then repeats the order steps
+for each order in sequence, in the same job:
+- a cleanup step drops the ranking cache and the test report left by the previous order,
+- cache keys use the order name in place of `${{ github.workflow }}`, so they match the separate workflows,
+- steps run even if a previous order failed (unless the run is cancelled), and their ids are suffixed with the order,
+- the test report of each order is uploaded as local_const.ORDER_ARTIFACT_NAME.
+
+Usage: python3 consolidated_workflow.py CI_FILE_BACKUP_DIR
+"""
+
+import os
+import re
+import sys
+from typing import Dict, List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+
+CONSOLIDATED_WORKFLOW_DIR = "consolidated_workflows"
+RANKING_CACHE_DIR = "pytest_ranking_data"
+# GitHub Actions jobs are cancelled after 6 hours.
+MAX_JOB_TIMEOUT_MINUTES = 360
+
+
+def get_indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def is_code(line: str) -> bool:
+    return line.strip() != "" and not line.strip().startswith("#")
+
+
+def get_code_lines(lines: List[str]) -> List[str]:
+    """Lines other than blanks, comments and the workflow name."""
+    return [line.rstrip() for line in lines if is_code(line) and not re.match(r"^name:", line)]
+
+
+def split_steps(lines: List[str]) -> Dict:
+    """Split a workflow into the lines before the steps of its test job, the steps, and the lines after.
+
+    The test job is the one uploading local_const.ARTIFACT_NAME.
+    """
+    upload = [i for i, line in enumerate(lines) if is_code(line) and local_const.ARTIFACT_NAME in line]
+    if len(upload) != 1:
+        raise ValueError(f"expected one upload of {local_const.ARTIFACT_NAME}, found {len(upload)}")
+    starts = [i for i, line in enumerate(lines[:upload[0]]) if is_code(line) and line.strip() == "steps:"]
+    if len(starts) == 0:
+        raise ValueError("no steps before the test report upload")
+    steps_line = starts[-1]
+    step_indent = None
+    steps, end = [], len(lines)
+    for i in range(steps_line + 1, len(lines)):
+        line = lines[i]
+        if not is_code(line):
+            if steps:
+                steps[-1].append(line)
+            continue
+        if step_indent is None:
+            step_indent = get_indent(line)
+        if get_indent(line) < step_indent or (get_indent(line) == step_indent and not line.lstrip().startswith("- ")):
+            end = i
+            break
+        if get_indent(line) == step_indent:
+            steps.append([line])
+        else:
+            steps[-1].append(line)
+    # Trailing blank lines and comments belong after the steps.
+    after = []
+    while steps and steps[-1] and not is_code(steps[-1][-1]):
+        after.insert(0, steps[-1].pop())
+    return {
+        "before": lines[:steps_line + 1],
+        "steps": ["".join(step) for step in steps],
+        "after": after + lines[end:],
+        "step_indent": step_indent,
+    }
+
+
+def is_ranking_cache_restore(step: str) -> bool:
+    return "actions/cache/restore" in step and RANKING_CACHE_DIR in step
+
+
+def get_cache_paths(step: str) -> List[str]:
+    return [path.strip() for path in re.findall(r"^\s*path:\s*(\S.*)$", step, re.MULTILINE)]
+
+
+def make_order_steps(steps: List[str], order: str, step_indent: int) -> List[str]:
+    """Steps of one order in the merged workflow."""
+    ids = re.findall(r"^\s*id:\s*(\S+)\s*$", "".join(steps), re.MULTILINE)
+    cache_paths = [path for step in steps if is_ranking_cache_restore(step) for path in get_cache_paths(step)]
+    pad, key_pad = " " * step_indent, " " * (step_indent + 2)
+    cleanup = (
+        f"{pad}- name: Clean up before {order}\n"
+        f"{key_pad}if: ${{{{ !cancelled() }}}}\n"
+        f"{key_pad}run: |\n"
+        + "".join(f"{key_pad}  rm -rf {path}\n" for path in cache_paths)
+        + f"{key_pad}  find . -name 'test-report.json*' -not -path './.git/*' -delete\n"
+    )
+    order_steps = [cleanup]
+    for step in steps:
+        step = step.replace("${{ github.workflow }}", order)
+        step = step.replace(f"name: {local_const.ARTIFACT_NAME}", f"name: {local_const.ORDER_ARTIFACT_NAME.format(order=order)}")
+        for step_id in ids:
+            step = re.sub(rf"^(\s*id:\s*){re.escape(step_id)}\s*$", rf"\g<1>{step_id}_{order}", step, flags=re.MULTILINE)
+            step = step.replace(f"steps.{step_id}.", f"steps.{step_id}_{order}.")
+        lines = step.splitlines(keepends=True)
+        lines[0] = re.sub(r"^(\s*- name:\s*)(.*?)\s*$", rf"\g<1>\g<2> ({order})\n", lines[0])
+        # Run the steps of every order even if the tests of a previous order failed.
+        if not re.search(rf"^ {{{step_indent + 2}}}if:", step, re.MULTILINE) and not re.match(rf"^ {{{step_indent}}}- if:", lines[0]):
+            lines.insert(1, f"{key_pad}if: ${{{{ !cancelled() }}}}\n")
+        order_steps.append("".join(lines))
+    return order_steps
+
+
+def make_consolidated_workflow(workflow_dir: str, orders: List[str]=local_const.CI_WORKFLOW_NAMES) -> str:
+    """Merge the workflows {order}.yml of workflow_dir into one workflow named local_const.WF_ALL_ORDERS."""
+    workflows = {}
+    for order in orders:
+        with open(os.path.join(workflow_dir, f"{order}.yml"), "r") as f:
+            lines = f.read().splitlines(keepends=True)
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        workflows[order] = split_steps(lines)
+
+    base = workflows[orders[0]]
+    num_steps = len(base["steps"])
+    for order, workflow in workflows.items():
+        if len(workflow["steps"]) != num_steps:
+            raise ValueError(f"{order} has {len(workflow['steps'])} steps, {orders[0]} has {num_steps}")
+        # Apart from the workflow name, orders may only differ in their steps.
+        for part in ["before", "after"]:
+            lines, base_lines = [get_code_lines(workflow[part]), get_code_lines(base[part])]
+            if lines != base_lines:
+                diff = [line for line in lines if line not in base_lines]
+                raise ValueError(f"{order} differs from {orders[0]} outside of the test job steps: {diff[:3]}")
+
+    # Order steps start at the first step that differs between orders, or at the cache restore.
+    first_order_step = next(i for i, step in enumerate(base["steps"]) if is_ranking_cache_restore(step))
+    for i in range(num_steps):
+        base_step = get_code_lines(base["steps"][i].splitlines())
+        if any(get_code_lines(workflow["steps"][i].splitlines()) != base_step for workflow in workflows.values()):
+            first_order_step = min(first_order_step, i)
+            break
+
+    before = []
+    for line in base["before"]:
+        if re.match(r"^name:", line):
+            line = f"name: {local_const.WF_ALL_ORDERS}\n"
+        # The job now runs every order, scale its timeout.
+        match = re.match(r"^(\s*timeout-minutes:\s*)(\d+)\s*$", line)
+        if match:
+            line = f"{match.group(1)}{min(int(match.group(2)) * len(orders), MAX_JOB_TIMEOUT_MINUTES)}\n"
+        before.append(line)
+    steps = base["steps"][:first_order_step]
+    for order in orders:
+        steps += make_order_steps(workflows[order]["steps"][first_order_step:], order, base["step_indent"])
+    return "".join(before) + "".join(steps) + "".join(base["after"])
+
+
+def write_consolidated_workflow(ci_file_backup_dir: str, orders: List[str]=local_const.CI_WORKFLOW_NAMES) -> str:
+    """Write the merged workflow of the backed-up workflows to {ci_file_backup_dir}/consolidated_workflows/."""
+    workflow = make_consolidated_workflow(os.path.join(ci_file_backup_dir, "workflows"), orders)
+    workflow_dir = os.path.join(ci_file_backup_dir, CONSOLIDATED_WORKFLOW_DIR)
+    os.makedirs(workflow_dir, exist_ok=True)
+    workflow_file = os.path.join(workflow_dir, f"{local_const.WF_ALL_ORDERS}.yml")
+    with open(workflow_file, "w") as f:
+        f.write(workflow)
+    return workflow_file
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        exit("Invalid command, example command: python3 consolidated_workflow.py rerun_results/networkx/ci_file_backup")
+    print(f"[consolidate] Wrote {write_consolidated_workflow(sys.argv[1])}")
@@ -4,12 +4,10 @@ import datetime
 import glob
 import json
 import os
-import subprocess
 import sys
 import time
 
 import pandas as pd
-import requests
 
 script_dir = os.path.dirname(__file__)
 parent_dir = os.path.join(script_dir, "..", "")
@@ -17,8 +15,11 @@ local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
 sys.path.append(parent_dir)
 sys.path.append(local_dir)
 
+import artifact_manifest
+import commit_dag
 import local_const
 import local_utils
+import process_runner
 import token_pool
 
 TOKENPOOL = token_pool.TokenPool()
@@ -41,6 +42,10 @@ DATASET_START_DATE = "2024-01-01"
 DATASET_END_DATE = "2024-12-01"
 MAX_PAGE_LIMIT = 10000
 
+# How the success build before a failed build is picked for the lite dataset.
+BASELINE_TIME = "time"
+BASELINE_ANCESTRY = "ancestry"
+
 def get_weeks_between_dates(start_date: str, end_date: str):
     # Convert input strings to datetime objects
     start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
@@ -92,15 +97,14 @@ def download_global_runs(slug: str, start_date: str=DATASET_START_DATE, end_date
     for date in dates:
         for page_number in range(1, MAX_PAGE_LIMIT):
             save_file = os.path.join(save_folder, f"global_runs_{date}_page{page_number}.json")
-            if os.path.exists(save_file):
+            if artifact_manifest.is_complete(save_file):
                 continue
             query = WORKFLOW_SEARCH_URL.format(slug=slug, date=date, page_number=page_number)
             info = token_pool.query_info(TOKENPOOL, query)
             # Will not save empty page.
             if len(info) < 1 or len(info["workflow_runs"]) < 1:
                 break
-            with open(save_file, "w") as f:
-                json.dump(info, f, indent=2)
+            artifact_manifest.atomic_write_json(save_file, info)
             print("Write to " + save_file)
 
 
@@ -121,15 +125,14 @@ def download_global_run_commits(slug: str) -> None:
     os.makedirs(save_folder, exist_ok=True)
     for sha in shas:
         save_file = os.path.join(save_folder, f"{sha}.json")
-        if os.path.exists(save_file):
+        if artifact_manifest.is_complete(save_file):
             continue
         query = COMMIT_URL.format(slug=slug, sha=sha)
         info = token_pool.query_info(TOKENPOOL, query)
         # We write to a file even when there is no data.
         # if "sha" not in info:
         #     continue
-        with open(save_file, "w") as f:
-            json.dump(info, f, indent=2)
+        artifact_manifest.atomic_write_json(save_file, info)
         print("Write to " + save_file)
 
 
@@ -150,14 +153,14 @@ def download_global_run_commit_patches(slug: str) -> None:
     os.makedirs(save_folder, exist_ok=True)
     for sha in shas:
         save_file = os.path.join(save_folder, f"{sha}.patch")
-        if os.path.exists(save_file):
+        if artifact_manifest.is_complete(save_file):
             continue
         query = COMMIT_PATCH_URL.format(slug=slug, sha=sha)
-        html_response = requests.get(url=query, headers=local_const.GENERAL_HEADERS, timeout=10)
-        with open(save_file, "w") as f:
-            f.write(html_response.text)
-            # local_utils.compress_file(save_file)
-            print("Write to " + save_file)
+        # Through the token pool, so the patches count against its request budget like the other stages.
+        patch = token_pool.query_binary(mytokenpool=TOKENPOOL, myurl=query)
+        artifact_manifest.atomic_write(save_file, patch)
+        # local_utils.compress_file(save_file)
+        print("Write to " + save_file)
 
 
 def runner_download_global_run_data():
@@ -278,29 +281,25 @@ def runner_build_workflow_run_dataset() -> None:
 def get_repo_test_workflow_file_name(slug: str, start_date: str=DATASET_START_DATE, end_date: str=DATASET_END_DATE) -> None:
     """Get the list of workflow file names of a repo in history."""
     owner, project = slug.split("/")
-    # Clone and go to repo.
-    current_folder = os.getcwd()
-    os.system("rm -rf tmp_repos/")
+    # Clone the repo.
+    process_runner.remove("tmp_repos")
     os.makedirs("tmp_repos", exist_ok=True)
-    os.chdir("tmp_repos")
-    os.system(f"git clone https://github.com/{slug}.git")
-    os.chdir(project)
+    repo_dir = os.path.join("tmp_repos", project)
+    process_runner.run(["git", "clone", f"https://github.com/{slug}.git", repo_dir])
     # Get list of commits within the date range.
     workflow_files = []
-    process = subprocess.Popen(f"git log --after='{start_date}' --before='{end_date}' --format=format:%H", stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True)
-    output, err = process.communicate()
+    output = process_runner.git(repo_dir, ["log", f"--after={start_date}", f"--before={end_date}", "--format=format:%H"])
     shas = [s.strip() for s in output.split('\n')]
     print(f"Number of commits: {len(shas)}")
     # Get set of files in .github/workflows/ of all commits above.
     for sha in shas:
-        os.system(f"git checkout {sha}")
-        current_workflow_files = glob.glob(f".github/workflows/*")
-        for wf in current_workflow_files:
-            content = open(wf, "r").read()
+        # Read the workflow files of each commit from git, instead of checking it out.
+        listing = process_runner.git(repo_dir, ["ls-tree", "--name-only", sha, ".github/workflows/"], check=False)
+        for wf in listing.splitlines():
+            content = process_runner.git(repo_dir, ["show", f"{sha}:{wf}"], check=False)
             if "pytest" in content or "tox" in content:
                 workflow_files.append(wf)
     workflow_files = list(set(workflow_files))
-    os.chdir(current_folder)
     return workflow_files
 
 
@@ -327,11 +326,39 @@ def runner_build_global_test_run_dataset():
     df.to_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "test_run_metadata.csv"), index=False)
 
 
-def runner_build_global_test_run_lite_dataset():
+def get_ancestor_success_run_indices(df: pd.DataFrame, project: str, failed_run_indices: list) -> list:
+    """For each failed run, get the latest success run that ended before it started, on the nearest ancestor commit with one.
+
+    Ancestors come from the precomputed nearest success ancestor of the commit DAG, following it further back
+    while an ancestor has no such run in df, e.g., it only succeeded later or its zip is missing.
+    Failed runs without such an ancestor are skipped.
+    """
+    dag = commit_dag.load_commit_dag(project)
+    success_runs = df[(df["project"] == project) & (df["run_conclusion"] == "success")]
+    success_indices_per_sha = success_runs.groupby("head_sha").groups
+    succeeded_run_indices = []
+    for i in failed_run_indices:
+        started_at = local_utils.timestring_to_timestamp(df.iloc[i]["run_started_at"]).timestamp()
+        base_sha = dag.nearest_built_ancestor(df.iloc[i]["head_sha"], commit_dag.NEAREST_SUCCESS)
+        while base_sha is not None:
+            earlier = [
+                j for j in success_indices_per_sha.get(base_sha, [])
+                if local_utils.timestring_to_timestamp(df.iloc[j]["run_updated_at"]).timestamp() <= started_at
+            ]
+            if len(earlier) > 0:
+                succeeded_run_indices.append(max(earlier))
+                break
+            base_sha = dag.nearest_built_ancestor(base_sha, commit_dag.NEAREST_SUCCESS)
+    return succeeded_run_indices
+
+
+def runner_build_global_test_run_lite_dataset(baseline: str=BASELINE_TIME):
     """Filtering and get a lite global test run dataset from the test_run_metadata.csv.
 
     Get all failed builds, for each failed build, get the first non-overlapping success build before it.
      - some failed builds have the same non-overlapping success build before them.
+    baseline: BASELINE_TIME picks the success build by time order, BASELINE_ANCESTRY picks it
+    on the nearest ancestor commit from the commit DAG, which stays on the failed build's branch.
     """
     df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "test_run_metadata.csv"))
     # Make sure zip exists.
@@ -341,7 +368,7 @@ def runner_build_global_test_run_lite_dataset():
             local_const.GLOBAL_RUN_DATASET_DIR,
             "repo_zips", df.iloc[i]["project"], df.iloc[i]["head_sha"] + ".zip"
         )
-        df.at[i, "zip_exist"] = os.path.exists(zip_path)
+        df.at[i, "zip_exist"] = artifact_manifest.is_complete(zip_path)
     df = df[df["zip_exist"] == True]
     df.drop("zip_exist", axis=1, inplace=True)
     df = df.reset_index(drop=True)
@@ -351,6 +378,9 @@ def runner_build_global_test_run_lite_dataset():
     for project in projects:
         # Get failed run indices.
         failed_run_indices = df[(df["project"] == project) & (df["run_conclusion"] == "failure")].index.values.tolist()
+        if baseline == BASELINE_ANCESTRY:
+            indices += (failed_run_indices + get_ancestor_success_run_indices(df, project, failed_run_indices))
+            continue
         # Get the last succeeded run indices per failed build.
         succeeded_run_indices = []
         for i in failed_run_indices:
@@ -382,14 +412,13 @@ def runner_download_repo_zip_for_global_test_run_datasets() -> None:
         head_sha = row["head_sha"]
         slug = project_meta[project]["origin_slug"]
         save_file = os.path.join(save_folder, project, f"{head_sha}.zip")
-        if os.path.exists(save_file):
+        if artifact_manifest.is_complete(save_file):
             continue
         try:
             query = COMMIT_REPO_ZIP_URL.format(slug=slug, sha=head_sha)
             repo_zip = token_pool.query_binary(mytokenpool=TOKENPOOL, myurl=query)
-            with open(save_file, "wb") as f:
-                f.write(repo_zip)
-                print(f"Writing {save_file}")
+            artifact_manifest.atomic_write(save_file, repo_zip)
+            print(f"Writing {save_file}")
         except ValueError as _:
             print(f"Repo zip not found for {slug}, {run_id}, {head_sha}")
 
@@ -15,9 +15,13 @@ sys.path.append(local_dir)
 
 import local_const
 import metrics
+import rerun_download
+import token_pool
 
 TEST_RESULT_DIR = "parsed_rerun_results"
 RAW_RERUN_DIR = "../rerun_results"
+# Created when a run log skipped by the download log policy is fetched.
+TOKENPOOL = None
 
 
 def get_num_failures_by_type(type_fail_tests: set, failset: list[set]):
@@ -285,12 +289,24 @@ def get_plugin_cache_overhead_helper(zip_folder_path):
                             return {"total_cache": cache_size}
 
 
+def get_run_log_zip(project: str, run_id: int, order: str) -> str:
+    """Path of the run log of a rerun, fetched first if the download log policy skipped it."""
+    global TOKENPOOL
+    run_folder = os.path.join(RAW_RERUN_DIR, project, "workflow_runs", str(run_id))
+    run_log_zip = os.path.join(run_folder, f"run_log_{order}.zip")
+    if not os.path.exists(run_log_zip) and os.path.exists(os.path.join(run_folder, local_const.RUN_META_FILE.format(run_name=order))):
+        if TOKENPOOL is None:
+            TOKENPOOL = token_pool.TokenPool()
+        run_log_zip = rerun_download.fetch_log(TOKENPOOL, run_folder, order)
+    return run_log_zip
+
+
 def get_plugin_runtime_overhead():
     df = pd.read_csv(os.path.join(TEST_RESULT_DIR, "rerun_metadata.csv"))
     overheads = []
     for i, row in df.iterrows():
-        run_log_zip = os.path.join(RAW_RERUN_DIR, row["project"], "workflow_runs", str(row["run_id"]), f"run_log_{row['order']}.zip")
         try:
+            run_log_zip = get_run_log_zip(row["project"], row["run_id"], row["order"])
             summary = {
                 "project": row["project"], "run_id": row["run_id"], "order": row["order"]
             }
@@ -302,9 +318,11 @@ def get_plugin_runtime_overhead():
             if cache_overhead:
                 summary.update(cache_overhead)
             summary["test_log_zip_size"] = test_log_zip_size
+            # Logs cut by the download log policy, or split from a consolidated run, are smaller than full logs.
+            summary.update(rerun_download.get_log_info(run_log_zip))
             overheads.append(summary)
         except:
-            print(run_log_zip)
+            print(row["project"], row["run_id"], row["order"])
             pass
     overheads = pd.DataFrame(overheads)
     overheads.to_csv(os.path.join(TEST_RESULT_DIR, 'overhead.csv'), index=False)
@@ -314,7 +332,11 @@ def get_plugin_runtime_overhead_statistics():
     overheads = pd.read_csv(os.path.join(TEST_RESULT_DIR, 'overhead.csv'))
     runtime_stats = overheads[["project", "total_runtime"]].groupby(["project"]).mean().reset_index()
     cache_stats = overheads[["project", "total_cache"]].groupby(["project"]).mean().reset_index()
-    size_stats = overheads[["project", "test_log_zip_size"]].groupby(["project"]).mean().reset_index()
+    # Compare cache sizes with full logs only, overhead.csv files written before log policies only have full logs.
+    full_logs = overheads
+    if "log_policy" in overheads.columns:
+        full_logs = overheads[(overheads["log_policy"] == local_const.LOG_POLICY_FULL) & overheads["split_order"].isna()]
+    size_stats = full_logs[["project", "test_log_zip_size"]].groupby(["project"]).mean().reset_index()
     merged = pd.merge(runtime_stats, cache_stats, "inner", on=["project"])
     merged = pd.merge(merged, size_stats, "inner", on=["project"])
     merged["prec_cache_to_log_size"] = merged["total_cache"] / merged["test_log_zip_size"]
@@ -1,3 +1,4 @@
+import io
 import json
 import os
 import sys
@@ -12,7 +13,10 @@ local_dir = os.path.join(script_dir, "..", "eval_global_run_dataset")
 sys.path.append(parent_dir)
 sys.path.append(local_dir)
 
+import compact_test_report
 import local_const
+import rerun_download
+import rerun_journal
 
 ARGS = sys.argv
 RAW_RERUN_DIR = ARGS[-2]
@@ -30,6 +34,16 @@ def get_duration(test: dict) -> int:
     return ret
 
 
+def get_summary(report: dict) -> dict:
+    summary = {}
+    # collect test suite run data: duration, #tests
+    summary["duration"] = report["duration"]
+    for k, v in report["summary"].items():
+        if k not in ["collected"]:
+            summary[k] = v
+    return summary
+
+
 def parse_test_report_from_artifact(report: dict) -> Tuple[dict, pd.DataFrame]:
     """
     return a list of [testname, test duration, test outcome, worker];
@@ -37,12 +51,7 @@ def parse_test_report_from_artifact(report: dict) -> Tuple[dict, pd.DataFrame]:
     return test result summary
     """
 
-    summary = {}
-    # collect test suite run data: duration, #tests
-    summary["duration"] = report["duration"]
-    for k, v in report["summary"].items():
-        if k not in ["collected"]:
-            summary[k] = v
+    summary = get_summary(report)
     df = []
     for test in report["tests"]:
         testname = test["nodeid"]
@@ -60,13 +69,30 @@ def parse_test_report_from_artifact(report: dict) -> Tuple[dict, pd.DataFrame]:
     return summary, df
 
 
+def parse_compact_test_report(report: dict) -> Tuple[dict, pd.DataFrame]:
+    """Same as parse_test_report_from_artifact, for a report read by compact_test_report.read_compact_report."""
+    summary = get_summary(report)
+    df = []
+    for test in report["tests"]:
+        duration = sum(test[stage] for stage in compact_test_report.STAGES if test[stage] is not None)
+        df.append([test["nodeid"], test["outcome"], duration, test["worker"]])
+    df = pd.DataFrame(df, columns=["test", "outcome", "duration", "worker"])
+    return summary, df
+
+
 def parse_workflow_artifact(artifact_file: str, project, run_id: str, order: str) -> dict:
     print(f"[global-run] Processing {artifact_file}")
     with zipfile.ZipFile(artifact_file) as myzip:
-        assert myzip.namelist() == ["test-report.json"]
-        with myzip.open("test-report.json") as myfile:
-            report = json.load(myfile)
-            summary, df = parse_test_report_from_artifact(report)
+        # Full pytest-json-report report, or compact report of workflows with compact_report.
+        assert myzip.namelist() in [[compact_test_report.REPORT_FILE_NAME], [compact_test_report.COMPACT_REPORT_FILE_NAME]]
+        report_file = myzip.namelist()[0]
+        with myzip.open(report_file) as myfile:
+            if report_file == compact_test_report.COMPACT_REPORT_FILE_NAME:
+                report = compact_test_report.read_compact_report(io.TextIOWrapper(myfile, encoding="utf-8"))
+                summary, df = parse_compact_test_report(report)
+            else:
+                report = json.load(myfile)
+                summary, df = parse_test_report_from_artifact(report)
             if len(df.index):
                 output_folder = os.path.join(PARSED_RERUN_DIR, project, run_id)
                 os.makedirs(output_folder, exist_ok=True)
@@ -76,6 +102,14 @@ def parse_workflow_artifact(artifact_file: str, project, run_id: str, order: str
             return summary
 
 
+def record_parsed_runs(project: str, run_id: int, parsed_orders: set) -> None:
+    """Mark the journal entries of a build parsed once all their orders are, e.g., every order for the consolidated workflow."""
+    journal = rerun_journal.get_journal()
+    for entry in journal.get_entries(project, run_id):
+        if all(order in parsed_orders for order in rerun_download.get_run_orders({"name": entry["run_name"]})):
+            journal.record_parsed(project, run_id, entry["run_name"])
+
+
 def parse_rerun_dataset():
     """
     Parse rerun dataset as csvs, with a rerun_metadata.csv:
@@ -88,6 +122,7 @@ def parse_rerun_dataset():
         run_id = row["run_id"]
         run_started_at = row["run_started_at"]
         run_conclusion = row["run_conclusion"]
+        parsed_orders = set()
         for order in CI_WORKFLOW_NAMES:
             rerun_folder = os.path.join(
                 RAW_RERUN_DIR, project, local_const.WORKFLOWRUN_DIR, str(int(run_id))
@@ -108,8 +143,11 @@ def parse_rerun_dataset():
                 if os.path.exists(artifact_file):
                     artifact_summary = parse_workflow_artifact(artifact_file, project, str(int(run_id)), order)
                     new_row.update(artifact_summary)
+                    parsed_orders.add(order)
                 new_row["rerun_html"] = rerun_html
                 df.append(new_row)
+        # Journal entries are per run on the fork, one for all orders of the consolidated workflow.
+        record_parsed_runs(project, run_id, parsed_orders)
     df = pd.DataFrame(df)
     df["rerun_html"] = df.pop("rerun_html")
     df.to_csv(os.path.join(PARSED_RERUN_DIR, "rerun_metadata.csv"), index=False)
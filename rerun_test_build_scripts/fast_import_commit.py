@@ -0,0 +1,178 @@
+"""Build the commit of a build snapshot with `git fast-import`, without touching a worktree.
+
+The commit tree is the repo zip of the build with the backed-up CI files and generated files
+(e.g., uv.toml) laid over it. Blob shas of zip members are cached per (path, size, CRC32) in the
+git dir, so members unchanged since a previous build are referenced, not decompressed again.
+"""
+
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from typing import Dict, List, Optional
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import process_runner
+import zip_diff
+
+BLOB_CACHE_FILE = "rerun_blob_cache.json"
+RERUN_REF = "refs/rerun/{run_id}"
+
+MODE_FILE = "100644"
+MODE_EXECUTABLE = "100755"
+MODE_SYMLINK = "120000"
+
+
+def git_output(repo_dir: str, args: List[str]) -> str:
+    return process_runner.git(repo_dir, args)
+
+
+def quote_path(path: str) -> str:
+    """C-style quote paths fast-import would misread."""
+    if not (path.startswith('"') or "\n" in path or "\\" in path):
+        return path
+    return '"' + path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def get_zip_mode(info: zipfile.ZipInfo) -> str:
+    unix_mode = info.external_attr >> 16
+    if stat.S_ISLNK(unix_mode):
+        return MODE_SYMLINK
+    if unix_mode & 0o111:
+        return MODE_EXECUTABLE
+    return MODE_FILE
+
+
+def get_file_mode(path: str) -> str:
+    return MODE_EXECUTABLE if os.stat(path).st_mode & 0o111 else MODE_FILE
+
+
+def get_overlay_files(ci_file_backup_dir: str, ci_file_paths: List[str], workflow_backup_dir: str=None) -> Dict[str, str]:
+    """Map repo paths to the backed-up CI files that replace them, as submit_build_to_rerun copies them.
+
+    workflow_backup_dir: workflows to push, {ci_file_backup_dir}/workflows by default
+    """
+    overlay = {}
+    if workflow_backup_dir is None:
+        workflow_backup_dir = os.path.join(ci_file_backup_dir, "workflows")
+    for root, _, files in os.walk(workflow_backup_dir):
+        for name in files:
+            local_path = os.path.join(root, name)
+            rel_path = os.path.relpath(local_path, workflow_backup_dir)
+            overlay[f".github/workflows/{rel_path}"] = local_path
+    for file in ci_file_paths:
+        overlay[os.path.normpath(file)] = os.path.join(ci_file_backup_dir, file)
+    return overlay
+
+
+def write_data(stream, content: bytes) -> None:
+    stream.write(f"data {len(content)}\n".encode("utf-8"))
+    stream.write(content)
+    stream.write(b"\n")
+
+
+def commit_zip_snapshot(
+        repo_dir: str,
+        zip_file: str,
+        parent: str,
+        ref: str,
+        message: str,
+        overlay_files: Optional[Dict[str, str]]=None,
+        overlay_contents: Optional[Dict[str, bytes]]=None,
+        removed_dirs: Optional[List[str]]=None,
+        ) -> str:
+    """Commit a repo zip on top of parent as ref, return the commit sha.
+
+    removed_dirs: snapshot folders dropped before the overlay is applied, `.github/workflows` by default.
+    overlay_files: repo path -> local file whose content replaces or adds that path.
+    overlay_contents: repo path -> bytes replacing or adding that path.
+    """
+    overlay_files = overlay_files if overlay_files is not None else {}
+    overlay_contents = overlay_contents if overlay_contents is not None else {}
+    removed_dirs = removed_dirs if removed_dirs is not None else [".github/workflows"]
+    git_dir = git_output(repo_dir, ["rev-parse", "--path-format=absolute", "--git-common-dir"])
+    cache_file = os.path.join(git_dir, BLOB_CACHE_FILE)
+    blob_cache = json.load(open(cache_file, "r")) if os.path.exists(cache_file) else {}
+
+    try:
+        return run_fast_import(repo_dir, zip_file, parent, ref, message, overlay_files, overlay_contents, removed_dirs, blob_cache, cache_file)
+    except (RuntimeError, OSError):
+        if len(blob_cache) == 0:
+            raise
+        # Cached blobs may be gone, e.g., after their refs were deleted and pruned; import all blobs again.
+        print(f"[fast-import] Retrying without blob cache for {zip_file}")
+        return run_fast_import(repo_dir, zip_file, parent, ref, message, overlay_files, overlay_contents, removed_dirs, {}, cache_file)
+
+
+def run_fast_import(repo_dir, zip_file, parent, ref, message, overlay_files, overlay_contents, removed_dirs, blob_cache, cache_file) -> str:
+    committer = git_output(repo_dir, ["var", "GIT_COMMITTER_IDENT"])
+    overlay_paths = set(overlay_files) | set(overlay_contents)
+    removed_prefixes = tuple(d.rstrip("/") + "/" for d in removed_dirs)
+    marks_file = tempfile.NamedTemporaryFile(prefix="rerun_marks_", suffix=".txt", delete=False)
+    marks_file.close()
+    process = subprocess.Popen(
+        ["git", "fast-import", "--quiet", "--force", f"--export-marks={marks_file.name}"],
+        cwd=repo_dir, stdin=subprocess.PIPE)
+    stream = process.stdin
+    # (mode, dataref, path) of every file in the commit tree.
+    entries = []
+    marked_keys = {}
+    mark = 0
+    with zipfile.ZipFile(zip_file, "r") as zip_ref:
+        for info in zip_ref.infolist():
+            path = zip_diff.strip_zip_prefix(info.filename)
+            if info.is_dir() or path == "" or path.startswith(removed_prefixes) or path in overlay_paths:
+                continue
+            key = f"{path}\0{info.file_size}\0{info.CRC}"
+            if key in blob_cache:
+                entries.append((get_zip_mode(info), blob_cache[key], path))
+                continue
+            mark += 1
+            stream.write(f"blob\nmark :{mark}\n".encode("utf-8"))
+            write_data(stream, zip_ref.read(info))
+            marked_keys[mark] = key
+            entries.append((get_zip_mode(info), f":{mark}", path))
+    for path, local_path in overlay_files.items():
+        mark += 1
+        stream.write(f"blob\nmark :{mark}\n".encode("utf-8"))
+        write_data(stream, open(local_path, "rb").read())
+        entries.append((get_file_mode(local_path), f":{mark}", path))
+    for path, content in overlay_contents.items():
+        mark += 1
+        stream.write(f"blob\nmark :{mark}\n".encode("utf-8"))
+        write_data(stream, content)
+        entries.append((MODE_FILE, f":{mark}", path))
+
+    stream.write(f"commit {ref}\ncommitter {committer}\n".encode("utf-8"))
+    write_data(stream, message.encode("utf-8"))
+    stream.write(f"from {parent}\ndeleteall\n".encode("utf-8"))
+    for mode, dataref, path in entries:
+        stream.write(f"M {mode} {dataref} {quote_path(path)}\n".encode("utf-8"))
+    stream.write(b"\n")
+    stream.close()
+    if process.wait() != 0:
+        os.remove(marks_file.name)
+        raise RuntimeError(f"git fast-import failed for {zip_file}")
+
+    # Remember blob shas of the newly imported zip members.
+    with open(marks_file.name, "r") as f:
+        for line in f:
+            mark_id, sha = line.split()
+            key = marked_keys.get(int(mark_id[1:]))
+            if key is not None:
+                blob_cache[key] = sha
+    os.remove(marks_file.name)
+    temp_cache_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_cache_file, "w") as f:
+        json.dump(blob_cache, f)
+    os.replace(temp_cache_file, cache_file)
+    return git_output(repo_dir, ["rev-parse", ref])
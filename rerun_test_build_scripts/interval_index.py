@@ -0,0 +1,202 @@
+"""Interval index over (run_started_at, run_updated_at) of the builds of a project.
+
+Two builds overlap when one starts strictly before the other one is last updated, as in check_overlap.
+"""
+
+import bisect
+import json
+import os
+import sys
+from typing import List, Optional
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import local_utils
+
+INTERVAL_INDEX_FOLDER = "interval_index"
+
+
+class CenteredNode:
+    """Node of a centered interval tree, holding the intervals that contain its center."""
+    def __init__(self, center: float, intervals: List[tuple]) -> None:
+        self.center = center
+        self.by_start = sorted(intervals, key=lambda x: x[0])
+        self.by_end = sorted(intervals, key=lambda x: x[1], reverse=True)
+        self.left = None
+        self.right = None
+
+
+def build_centered_tree(intervals: List[tuple]) -> Optional[CenteredNode]:
+    if len(intervals) == 0:
+        return None
+    points = sorted(p for interval in intervals for p in interval[:2])
+    center = points[len(points) // 2]
+    node = CenteredNode(center, [x for x in intervals if x[0] <= center <= x[1]])
+    node.left = build_centered_tree([x for x in intervals if x[1] < center])
+    node.right = build_centered_tree([x for x in intervals if x[0] > center])
+    return node
+
+
+class IntervalIndex:
+    def __init__(self, builds: List[dict]) -> None:
+        """
+        builds: builds of one project in dataset order, with run_id, run_started_at and run_updated_at
+        """
+        self.intervals = {}
+        for build in builds:
+            started_at = local_utils.timestring_to_timestamp(build["run_started_at"]).timestamp()
+            updated_at = local_utils.timestring_to_timestamp(build["run_updated_at"]).timestamp()
+            self.intervals[int(build["run_id"])] = (started_at, updated_at, int(build["run_id"]))
+        self.order = [int(build["run_id"]) for build in builds]
+        self.sorted_by_start = sorted(self.intervals.values(), key=lambda x: x[0])
+        self.starts = [x[0] for x in self.sorted_by_start]
+        self.tree = build_centered_tree(list(self.intervals.values()))
+        self.overlaps_prev = self.compute_overlaps_prev()
+        self.cluster = self.compute_clusters()
+
+    def compute_overlaps_prev(self) -> dict:
+        """Whether each build overlaps with its immediate predecessor in dataset order (check_overlap)."""
+        overlaps_prev = {}
+        for i, run_id in enumerate(self.order):
+            if i == 0:
+                overlaps_prev[run_id] = False
+                continue
+            prev_updated_at = self.intervals[self.order[i - 1]][1]
+            overlaps_prev[run_id] = self.intervals[run_id][0] < prev_updated_at
+        return overlaps_prev
+
+    def compute_clusters(self) -> dict:
+        """Group builds into clusters of transitively overlapping builds, with a sweep over start times."""
+        cluster = {}
+        cluster_id, cluster_end = -1, None
+        for started_at, updated_at, run_id in self.sorted_by_start:
+            if cluster_end is None or started_at >= cluster_end:
+                cluster_id += 1
+                cluster_end = updated_at
+            cluster_end = max(cluster_end, updated_at)
+            cluster[run_id] = cluster_id
+        return cluster
+
+    def stab(self, point: float) -> List[tuple]:
+        """Intervals with start < point < end."""
+        ret = []
+        node = self.tree
+        while node is not None:
+            if point < node.center:
+                for x in node.by_start:
+                    if x[0] >= point:
+                        break
+                    ret.append(x)
+                node = node.left
+            elif point > node.center:
+                for x in node.by_end:
+                    if x[1] <= point:
+                        break
+                    ret.append(x)
+                node = node.right
+            else:
+                ret += [x for x in node.by_start if x[0] < point < x[1]]
+                break
+        return ret
+
+    def overlapping(self, started_at: float, updated_at: float) -> List[int]:
+        """Run ids of builds running at some point in (started_at, updated_at), in O(log n + k)."""
+        # Builds started before the interval and still running at its start.
+        ret = [x[2] for x in self.stab(started_at)]
+        # Builds started within the interval.
+        lo = bisect.bisect_left(self.starts, started_at)
+        hi = bisect.bisect_left(self.starts, updated_at)
+        ret += [x[2] for x in self.sorted_by_start[lo:hi] if x[1] > started_at]
+        return ret
+
+    def concurrent_with(self, run_id: int) -> List[int]:
+        """Run ids of the other builds that were running concurrently with a build."""
+        started_at, updated_at, _ = self.intervals[int(run_id)]
+        return [x for x in self.overlapping(started_at, updated_at) if x != int(run_id)]
+
+    def concurrency_at(self, point: float) -> int:
+        return len(self.stab(point))
+
+    def clusters(self) -> List[List[int]]:
+        ret = {}
+        for _, _, run_id in self.sorted_by_start:
+            ret.setdefault(self.cluster[run_id], []).append(run_id)
+        return [ret[k] for k in sorted(ret)]
+
+    def to_dict(self) -> dict:
+        return {
+            "builds": [
+                {
+                    "run_id": run_id,
+                    "run_started_at": self.intervals[run_id][0],
+                    "run_updated_at": self.intervals[run_id][1],
+                    "overlaps_prev": self.overlaps_prev[run_id],
+                    "cluster": self.cluster[run_id],
+                }
+                for run_id in self.order
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IntervalIndex":
+        index = cls.__new__(cls)
+        index.order = [b["run_id"] for b in data["builds"]]
+        index.intervals = {b["run_id"]: (b["run_started_at"], b["run_updated_at"], b["run_id"]) for b in data["builds"]}
+        index.sorted_by_start = sorted(index.intervals.values(), key=lambda x: x[0])
+        index.starts = [x[0] for x in index.sorted_by_start]
+        index.tree = build_centered_tree(list(index.intervals.values()))
+        index.overlaps_prev = {b["run_id"]: b["overlaps_prev"] for b in data["builds"]}
+        index.cluster = {b["run_id"]: b["cluster"] for b in data["builds"]}
+        return index
+
+
+def get_interval_index_file(project: str, dataset_file: str) -> str:
+    dataset_name = os.path.splitext(os.path.basename(dataset_file))[0]
+    return os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, INTERVAL_INDEX_FOLDER, dataset_name, f"{project}.json")
+
+
+def save_interval_index(project: str, dataset_file: str, index: IntervalIndex, source: dict) -> None:
+    index_file = get_interval_index_file(project, dataset_file)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    with open(index_file, "w") as f:
+        json.dump(dict(index.to_dict(), source=source), f)
+
+
+def load_interval_index(project: str, dataset_file: str="lite_test_run_metadata.csv", builds: List[dict]=None) -> IntervalIndex:
+    """Load the persisted interval index of a project, building and saving it on first use or if dataset_file changed since.
+
+    builds: builds of the project already loaded from dataset_file, the index is also rebuilt if their run ids differ.
+    """
+    index_file = get_interval_index_file(project, dataset_file)
+    source = local_utils.get_file_stamp(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, dataset_file))
+    if os.path.exists(index_file):
+        data = json.load(open(index_file, "r"))
+        index = IntervalIndex.from_dict(data)
+        if data.get("source") == source and (builds is None or index.order == [int(build["run_id"]) for build in builds]):
+            return index
+    if builds is None:
+        df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, dataset_file))
+        builds = df[df["project"] == project].to_dict("records")
+    index = IntervalIndex(builds)
+    save_interval_index(project, dataset_file, index, source)
+    return index
+
+
+def runner_build_interval_indexes(dataset_file: str="lite_test_run_metadata.csv") -> None:
+    source = local_utils.get_file_stamp(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, dataset_file))
+    df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, dataset_file))
+    for project in df["project"].drop_duplicates().values.tolist():
+        index = IntervalIndex(df[df["project"] == project].to_dict("records"))
+        save_interval_index(project, dataset_file, index, source)
+        print(f"[interval-index] {project}: {len(index.order)} builds, {len(index.clusters())} overlap clusters")
+
+
+if __name__ == "__main__":
+    runner_build_interval_indexes(*sys.argv[1:])
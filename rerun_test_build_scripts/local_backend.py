@@ -0,0 +1,396 @@
+"""Rerun builds on this machine instead of on GitHub Actions.
+
+Each (build, order) job extracts the repo zip of the build into its own folder, lays the
+backed-up CI files and uv.toml over it, creates a virtualenv, runs the install commands of the
+project and the pytest command of the order's workflow, and writes the same files as a download
+from GitHub to `workflow_runs/{run_id}/`: `run_log_{order}.zip` (one log file per step),
+`artifact_{order}.zip` (`test-report.json`), `artifact_meta_{order}.json` and `run_meta_{order}.json`.
+Jobs run on a process pool. The pytest-ranking cache of each order is kept under
+`local_runs/cache/` and restored before and saved after each job, at the path of the actions/cache
+restore step of the order's workflow, as the workflows do.
+
+project_meta.json entries used:
+    local_install_commands: shell commands installing the project and its test deps in the venv
+    local_test_commands: optional, order -> test command, for orders whose workflow runs pytest
+        through another tool (e.g., tox)
+    wheel_cache_bucket_days: optional, days of builds sharing a wheel cache bucket (see wheel_cache),
+        0 to resolve deps as of the exact start of each build
+
+Usage: python3 local_backend.py PROJECT [MAX_WORKERS]
+"""
+
+import datetime
+import fcntl
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import artifact_manifest
+import consolidated_workflow
+import fast_import_commit
+import local_const
+import rerun_download
+import rerun_global_runs
+import rerun_journal
+import wheel_cache
+import worktree_sync
+
+LOCAL_RUNS_DIR = "local_runs"
+LOCAL_FORK_SLUG = "local"
+# pytest-ranking cache of workflows without a cache restore step.
+RANKING_CACHE_PATH = os.path.join(".pytest_cache", "v", "pytest_ranking_data")
+RANKING_INSTALL_COMMAND = "pip install pytest-ranking pytest-json-report"
+
+
+def get_test_command(workflow_file: str) -> str:
+    """The shell command of the workflow step writing the JSON test report."""
+    lines = open(workflow_file, "r").read().splitlines()
+    for i, line in enumerate(lines):
+        if "--json-report" not in line or line.strip().startswith("#"):
+            continue
+        start, end = i, i
+        # Join shell line continuations around the command.
+        while start > 0 and lines[start - 1].rstrip().endswith("\\"):
+            start -= 1
+        while end + 1 < len(lines) and lines[end].rstrip().endswith("\\"):
+            end += 1
+        command = " ".join(x.strip().rstrip("\\").strip() for x in lines[start:end + 1])
+        if command.startswith("run:"):
+            command = command[len("run:"):].strip()
+        if command.startswith(("pip install", "python -m pip install", "echo")):
+            # Steps installing pytest-json-report or printing the command, not running it.
+            continue
+        return command
+    return None
+
+
+def get_ranking_cache_path(workflow_file: str, run_name: str) -> str:
+    """Path of the pytest-ranking cache in the workspace, from the cache restore step of the workflow."""
+    lines = open(workflow_file, "r").read().splitlines(keepends=True)
+    steps = consolidated_workflow.split_steps(lines)["steps"]
+    paths = [
+        path for step in steps if consolidated_workflow.is_ranking_cache_restore(step)
+        for path in consolidated_workflow.get_cache_paths(step)
+    ]
+    if len(paths) == 0:
+        return RANKING_CACHE_PATH
+    path = re.sub(r"^\$\{\{\s*github\.workspace\s*\}\}/?", "", paths[0].strip("'\""))
+    path = path.replace("${{ github.workflow }}", run_name)
+    if "${{" in path:
+        raise ValueError(f"Cannot resolve the pytest-ranking cache path {paths[0]} of {workflow_file}")
+    return path
+
+
+def get_local_uv_toml(build: dict, exclude_newer: str=None) -> str:
+    """uv.toml of the GitHub workflows, minus installing into the system Python.
+
+    exclude_newer: resolve deps as of this time instead of the build start, e.g., a wheel_cache bucket start
+    """
+    return f"exclude-newer = \"{exclude_newer or build['run_started_at']}\"\n"
+
+
+def run_step(name: str, command: str, cwd: str, env: dict, logs: list, timeout: float) -> int:
+    start = time.time()
+    try:
+        process = subprocess.run(
+            command, shell=True, executable="/bin/bash", cwd=cwd, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        output, returncode = process.stdout.decode("utf-8", errors="replace"), process.returncode
+    except subprocess.TimeoutExpired as e:
+        output, returncode = (e.stdout or b"").decode("utf-8", errors="replace") + f"\nTimed out after {timeout}s\n", -1
+    logs.append((name, f"$ {command}\n{output}\nexit code {returncode}, {round(time.time() - start, 1)}s\n"))
+    return returncode
+
+
+def run_steps(steps: List[tuple], cwd: str, env: dict, logs: list, timeout: float) -> int:
+    """Run (name, command) steps until one fails, return the last exit code."""
+    returncode = 0
+    for name, command in steps:
+        returncode = run_step(name, command, cwd, env, logs, timeout)
+        if returncode != 0:
+            break
+    return returncode
+
+
+def copy_ranking_cache(src: str, dest: str, lock_file: str) -> None:
+    """Replace dest by a copy of src under an exclusive file lock, shared by all processes."""
+    with open(lock_file, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        if os.path.exists(dest):
+            shutil.rmtree(dest)
+        if os.path.exists(src):
+            shutil.copytree(src, dest)
+
+
+def run_order_job(job: dict) -> dict:
+    """Run the tests of one order on one build and write its results, return its run metadata."""
+    build, run_name = job["build"], job["run_name"]
+    workdir = job["workdir"]
+    created_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    rerun_id = time.time_ns() // 1000
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+
+    # Build snapshot, with the CI files and generated files laid over it.
+    worktree_sync.sync_zip_to_worktree(job["zip_file"], workdir, keep=[])
+    for path, local_path in job["overlay_files"].items():
+        os.makedirs(os.path.dirname(os.path.join(workdir, path)), exist_ok=True)
+        shutil.copy(local_path, os.path.join(workdir, path))
+    for path, content in job["overlay_contents"].items():
+        with open(os.path.join(workdir, path), "wb") as f:
+            f.write(content)
+    os.makedirs(os.path.dirname(job["cache_dir"]), exist_ok=True)
+    copy_ranking_cache(job["cache_dir"], os.path.join(workdir, job["ranking_cache_path"]), job["cache_lock_file"])
+
+    # Isolated virtualenv, found first on PATH by every step.
+    logs = []
+    venv_dir = os.path.join(workdir, ".venv")
+    env = dict(os.environ)
+    env.update({
+        "VIRTUAL_ENV": venv_dir,
+        "PATH": os.path.join(venv_dir, "bin") + os.pathsep + env.get("PATH", ""),
+        "UV_CONFIG_FILE": os.path.join(workdir, "uv.toml"),
+        "CI": "true",
+    })
+    env.pop("PYTHONHOME", None)
+    cache = job["wheel_cache"]
+    env.update(cache.get_shared_env())
+    install_steps = [("Install uv", "python -m pip install --upgrade pip uv")]
+    install_steps += [(f"Install packages {i + 1}", command) for i, command in enumerate(job["install_commands"])]
+    install_steps += [("Install pytest-ranking related", RANKING_INSTALL_COMMAND)]
+    returncode = run_step("Set up venv", f"{job['python']} -m venv {venv_dir}", workdir, env, logs, job["timeout"])
+    venv_ready = returncode == 0
+    if venv_ready and cache.has_wheels():
+        # Install from the wheelhouse of the bucket, without the index.
+        offline_env = dict(env, **cache.get_offline_env())
+        returncode = run_steps([(f"{name} (wheel cache)", command) for name, command in install_steps], workdir, offline_env, logs, job["timeout"])
+        if returncode != 0:
+            print(f"[local-run] {build['run_id']} {run_name}: wheel cache incomplete, installing from the index")
+            returncode = run_steps(install_steps, workdir, env, logs, job["timeout"])
+    elif venv_ready:
+        returncode = run_steps(install_steps, workdir, env, logs, job["timeout"])
+    # Deps released between the bucket start and the build start do not resolve as of the bucket start,
+    # install as of the build start like the workflows do, and keep these versions out of the bucket's wheelhouse.
+    bucket_resolved = True
+    build_uv_toml = get_local_uv_toml(build).encode("utf-8")
+    if venv_ready and returncode != 0 and job["overlay_contents"]["uv.toml"] != build_uv_toml:
+        print(f"[local-run] {build['run_id']} {run_name}: deps do not resolve at the bucket start, installing as of the build start")
+        with open(os.path.join(workdir, "uv.toml"), "wb") as f:
+            f.write(build_uv_toml)
+        bucket_resolved = False
+        returncode = run_steps([(f"{name} (build start)", command) for name, command in install_steps], workdir, env, logs, job["timeout"])
+    if returncode == 0 and bucket_resolved:
+        try:
+            cache.save(env, workdir)
+        except Exception as e:
+            print(f"[local-run] {build['run_id']} {run_name}: failed to save wheels: {e}")
+    tests_ran = returncode == 0
+    if tests_ran:
+        returncode = run_step("Run tests", job["test_command"], workdir, env, logs, job["timeout"])
+
+    # Save the ranking cache whether tests passed or not, as the workflows do.
+    if tests_ran:
+        copy_ranking_cache(os.path.join(workdir, job["ranking_cache_path"]), job["cache_dir"], job["cache_lock_file"])
+
+    save_folder = job["save_folder"]
+    os.makedirs(save_folder, exist_ok=True)
+    log_zip_file = os.path.join(save_folder, local_const.RUN_LOG_FILE.format(run_name=run_name))
+    log_zip_tmp = os.path.join(workdir, "run_log.zip")
+    with zipfile.ZipFile(log_zip_tmp, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for i, (name, text) in enumerate(logs):
+            zip_ref.writestr(f"default/{i + 1}_{name}.txt", text)
+    artifact_manifest.atomic_write(log_zip_file, open(log_zip_tmp, "rb").read())
+    report_file = os.path.join(workdir, "test-report.json")
+    has_report = tests_ran and os.path.exists(report_file)
+    art_info = {"total_count": 0, "artifacts": []}
+    if has_report:
+        art_tmp = os.path.join(workdir, "artifact.zip")
+        with zipfile.ZipFile(art_tmp, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            zip_ref.write(report_file, "test-report.json")
+        art_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_FILE.format(run_name=run_name))
+        artifact_manifest.atomic_write(art_file, open(art_tmp, "rb").read())
+        art_info = {"total_count": 1, "artifacts": [{
+            "name": local_const.ARTIFACT_NAME, "workflow_run": {"id": rerun_id}, "archive_download_url": None}]}
+    art_meta_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_META_FILE.format(run_name=run_name))
+    artifact_manifest.atomic_write_json(art_meta_file, art_info)
+
+    updated_at = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    info = {
+        "id": rerun_id,
+        "name": run_name,
+        "display_title": job["display_title"],
+        "head_sha": build["head_sha"],
+        "head_branch": LOCAL_FORK_SLUG,
+        "status": "completed",
+        # A pytest run with failing tests is a failed build, any other failing step fails it as well.
+        "conclusion": "success" if returncode == 0 else "failure",
+        "created_at": created_at,
+        "run_started_at": created_at,
+        "updated_at": updated_at,
+        "html_url": f"file://{os.path.abspath(log_zip_file)}",
+        "backend": "local",
+    }
+    # Write workflow run metadata last, has_rerun_results treats it as the completion marker.
+    artifact_manifest.atomic_write_json(os.path.join(save_folder, local_const.RUN_META_FILE.format(run_name=run_name)), info)
+    if not job["keep_workdir"]:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return info
+
+
+class LocalBackend:
+    def __init__(
+            self,
+            proj,
+            install_commands: List[str],
+            test_commands: dict=None,
+            max_workers: int=os.cpu_count(),
+            python: str=sys.executable,
+            timeout: float=local_const.LOCAL_RUN_TIMEOUT,
+            keep_workdir: bool=False,
+            wheel_cache_bucket_days: int=local_const.WHEEL_CACHE_BUCKET_DAYS,
+            ) -> None:
+        """
+        proj: a rerun_global_runs.ForkProject whose setup has backed up the CI files
+        install_commands: shell commands installing the project in the venv of a job
+        test_commands: order -> test command, overriding the command found in the order's workflow
+        python: interpreter creating the venvs
+        wheel_cache_bucket_days: builds started within the same bucket of days share deps, see wheel_cache
+        """
+        self.proj = proj
+        self.install_commands = install_commands
+        self.test_commands = test_commands if test_commands is not None else {}
+        self.max_workers = max_workers
+        self.python = python
+        self.timeout = timeout
+        self.keep_workdir = keep_workdir
+        self.wheel_cache_bucket_days = wheel_cache_bucket_days
+        self.local_runs_dir = os.path.join(proj.project_dir, LOCAL_RUNS_DIR)
+        # Collected results per (run_id, run name in the journal), until all orders of that run are in.
+        self.results = {}
+
+    def get_test_command(self, run_name: str) -> str:
+        if run_name in self.test_commands:
+            return self.test_commands[run_name]
+        command = get_test_command(os.path.join(self.proj.ci_file_backup_dir, "workflows", f"{run_name}.yml"))
+        if command is None or "${{" in command:
+            raise ValueError(f"No runnable test command in the {run_name} workflow of {self.proj.name}, set local_test_commands in project_meta.json")
+        return command
+
+    def get_ranking_cache_path(self, run_name: str) -> str:
+        return get_ranking_cache_path(os.path.join(self.proj.ci_file_backup_dir, "workflows", f"{run_name}.yml"), run_name)
+
+    def get_jobs(self, build: dict, journal_run_name: str) -> List[dict]:
+        """Jobs of the orders of one run of the fork project, e.g., all orders for the consolidated workflow."""
+        run_id = int(build["run_id"])
+        run_names = rerun_download.get_run_orders({"name": journal_run_name})
+        overlay_files = fast_import_commit.get_overlay_files(self.proj.ci_file_backup_dir, self.proj.ci_file_paths)
+        bucket_start = wheel_cache.get_bucket_start(build["run_started_at"], self.wheel_cache_bucket_days)
+        return [{
+            "build": build,
+            "run_name": run_name,
+            "journal_run_name": journal_run_name,
+            "num_journal_run_jobs": len(run_names),
+            "display_title": rerun_global_runs.get_commit_message(build),
+            "zip_file": os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "repo_zips", build["project"], f"{build['head_sha']}.zip"),
+            "overlay_files": overlay_files,
+            "overlay_contents": {
+                "uv.toml": get_local_uv_toml(build, bucket_start).encode("utf-8"),
+                "pytest_ranking_seed.txt": str(run_id).encode("utf-8"),
+            },
+            "workdir": os.path.join(self.local_runs_dir, "work", f"{run_id}_{run_name}"),
+            "cache_dir": os.path.join(self.local_runs_dir, "cache", run_name),
+            "ranking_cache_path": self.get_ranking_cache_path(run_name),
+            "cache_lock_file": os.path.join(self.local_runs_dir, "cache", f"{run_name}.lock"),
+            "save_folder": os.path.join(self.proj.workflowrun_dir, str(run_id)),
+            "python": self.python,
+            "install_commands": self.install_commands,
+            "test_command": self.get_test_command(run_name),
+            "timeout": self.timeout,
+            "keep_workdir": self.keep_workdir,
+            "wheel_cache": wheel_cache.WheelCache(self.proj.name, bucket_start),
+        } for run_name in run_names]
+
+    def rerun(self, num_builds_to_run: int=50) -> None:
+        """Run the rerun plan of the project, overlapping builds at the same time as on GitHub."""
+        journal = rerun_journal.get_journal()
+        plan = self.proj.get_rerun_plan(num_builds_to_run)
+        print(f"[local-run] {self.proj.name}: {len(plan)} builds to rerun on {self.max_workers} workers")
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            for step in plan:
+                if step["wait_for_previous"]:
+                    # Later builds must start from the ranking caches saved by earlier ones.
+                    wait(running)
+                    self.collect(running, journal)
+                build = step["build"]
+                # Same runs as on GitHub Actions, so the journal tells the same builds apart as downloaded.
+                jobs = [job for run_name in self.proj.run_names for job in self.get_jobs(build, run_name)]
+                journal.record_submitted(self.proj.name, build["run_id"], self.proj.run_names, None, LOCAL_FORK_SLUG)
+                for job in jobs:
+                    running[executor.submit(run_order_job, job)] = job
+            wait(running)
+            self.collect(running, journal)
+        self.proj.copy_snapshot_results()
+
+    def collect(self, running: dict, journal: rerun_journal.RerunJournal) -> None:
+        for future, job in list(running.items()):
+            if not future.done():
+                continue
+            del running[future]
+            run_id, journal_run_name = job["build"]["run_id"], job["journal_run_name"]
+            info = None
+            if future.exception() is not None:
+                print(f"[local-run] Failed {run_id} {job['run_name']}: {future.exception()}")
+                journal.record_error(self.proj.name, run_id, journal_run_name, repr(future.exception()))
+            else:
+                info = future.result()
+                print(f"[local-run] {run_id} {job['run_name']}: {info['conclusion']}")
+            results = self.results.setdefault((run_id, journal_run_name), [])
+            results.append(info)
+            if len(results) < job["num_journal_run_jobs"]:
+                continue
+            del self.results[(run_id, journal_run_name)]
+            if None in results:
+                continue
+            # A run of several orders fails if any of them fails, as a workflow with several jobs.
+            conclusion = "failure" if any(info["conclusion"] == "failure" for info in results) else "success"
+            journal.record_run(self.proj.name, run_id, dict(results[-1], name=journal_run_name, conclusion=conclusion))
+            journal.record_downloaded(self.proj.name, run_id, journal_run_name)
+
+
+def make_local_backend(proj, project_info: dict, max_workers: int=os.cpu_count()) -> LocalBackend:
+    if "local_install_commands" not in project_info:
+        exit(f"Set local_install_commands for {proj.name} in project_meta.json")
+    return LocalBackend(
+        proj,
+        install_commands=project_info["local_install_commands"],
+        test_commands=project_info.get("local_test_commands"),
+        max_workers=max_workers,
+        wheel_cache_bucket_days=project_info.get("wheel_cache_bucket_days", local_const.WHEEL_CACHE_BUCKET_DAYS))
+
+
+def run_project(project_info: dict, max_workers: int=os.cpu_count(), num_builds_to_run: int=50) -> None:
+    proj = rerun_global_runs.make_fork_project(project_info)
+    make_local_backend(proj, project_info, max_workers).rerun(num_builds_to_run)
+
+
+if __name__ == "__main__":
+    project_infos = json.load(open("project_meta.json", "r"))
+    args = sys.argv[1:]
+    if len(args) < 1 or args[0] not in project_infos:
+        exit("Invalid command, example command: python3 local_backend.py ipython 32")
+    run_project(project_infos[args[0]], int(args[1]) if len(args) > 1 else os.cpu_count())
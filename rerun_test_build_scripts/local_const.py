@@ -4,24 +4,70 @@ dir_path = os.path.dirname(os.path.realpath(__file__))
 
 RERUN_DIR = os.path.join(dir_path, "rerun_results")
 os.makedirs(RERUN_DIR, exist_ok=True)
+RERUN_JOURNAL_FILE = os.path.join(RERUN_DIR, "rerun_journal.sqlite3")
+WHEEL_CACHE_DIR = os.path.join(dir_path, "wheel_cache")
 DOWNLOAD_REPO_DIR = os.path.join(dir_path, "download_repo_data")
 CODEBASE_DIR = "fork_codebase"
 CI_FILE_BACKUP_DIR = "ci_file_backup"
 WORKFLOWRUN_DIR = "workflow_runs"
 
-CURL_PR_URL = "https://api.github.com/repos/{slug}/pulls"
-CURL_RUN_URL = "https://api.github.com/repos/{slug}/actions/runs"
-CURL_RUN_LOG_URL = "https://api.github.com/repos/{slug}/actions/runs/{run_id}/logs"
-CURL_RUN_ARTIFACT_URL = "https://api.github.com/repos/{slug}/actions/runs/{run_id}/artifacts"
-POST_RUN_CANCEL_URL = " https://api.github.com/repos/{slug}/actions/runs/{run_id}/cancel"
+# GitHub API and clone urls, point them at actions_emulator to rerun against local forks.
+GITHUB_API_URL = os.environ.get("RERUN_GITHUB_API_URL", "https://api.github.com")
+GITHUB_SSH_URL = os.environ.get("RERUN_GITHUB_CLONE_URL", "git@github.com:{slug}.git")
+
+CURL_PR_URL = GITHUB_API_URL + "/repos/{slug}/pulls"
+CURL_RUN_URL = GITHUB_API_URL + "/repos/{slug}/actions/runs"
+CURL_COMMIT_RUNS_URL = GITHUB_API_URL + "/repos/{slug}/actions/runs?head_sha={head_sha}&per_page=100"
+CURL_RUN_LOG_URL = GITHUB_API_URL + "/repos/{slug}/actions/runs/{run_id}/logs"
+CURL_RUN_ARTIFACT_URL = GITHUB_API_URL + "/repos/{slug}/actions/runs/{run_id}/artifacts"
+CURL_RUN_JOBS_URL = GITHUB_API_URL + "/repos/{slug}/actions/runs/{run_id}/jobs?per_page=100"
+CURL_JOB_LOG_URL = GITHUB_API_URL + "/repos/{slug}/actions/jobs/{job_id}/logs"
+POST_RUN_CANCEL_URL = GITHUB_API_URL + "/repos/{slug}/actions/runs/{run_id}/cancel"
+RATE_LIMIT_URL = GITHUB_API_URL + "/rate_limit"
 GITHUB_WORKFLOW_DIR = ".github/workflows"
-GITHUB_SSH_URL = "git@github.com:{slug}.git"
 
 ARTIFACT_NAME = "pytest-ranking upload test report json"
+# Test report artifact of one order in the WF_ALL_ORDERS workflow, see consolidated_workflow.
+ORDER_ARTIFACT_NAME = ARTIFACT_NAME + " {order}"
 
 # https://docs.github.com/en/rest/actions/workflow-runs?apiVersion=2022-11-28#list-workflow-runs-for-a-repository
 INCOMPLETE_STATUS = ["in_progress", "queued", "requested", "waiting", "pending"]
 
+# Cap on GitHub Actions runs in flight across all forks when rerunning projects concurrently.
+MAX_CONCURRENT_RUNS = 20
+
+# Number of rerun logs and artifacts downloaded concurrently.
+MAX_DOWNLOAD_WORKERS = 8
+
+# Which run logs are downloaded with the test report artifacts, see rerun_download.
+LOG_POLICY_FULL = "full"
+LOG_POLICY_ARTIFACT_ONLY = "artifact_only"
+LOG_POLICY_ON_FAILURE = "on_failure"
+LOG_POLICY_TEST_STEPS = "test_steps"
+LOG_POLICIES = [LOG_POLICY_FULL, LOG_POLICY_ARTIFACT_ONLY, LOG_POLICY_ON_FAILURE, LOG_POLICY_TEST_STEPS]
+LOG_POLICY = LOG_POLICY_FULL
+
+# Timeout of each step of a rerun with the local backend, as a GitHub Actions job times out after 6 hours.
+LOCAL_RUN_TIMEOUT = 6 * 3600
+
+# Seconds after which the upstream branch of a fork workspace is fetched again within a session.
+UPSTREAM_FETCH_MAX_AGE = 24 * 3600
+
+# Timeout of git and other commands run by process_runner, clones of large forks take minutes.
+COMMAND_TIMEOUT = 3600
+
+# Local reruns of builds started within the same bucket of days resolve deps as of the bucket start, sharing their wheels.
+# 0 keeps the exact start time of each build.
+WHEEL_CACHE_BUCKET_DAYS = 7
+
+# Builds of the same head_sha started within the same bucket of days are rerun once, see snapshot_dedup.
+# 0 reruns every build.
+SNAPSHOT_BUCKET_DAYS = 0
+
+# Local port receiving workflow_run webhook events of the forks, None to only poll.
+WEBHOOK_PORT = None
+WEBHOOK_SECRET = None
+
 
 EDIT_CI_FILE_BRANCH = "edited-ci-files"
 
@@ -45,6 +91,8 @@ CI_WORKFLOW_NAMES = [
     WF_CHANGEAWARE,
     WF_MIX
 ]
+# Workflow running all CI_WORKFLOW_NAMES orders one after another on one dependency install.
+WF_ALL_ORDERS = "all_orders"
 
 CI_WORKFLOW_MACRO = {
     WF_DEFUALT: 'Default',
@@ -1,6 +1,7 @@
 import datetime
 import os
 import re
+import zipfile
 
 
 def pr_number_in_run_title(title, pr_number):
@@ -30,20 +31,26 @@ def get_test_report_url(info, run_id, artifact_name):
 
 
 def compress_file(fpath):
-    current_dir = os.path.dirname(os.path.realpath(__file__))
+    """zip -r {fpath}.zip, with the members stored relative to the folder of fpath."""
     folder, fname = os.path.dirname(fpath), os.path.basename(fpath)
-    os.chdir(folder)
-    os.system(f"zip -r {fname}.zip {fname}")
-    os.chdir(current_dir)
+    with zipfile.ZipFile(fpath + ".zip", "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.write(fpath, fname)
+        for root, _, files in os.walk(fpath):
+            for name in files:
+                path = os.path.join(root, name)
+                zip_ref.write(path, os.path.relpath(path, folder))
+
+
+def get_file_stamp(fpath) -> dict:
+    """Modification time and size of a file, stored with indexes built from it to detect stale ones."""
+    stat = os.stat(fpath)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
 
 
 def decompress_file(fpath):
     if not os.path.exists(fpath) and os.path.exists(fpath+".zip"):
-        current_dir = os.path.dirname(os.path.realpath(__file__))
-        folder, fname = os.path.dirname(fpath), os.path.basename(fpath)
-        os.chdir(folder)
-        os.system(f"unzip {fname}.zip")
-        os.chdir(current_dir)
+        with zipfile.ZipFile(fpath + ".zip", "r") as zip_ref:
+            zip_ref.extractall(os.path.dirname(fpath))
 
 
 def get_modified_files_from_patch(patch: str):
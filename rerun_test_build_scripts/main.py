@@ -8,24 +8,27 @@ local_dir = os.path.join(script_dir, "..", "sync_prs")
 sys.path.append(parent_dir)
 sys.path.append(local_dir)
 
+import orchestrator
+import process_runner
 
 
 def run_projects(command):
     project_infos = json.load(open("project_meta.json", "r"))
     for project in project_infos:
-        os.system(f"python3 rerun_global_runs.py {project} {command}")
+        process_runner.run([sys.executable, "rerun_global_runs.py", project, command], cwd=script_dir or ".", timeout=None, check=False, capture=False)
         # input(f"[global-run] Finish {project}, press enter to continue:")
         pass
 
 def run_projects_random(command):
     project_infos = json.load(open("project_meta.json", "r"))
     for project in project_infos:
-        os.system(f"python3 rerun_random.py {project} {command}")
+        process_runner.run([sys.executable, "rerun_random.py", project, command], cwd=script_dir or ".", timeout=None, check=False, capture=False)
         # input(f"[global-run] Finish {project}, press enter to continue:")
         pass
 
 if __name__ == "__main__":
-    run_projects(command="setup,rerun")
+    # Set up and rerun all projects concurrently, instead of run_projects(command="setup,rerun").
+    orchestrator.run_projects()
     run_projects(command="download")
     run_projects_random(command="setup,rerun")
     run_projects_random(command="download")
@@ -0,0 +1,249 @@
+"""Rerun builds of many projects concurrently in one event loop.
+
+Each project follows the same plan as ForkProject.rerun, but its waits (for the runs of the
+previous submission to be listed and for previous runs to finish) are interleaved with the other projects',
+and the number of GitHub Actions runs in flight across all forks is capped. The runs of each busy
+fork are tracked by its RunWatcher: webhook events are counted within a second, otherwise the fork
+is polled with conditional requests every few seconds, backing off while nothing changes. Runs made
+stale by a later push of the same build, or duplicating results already downloaded, are cancelled
+when the runs of a fork are counted.
+
+Usage: python3 orchestrator.py [MAX_CONCURRENT_RUNS [PROJECT ...]]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List, Set
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import rerun_global_runs
+import rerun_journal
+import token_pool
+
+# Seconds between checks for runs changed by webhook events.
+EVENT_CHECK_INTERVAL = 1
+
+
+class RunSlots:
+    """Runs in flight per fork, capped globally and optionally per fork.
+
+    Counts go up by the number of workflows when a build is pushed, and are replaced by the
+    number of incomplete runs seen on the fork, once the runs of the push are listed.
+    """
+    def __init__(self, max_runs: int) -> None:
+        self.max_runs = max_runs
+        self.in_flight = {}
+        # Forks whose last push may not be listed yet, their counts are not replaced meanwhile.
+        self.submitting = set()
+        self.condition = asyncio.Condition()
+
+    def total(self) -> int:
+        return sum(self.in_flight.values())
+
+    async def acquire(self, fork: str, num_runs: int, max_fork_runs: int=None) -> None:
+        async with self.condition:
+            # A build larger than the cap may still run alone.
+            await self.condition.wait_for(
+                lambda: (self.total() + num_runs <= self.max_runs or self.total() == 0)
+                and (max_fork_runs is None or self.in_flight.get(fork, 0) + num_runs <= max_fork_runs or self.in_flight.get(fork, 0) == 0))
+            self.in_flight[fork] = self.in_flight.get(fork, 0) + num_runs
+
+    async def release(self, fork: str, num_runs: int) -> None:
+        async with self.condition:
+            self.in_flight[fork] = max(0, self.in_flight.get(fork, 0) - num_runs)
+            self.condition.notify_all()
+
+    async def update(self, fork: str, num_running: int) -> None:
+        async with self.condition:
+            self.in_flight[fork] = num_running
+            self.condition.notify_all()
+
+    async def wait_until_idle(self, fork: str) -> None:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight.get(fork, 0) == 0)
+
+    async def wait_until_busy(self, fork: str) -> None:
+        """Wait until the fork has runs in flight and no push being listed."""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight.get(fork, 0) > 0 and fork not in self.submitting)
+
+    async def set_submitting(self, fork: str, submitting: bool) -> None:
+        async with self.condition:
+            if submitting:
+                self.submitting.add(fork)
+            else:
+                self.submitting.discard(fork)
+            self.condition.notify_all()
+
+
+def get_stale_runs(proj: rerun_global_runs.ForkProject, runs: List[dict]) -> List[dict]:
+    """Incomplete reruns that no longer produce wanted results.
+
+    A run is stale if its (run_id, order) was pushed again since (superseded), if that
+    (run_id, order) already has downloadable results from another run, or if a newer run of the
+    same (run_id, order) is also in flight (duplicate).
+    """
+    journal = rerun_journal.get_journal()
+    stale, newest = [], {}
+    for run in sorted(runs, key=lambda run: run["id"], reverse=True):
+        if run["status"] not in local_const.INCOMPLETE_STATUS or run["name"] not in proj.run_names or "run_id" not in run["display_title"]:
+            continue
+        origin_run_id = rerun_journal.get_origin_run_id(run)
+        entry = next((e for e in journal.get_entries(proj.name, origin_run_id) if e["run_name"] == run["name"]), None)
+        key = (origin_run_id, run["name"])
+        if key in newest:
+            stale.append(run)
+        elif entry is not None and entry["pushed_sha"] is not None and entry["pushed_sha"] != run["head_sha"]:
+            stale.append(run)
+        elif entry is not None and entry["rerun_id"] not in [None, run["id"]] and (
+                entry["state"] in [rerun_journal.DOWNLOADED, rerun_journal.PARSED]
+                or (entry["state"] == rerun_journal.COMPLETED and entry["conclusion"] in rerun_journal.DOWNLOADABLE_CONCLUSIONS)):
+            stale.append(run)
+        newest.setdefault(key, run)
+    return stale
+
+
+def cancel_runs(proj: rerun_global_runs.ForkProject, runs: List[dict]) -> int:
+    """Cancel runs of the fork, return the number of cancellations GitHub accepted."""
+    num_cancelled = 0
+    for run in runs:
+        response = token_pool.post(rerun_global_runs.TOKENPOOL, local_const.POST_RUN_CANCEL_URL.format(slug=proj.fork_slug, run_id=run["id"]))
+        # 409 when the run completed in the meantime.
+        if response.status_code == 202:
+            num_cancelled += 1
+            print(f"[orchestrator] {proj.fork_slug}: cancelled stale run {run['id']} ({run['display_title']}, {run['name']})")
+        else:
+            print(f"[orchestrator] {proj.fork_slug}: failed to cancel run {run['id']}: {response.status_code}")
+    return num_cancelled
+
+
+async def count_running_runs(proj: rerun_global_runs.ForkProject, cancelled: Set[int]) -> int:
+    """Number of incomplete runs the watcher of the fork knows, after cancelling the stale ones.
+
+    cancelled: ids of runs cancelled before, not counted while they wind down
+    """
+    running = [run for run in proj.watcher.get_runs() if run["status"] in local_const.INCOMPLETE_STATUS and run["id"] not in cancelled]
+    stale = await asyncio.to_thread(get_stale_runs, proj, running)
+    if len(stale) > 0:
+        await asyncio.to_thread(cancel_runs, proj, stale)
+        # Cancelled runs stop taking runners, do not count them while they wind down.
+        cancelled |= set(run["id"] for run in stale)
+        running = [run for run in running if run["id"] not in cancelled]
+    return len(running)
+
+
+async def monitor_fork(proj: rerun_global_runs.ForkProject, slots: RunSlots) -> None:
+    """Keep the count of runs in flight of a fork up to date while it is busy.
+
+    Runs are counted again as soon as a webhook event changes one, and the fork is polled at the
+    interval of its watcher. A failed poll keeps the last count and is retried at the next interval.
+    """
+    interval = proj.watcher.min_interval
+    cancelled = set()
+    poll = True
+    while True:
+        await slots.wait_until_busy(proj.fork_slug)
+        changed = True
+        try:
+            if poll:
+                changed = await asyncio.to_thread(proj.watcher.poll)
+            num_running = await count_running_runs(proj, cancelled)
+        except Exception as e:
+            print(f"[orchestrator] {proj.fork_slug}: failed to poll runs: {type(e).__name__}: {e}")
+        else:
+            if num_running != slots.in_flight.get(proj.fork_slug, 0):
+                await slots.update(proj.fork_slug, num_running)
+                print(f"[orchestrator] {proj.fork_slug}: {num_running} runs in flight, {slots.total()} in total")
+        interval = proj.watcher.next_interval(interval, changed)
+        version = proj.watcher.version
+        deadline = time.time() + interval
+        while time.time() < deadline and proj.watcher.version == version:
+            await asyncio.sleep(min(EVENT_CHECK_INTERVAL, deadline - time.time()))
+        # Events keep the watcher up to date, only poll when none came.
+        poll = proj.watcher.version == version
+
+
+async def monitor_runs(projects: List[rerun_global_runs.ForkProject], slots: RunSlots) -> None:
+    """Track the runs in flight of every fork, see monitor_fork."""
+    await asyncio.gather(*[monitor_fork(proj, slots) for proj in projects])
+
+
+async def gather_monitored(projects: List[rerun_global_runs.ForkProject], slots: RunSlots, coroutines: list) -> None:
+    """Run coroutines while monitor_runs updates slots, and fail if the monitor stops.
+
+    The coroutines wait on slots, which only the monitor frees, so they would hang without it.
+    """
+    monitor = asyncio.create_task(monitor_runs(projects, slots))
+    work = asyncio.ensure_future(asyncio.gather(*coroutines))
+    try:
+        await asyncio.wait([monitor, work], return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+            monitor.result()
+            raise RuntimeError("run monitor stopped")
+        await work
+    finally:
+        monitor.cancel()
+
+
+async def submit_build(proj: rerun_global_runs.ForkProject, slots: RunSlots, build: dict) -> None:
+    """Push a build and wait until its runs are listed, so the monitor does not count the fork without them."""
+    await slots.set_submitting(proj.fork_slug, True)
+    try:
+        # Each project prepares its builds in its own codebase folder, without changing the working directory.
+        await asyncio.to_thread(proj.submit_build_to_rerun, build)
+        await asyncio.to_thread(proj.wait_for_submitted_runs)
+    finally:
+        await slots.set_submitting(proj.fork_slug, False)
+
+
+async def rerun_project(
+        proj: rerun_global_runs.ForkProject,
+        slots: RunSlots,
+        num_builds_to_run: int,
+        ) -> None:
+    plan = await asyncio.to_thread(proj.get_rerun_plan, num_builds_to_run)
+    print(f"[orchestrator] {proj.name}: {len(plan)} builds to rerun")
+    num_runs = len(proj.run_names)
+    for step in plan:
+        if step["wait_for_previous"]:
+            await slots.wait_until_idle(proj.fork_slug)
+        await slots.acquire(proj.fork_slug, num_runs)
+        await submit_build(proj, slots, step["build"])
+    await slots.wait_until_idle(proj.fork_slug)
+    print(f"[orchestrator] {proj.name}: finished")
+
+
+async def run_campaign(
+        projects: List[rerun_global_runs.ForkProject],
+        max_concurrent_runs: int,
+        num_builds_to_run: int=50,
+        setup: bool=True,
+        ) -> None:
+    slots = RunSlots(max_concurrent_runs)
+    if setup:
+        await asyncio.gather(*[asyncio.to_thread(proj.setup) for proj in projects])
+    await gather_monitored(projects, slots, [rerun_project(proj, slots, num_builds_to_run) for proj in projects])
+
+
+def run_projects(max_concurrent_runs: int=local_const.MAX_CONCURRENT_RUNS, project_names: List[str]=None, setup: bool=True) -> None:
+    project_infos = json.load(open("project_meta.json", "r"))
+    if project_names is None or len(project_names) == 0:
+        project_names = list(project_infos.keys())
+    projects = [rerun_global_runs.make_fork_project(project_infos[name]) for name in project_names]
+    asyncio.run(run_campaign(projects, max_concurrent_runs, setup=setup))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run_projects(int(args[0]) if len(args) > 0 else local_const.MAX_CONCURRENT_RUNS, args[1:])
@@ -0,0 +1,126 @@
+"""Download global run data (runs, commits, patches) for many projects concurrently."""
+
+import datetime
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import artifact_manifest
+import download_global_runs_dataset as dataset
+import local_const
+import token_pool
+
+PROGRESS_FILE = "download_progress.json"
+
+STAGE_RUNS = "runs"
+STAGE_COMMITS = "commits"
+STAGE_PATCHES = "patches"
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_BUDGET_EXHAUSTED = "budget_exhausted"
+
+
+class ProjectProgress:
+    """Per-project stage status, persisted so an interrupted refresh resumes where it stopped."""
+    def __init__(self, slug: str, start_date: str, end_date: str) -> None:
+        self.slug = slug
+        owner, project_name = slug.split("/")
+        self.project_name = project_name
+        # Progress of the runs stage is only valid for the same date range.
+        self.range_key = f"{start_date}..{end_date}"
+        project_dir = os.path.join(local_const.DOWNLOAD_REPO_DIR, project_name)
+        os.makedirs(project_dir, exist_ok=True)
+        self.progress_file = os.path.join(project_dir, PROGRESS_FILE)
+        self.lock = threading.Lock()
+        self.stages = {}
+        if os.path.exists(self.progress_file):
+            progress = json.load(open(self.progress_file, "r"))
+            if progress.get("range") == self.range_key:
+                self.stages = progress.get("stages", {})
+
+    def is_done(self, stage: str) -> bool:
+        return self.stages.get(stage, {}).get("status") == STATUS_DONE
+
+    def update(self, stage: str, status: str, message: str="") -> None:
+        with self.lock:
+            self.stages[stage] = {
+                "status": status,
+                "message": message,
+                "updated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            # Temp file and rename, a crash mid-write must not lose the resume state.
+            artifact_manifest.atomic_write_json(self.progress_file, {"slug": self.slug, "range": self.range_key, "stages": self.stages})
+        print(f"[parallel-download] {self.project_name} {stage}: {status} {message}")
+
+
+def run_stage(progress: ProjectProgress, stage: str, func, *args) -> bool:
+    """Run one download stage of a project, return whether it finished."""
+    if progress.is_done(stage):
+        return True
+    try:
+        func(*args)
+    except token_pool.BudgetExhausted as e:
+        progress.update(stage, STATUS_BUDGET_EXHAUSTED, str(e))
+        return False
+    except Exception as e:
+        progress.update(stage, STATUS_FAILED, f"{type(e).__name__}: {e}")
+        return False
+    progress.update(stage, STATUS_DONE)
+    return True
+
+
+def download_project(slug: str, start_date: str, end_date: str, stage_pool: ThreadPoolExecutor) -> None:
+    """Download runs of a project, then its commits and patches concurrently."""
+    progress = ProjectProgress(slug, start_date, end_date)
+    if not run_stage(progress, STAGE_RUNS, dataset.download_global_runs, slug, start_date, end_date):
+        return
+    futures = [
+        stage_pool.submit(run_stage, progress, STAGE_COMMITS, dataset.download_global_run_commits, slug),
+        stage_pool.submit(run_stage, progress, STAGE_PATCHES, dataset.download_global_run_commit_patches, slug),
+    ]
+    for future in futures:
+        future.result()
+
+
+def runner_parallel_download_global_run_data(
+        max_projects: int=4,
+        max_requests: int=None,
+        start_date: str=dataset.DATASET_START_DATE,
+        end_date: str=dataset.DATASET_END_DATE,
+        ) -> None:
+    """Parallel version of download_global_runs_dataset.runner_download_global_run_data.
+
+    max_projects: number of projects downloaded at the same time.
+    max_requests: global GitHub API request budget of this refresh, shared by all projects.
+    Stages cut short by the budget are picked up again on the next call.
+    """
+    if max_requests is not None:
+        dataset.TOKENPOOL.budget = token_pool.RequestBudget(max_requests)
+    project_meta = json.load(open("project_meta.json", "r"))
+    slugs = [meta["origin_slug"] for meta in project_meta.values()]
+    # Commit and patch stages get their own pool, so they never wait behind a project's runs stage.
+    with ThreadPoolExecutor(max_workers=max_projects) as project_pool, \
+            ThreadPoolExecutor(max_workers=2 * max_projects) as stage_pool:
+        futures = [project_pool.submit(download_project, slug, start_date, end_date, stage_pool) for slug in slugs]
+        for future in futures:
+            future.result()
+    if dataset.TOKENPOOL.budget is not None:
+        print(f"[parallel-download] Remaining request budget: {dataset.TOKENPOOL.budget.remaining()}")
+        dataset.TOKENPOOL.budget = None
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runner_parallel_download_global_run_data(
+        max_projects=int(args[0]) if len(args) > 0 else 4,
+        max_requests=int(args[1]) if len(args) > 1 else None,
+    )
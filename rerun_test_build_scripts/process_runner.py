@@ -0,0 +1,84 @@
+"""Run commands with an explicit working directory, and do file operations in process.
+
+Commands never go through a shell nor change the working directory of the process, so builds of
+several projects can be prepared in threads of one process. A command that fails or times out
+raises CommandError with its output, instead of being ignored.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+from typing import List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+
+
+class CommandError(Exception):
+    def __init__(self, command: List[str], cwd: str, returncode: int, output: str) -> None:
+        self.command = command
+        self.cwd = cwd
+        self.returncode = returncode
+        self.output = output
+        super().__init__(f"{' '.join(command)} (in {cwd}) exited with {returncode}:\n{output[-2000:]}")
+
+
+def run(
+        args: List[str],
+        cwd: str=None,
+        timeout: float=local_const.COMMAND_TIMEOUT,
+        check: bool=True,
+        capture: bool=True,
+        env: dict=None,
+        ) -> subprocess.CompletedProcess:
+    """Run a command.
+
+    cwd: working directory of the command, the process working directory is left unchanged
+    timeout: seconds before the command is killed, None to wait forever
+    check: raise CommandError if the command fails
+    capture: keep stdout/stderr in the result, otherwise they go to the console
+    """
+    pipe = subprocess.PIPE if capture else None
+    try:
+        process = subprocess.run(args, cwd=cwd, env=env, timeout=timeout, text=True, stdout=pipe, stderr=pipe)
+    except subprocess.TimeoutExpired as e:
+        raise CommandError(args, cwd, -1, f"{e.stdout or ''}{e.stderr or ''}\nTimed out after {timeout}s") from e
+    if check and process.returncode != 0:
+        raise CommandError(args, cwd, process.returncode, f"{process.stdout or ''}{process.stderr or ''}")
+    return process
+
+
+def git(repo_dir: str, args: List[str], check: bool=True, timeout: float=local_const.COMMAND_TIMEOUT) -> str:
+    """Run a git command in repo_dir, return its stripped stdout."""
+    return run(["git"] + args, cwd=repo_dir, check=check, timeout=timeout).stdout.strip()
+
+
+def remove(path: str) -> None:
+    """rm -rf path."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def copy_file(src: str, dest: str) -> None:
+    """cp src dest, creating the parent folders of dest."""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    shutil.copy(src, dest)
+
+
+def copy_tree(src: str, dest: str) -> None:
+    """cp -r src/. dest, merging into dest if it exists."""
+    shutil.copytree(src, dest, symlinks=True, dirs_exist_ok=True)
+
+
+def replace_tree(src: str, dest: str) -> None:
+    """Make dest a copy of src."""
+    remove(dest)
+    copy_tree(src, dest)
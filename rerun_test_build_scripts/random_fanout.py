@@ -0,0 +1,107 @@
+"""Spread the random-order reruns of a project over several forks.
+
+Builds with regression failures are put in one queue, and every fork (the default
+`{fork_slug}-{rerun_order}` and the forks listed under `random_fork_slugs` in project_meta.json)
+takes the next build as soon as it has room for its runs, so all forks stay busy. Each fork has
+its own clone and CI file backup, and the runs in flight are capped per fork and across forks.
+
+Usage: python3 random_fanout.py PROJECT setup,rerun,download [MAX_CONCURRENT_RUNS]
+"""
+
+import asyncio
+import json
+import os
+import sys
+from typing import List
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import orchestrator
+import rerun_random
+
+# Runs in flight per fork, as the single-fork rerun keeps at most two builds of ten runs.
+MAX_FORK_RUNS = 20
+
+
+def make_fork_projects(project_info: dict, rerun_order: str=local_const.WF_RANDOM) -> List[rerun_random.ForkProject]:
+    """The default fork of the order, then the extra forks of the project."""
+    return [
+        rerun_random.ForkProject(
+            name=project_info["name"],
+            origin_slug=project_info["origin_slug"],
+            fork_slug=project_info["fork_slug"],
+            fork_branch=project_info["fork_branch"],
+            edited_ci_file_paths=project_info["edited_ci_file_paths"],
+            rerun_order=rerun_order,
+            use_fast_import=project_info.get("use_fast_import", False),
+            replica_fork_slug=replica_fork_slug)
+        for replica_fork_slug in [None] + project_info.get("random_fork_slugs", [])
+    ]
+
+
+async def rerun_fork(
+        proj: rerun_random.ForkProject,
+        queue: asyncio.Queue,
+        slots: orchestrator.RunSlots,
+        max_fork_runs: int,
+        ) -> None:
+    num_runs = len(proj.RERUN_WORKFLOW_NAMES)
+    num_submitted = 0
+    while not queue.empty():
+        # Wait for room before taking a build, so that idle forks take the next ones.
+        await slots.acquire(proj.fork_slug, num_runs, max_fork_runs)
+        if queue.empty():
+            await slots.release(proj.fork_slug, num_runs)
+            break
+        build = queue.get_nowait()
+        await orchestrator.submit_build(proj, slots, build)
+        num_submitted += 1
+    await slots.wait_until_idle(proj.fork_slug)
+    print(f"[fanout] {proj.fork_slug}: finished, {num_submitted} builds submitted")
+
+
+async def run_fanout(
+        projects: List[rerun_random.ForkProject],
+        max_concurrent_runs: int,
+        max_fork_runs: int=MAX_FORK_RUNS,
+        ) -> None:
+    proj = projects[0]
+    run_ids = json.load(open(rerun_random.BUILD_WITH_REAL_FAILED_TESTS_JSON_FILE, "r"))[proj.name][proj.rerun_order]
+    df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
+    queue = asyncio.Queue()
+    for run_id in run_ids:
+        # Skip if this build bas been rerun.
+        if proj.has_rerun_results(run_id):
+            continue
+        queue.put_nowait(df[(df["project"] == proj.name) & (df["run_id"] == run_id)].to_dict("records")[0])
+    print(f"[fanout] {proj.name}: {queue.qsize()} builds to rerun on {len(projects)} forks")
+
+    slots = orchestrator.RunSlots(max_concurrent_runs)
+    await orchestrator.gather_monitored(projects, slots, [rerun_fork(proj, queue, slots, max_fork_runs) for proj in projects])
+
+
+def run_project(project_info: dict, actions: List[str], max_concurrent_runs: int=local_const.MAX_CONCURRENT_RUNS) -> None:
+    projects = make_fork_projects(project_info)
+    if rerun_random.ACTION_SETUP in actions:
+        for proj in projects:
+            proj.setup()
+    if rerun_random.ACTION_RERUN in actions:
+        asyncio.run(run_fanout(projects, max_concurrent_runs))
+    if rerun_random.ACTION_DOWNLOAD in actions:
+        for proj in projects:
+            proj.download_rerun_results(log_policy=project_info.get("log_policy", local_const.LOG_POLICY))
+
+
+if __name__ == "__main__":
+    project_infos = json.load(open("project_meta.json", "r"))
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in project_infos:
+        exit("Invalid command, example command: python3 random_fanout.py ipython setup,rerun 60")
+    run_project(project_infos[args[0]], args[1].split(","), int(args[2]) if len(args) > 2 else local_const.MAX_CONCURRENT_RUNS)
@@ -0,0 +1,166 @@
+"""Replay the builds of a project with their original relative start times, compressed in time.
+
+Builds of one overlap cluster (see interval_index) are submitted at their original offsets from the
+start of the cluster divided by the compression factor, and a new cluster starts only once all
+runs of the previous one are finished, so builds that did not overlap in history do not overlap
+in the replay either. For every build, the number of builds running when it started in history
+(intended concurrency) is reported next to the number running when it was submitted (achieved).
+
+The scheduler drives either the fork of a project or a simulated clock, where each rerun takes
+its original duration times a duration factor, to preview a replay before paying for it.
+
+Usage: python3 replay_scheduler.py PROJECT COMPRESSION_FACTOR [simulate]
+"""
+
+import heapq
+import json
+import os
+import sys
+import time
+from typing import List
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import interval_index
+import local_const
+import local_utils
+import rerun_global_runs
+
+REPLAY_REPORT_FILE = "replay_report_{mode}_x{factor}.csv"
+
+
+def get_started_at(build: dict) -> float:
+    return local_utils.timestring_to_timestamp(build["run_started_at"]).timestamp()
+
+
+def get_duration(build: dict) -> float:
+    return local_utils.timestring_to_timestamp(build["run_updated_at"]).timestamp() - get_started_at(build)
+
+
+class SimulatedBackend:
+    """Virtual clock on which each submitted build runs for its original duration times duration_factor."""
+    def __init__(self, duration_factor: float=1.0) -> None:
+        self.duration_factor = duration_factor
+        self.clock = 0.0
+        # Heap of end times of running builds.
+        self.running = []
+
+    def now(self) -> float:
+        return self.clock
+
+    def sleep_until(self, t: float) -> None:
+        self.clock = max(self.clock, t)
+        while self.running and self.running[0] <= self.clock:
+            heapq.heappop(self.running)
+
+    def running_builds(self) -> int:
+        self.sleep_until(self.clock)
+        return len(self.running)
+
+    def wait_until_idle(self) -> None:
+        if self.running:
+            self.sleep_until(max(self.running))
+
+    def submit(self, build: dict) -> None:
+        heapq.heappush(self.running, self.clock + get_duration(build) * self.duration_factor)
+
+
+class ForkBackend:
+    """Submit builds to the fork of a ForkProject, on the wall clock."""
+    def __init__(self, proj) -> None:
+        self.proj = proj
+
+    def now(self) -> float:
+        return time.time()
+
+    def sleep_until(self, t: float) -> None:
+        time.sleep(max(0.0, t - time.time()))
+
+    def running_builds(self) -> int:
+        self.proj.watcher.poll()
+        runs = self.proj.watcher.get_runs()
+        return len(set(run["head_sha"] for run in runs if run["status"] in local_const.INCOMPLETE_STATUS))
+
+    def wait_until_idle(self) -> None:
+        self.proj.wait_for_submitted_runs()
+        self.proj.wait_till_all_previous_runs_finish()
+
+    def submit(self, build: dict) -> None:
+        self.proj.submit_build_to_rerun(build)
+
+
+class ReplayScheduler:
+    def __init__(self, builds: List[dict], index: interval_index.IntervalIndex, compression_factor: float) -> None:
+        """
+        builds: builds to replay
+        index: interval index of the builds to replay, so intended concurrency counts only replayed builds
+        compression_factor: how many times faster than history builds are started, e.g., 100
+        """
+        self.builds = sorted(builds, key=get_started_at)
+        self.index = index
+        self.compression_factor = compression_factor
+
+    def run(self, backend) -> pd.DataFrame:
+        report = []
+        replay_start = backend.now()
+        cluster, cluster_started_at, cluster_replay_start = None, None, None
+        for build in self.builds:
+            run_id = int(build["run_id"])
+            started_at = get_started_at(build)
+            if self.index.cluster[run_id] != cluster:
+                # Builds of the previous cluster had all finished before this one started.
+                backend.wait_until_idle()
+                cluster = self.index.cluster[run_id]
+                cluster_started_at, cluster_replay_start = started_at, backend.now()
+            scheduled_at = cluster_replay_start + (started_at - cluster_started_at) / self.compression_factor
+            backend.sleep_until(scheduled_at)
+            row = {
+                "run_id": run_id,
+                "cluster": cluster,
+                "scheduled_at": round(scheduled_at - replay_start, 3),
+                "submitted_at": round(backend.now() - replay_start, 3),
+                "intended_concurrency": self.index.concurrency_at(started_at),
+                "achieved_concurrency": backend.running_builds(),
+            }
+            backend.submit(build)
+            report.append(row)
+            print(f"[replay] {row}")
+        backend.wait_until_idle()
+        report = pd.DataFrame(report)
+        history_span = get_started_at(self.builds[-1]) + get_duration(self.builds[-1]) - get_started_at(self.builds[0]) if self.builds else 0
+        print(
+            f"[replay] {len(report.index)} builds in {round(backend.now() - replay_start)}s "
+            + f"(history: {round(history_span)}s, compression x{self.compression_factor})"
+        )
+        if len(report.index):
+            matched = (report["intended_concurrency"] == report["achieved_concurrency"]).mean()
+            diff = (report["achieved_concurrency"] - report["intended_concurrency"]).abs().mean()
+            print(f"[replay] builds with intended concurrency: {round(100 * matched, 2)}%, mean absolute difference: {round(diff, 2)}")
+        return report
+
+
+def replay_project(project_info: dict, compression_factor: float, simulate: bool=False, duration_factor: float=1.0, num_builds_to_run: int=50) -> pd.DataFrame:
+    """Replay the rerun plan of a project on its fork, or on a simulated clock."""
+    proj = rerun_global_runs.make_fork_project(project_info)
+    builds = [step["build"] for step in proj.get_rerun_plan(num_builds_to_run)]
+    index = interval_index.IntervalIndex(builds)
+    backend = SimulatedBackend(duration_factor) if simulate else ForkBackend(proj)
+    report = ReplayScheduler(builds, index, compression_factor).run(backend)
+    report_file = os.path.join(proj.project_dir, REPLAY_REPORT_FILE.format(mode="simulated" if simulate else "fork", factor=compression_factor))
+    report.to_csv(report_file, index=False)
+    print(f"[replay] Writing {report_file}")
+    return report
+
+
+if __name__ == "__main__":
+    project_infos = json.load(open("project_meta.json", "r"))
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in project_infos:
+        exit("Invalid command, example command: python3 replay_scheduler.py ipython 100 simulate")
+    replay_project(project_infos[args[0]], float(args[1]), simulate=len(args) > 2 and args[2] == "simulate")
@@ -0,0 +1,255 @@
+"""Download the logs and test report artifacts of completed reruns concurrently.
+
+The log of a rerun and its artifact (metadata, then zip) are fetched as separate tasks on a
+bounded thread pool, so many reruns are in flight at once. Files are written as they arrive, and
+the run metadata, which has_rerun_results treats as the completion marker, is written only once
+all files of the rerun are in place. A rerun cut short (error or interruption) is fetched again
+by the next download. The artifacts, logs and run metadata of a run of the consolidated workflow
+(local_const.WF_ALL_ORDERS) are saved under the file names of each order, as if they were separate runs:
+the log of an order holds the job log cut to the steps of that order (named `... ({order})`) and their step logs.
+
+The log policy (local_const.LOG_POLICIES) sets which logs come with the artifacts:
+- full: the log zip of every run,
+- artifact_only: no logs, fetch_log downloads the log of a run when an analysis reads it,
+- on_failure: the log zip of failed runs only,
+- test_steps: the logs of each job cut to the steps from the pytest-ranking cache restore to its
+  save (the tests and the plugin output), in a zip with the layout of the full log zip.
+Log zips made here (test_steps, orders of a consolidated run) say how they were cut in their zip
+comment, see get_log_info, as their sizes are not comparable with those of full logs.
+"""
+
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import artifact_manifest
+import local_const
+import local_utils
+import rerun_journal
+import token_pool
+
+
+def get_run_orders(info: dict) -> List[str]:
+    """Orders whose results a workflow run holds, all of them for the consolidated workflow."""
+    if info["name"] == local_const.WF_ALL_ORDERS:
+        return local_const.CI_WORKFLOW_NAMES
+    return [info["name"]]
+
+
+def get_order_artifact_name(info: dict, order: str) -> str:
+    if info["name"] == local_const.WF_ALL_ORDERS:
+        return local_const.ORDER_ARTIFACT_NAME.format(order=order)
+    return local_const.ARTIFACT_NAME
+
+
+def should_download_log(info: dict, log_policy: str) -> bool:
+    if log_policy == local_const.LOG_POLICY_ARTIFACT_ONLY:
+        return False
+    if log_policy == local_const.LOG_POLICY_ON_FAILURE:
+        return info["conclusion"] == "failure"
+    return True
+
+
+def make_log_comment(log_policy: str, split_order: str=None) -> bytes:
+    items = [f"log_policy={log_policy}"] + ([f"split_order={split_order}"] if split_order is not None else [])
+    return ", ".join(items).encode("utf-8")
+
+
+def get_log_info(log_zip_file: str) -> dict:
+    """Policy a log zip was downloaded with, and the order it was split for if it comes from a consolidated run.
+
+    Log zips as downloaded from GitHub have no comment, they are full logs.
+    """
+    with zipfile.ZipFile(log_zip_file, "r") as zip_ref:
+        comment = zip_ref.comment.decode("utf-8", errors="replace")
+    info = {"log_policy": local_const.LOG_POLICY_FULL, "split_order": None}
+    for item in comment.split(", "):
+        key, _, value = item.partition("=")
+        if key in info:
+            info[key] = value
+    return info
+
+
+def get_test_steps(steps: List[dict]) -> List[dict]:
+    """Steps of a job from the pytest-ranking cache restore to its save, all steps if there is no such cache."""
+    names = [step["name"].lower() for step in steps]
+    first = next((i for i, name in enumerate(names) if "restore pytest-ranking cache" in name), None)
+    last = next((i for i in range(len(names) - 1, -1, -1) if "save pytest-ranking cache" in names[i]), None)
+    if first is None or last is None or last < first:
+        return steps
+    return steps[first:last + 1]
+
+
+def cut_log(lines: List[str], started_at: str, completed_at: str) -> List[str]:
+    """Lines of a job log from started_at to completed_at.
+
+    Log lines start with a timestamp (e.g., 2025-03-01T10:00:00.1234567Z), step times are to the second.
+    Lines without one belong with the line before.
+    """
+    kept = []
+    keep = False
+    for line in lines:
+        if re.match(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d", line):
+            keep = started_at[:19] <= line[:19] <= completed_at[:19]
+        if keep:
+            kept.append(line)
+    return kept
+
+
+def get_jobs(tokenpool, fork_slug: str, info: dict) -> List[dict]:
+    return token_pool.query_info(tokenpool, local_const.CURL_RUN_JOBS_URL.format(slug=fork_slug, run_id=info["id"]))["jobs"]
+
+
+def get_test_step_log(tokenpool, fork_slug: str, jobs: List[dict]) -> bytes:
+    """Zip of the test steps of each job of a run, as get_test_steps."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.comment = make_log_comment(local_const.LOG_POLICY_TEST_STEPS)
+        for i, job in enumerate(jobs):
+            steps = [step for step in get_test_steps(job["steps"]) if step.get("started_at") and step.get("completed_at")]
+            if len(steps) == 0:
+                continue
+            log = token_pool.query_binary(tokenpool, local_const.CURL_JOB_LOG_URL.format(slug=fork_slug, job_id=job["id"]))
+            lines = log.decode("utf-8", errors="replace").splitlines(keepends=True)
+            job_name = job["name"].replace("/", "_")
+            # Same file names as the full log zip: the job log at the root, step logs in a folder per job.
+            zip_ref.writestr(f"{i}_{job_name}.txt", "".join(cut_log(lines, steps[0]["started_at"], steps[-1]["completed_at"])))
+            for step in steps:
+                step_name = step["name"].replace("/", "_")
+                zip_ref.writestr(f"{job_name}/{step['number']}_{step_name}.txt", "".join(cut_log(lines, step["started_at"], step["completed_at"])))
+    return buffer.getvalue()
+
+
+def split_order_log(log: bytes, jobs: List[dict], order: str, log_policy: str=local_const.LOG_POLICY_FULL) -> bytes:
+    """Log zip of one order of a consolidated run: the job logs cut to the steps of the order, and their step logs."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(log), "r") as source, zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.comment = make_log_comment(log_policy, order)
+        names = source.namelist()
+        for i, job in enumerate(jobs):
+            steps = [
+                step for step in job["steps"]
+                if step["name"].endswith(f"({order})") and step.get("started_at") and step.get("completed_at")
+            ]
+            if len(steps) == 0:
+                continue
+            job_name = job["name"].replace("/", "_")
+            job_log_name = f"{i}_{job_name}.txt"
+            if job_log_name in names:
+                lines = source.read(job_log_name).decode("utf-8", errors="replace").splitlines(keepends=True)
+                zip_ref.writestr(job_log_name, "".join(cut_log(lines, steps[0]["started_at"], steps[-1]["completed_at"])))
+            numbers = set(str(step["number"]) for step in steps)
+            for name in names:
+                if name.startswith(f"{job_name}/") and os.path.basename(name).split("_")[0] in numbers:
+                    zip_ref.writestr(name, source.read(name))
+    return buffer.getvalue()
+
+
+def download_log(tokenpool, fork_slug: str, save_folder: str, info: dict, log_policy: str=local_const.LOG_POLICY_FULL) -> None:
+    """Download workflow run log as zip, one per order for the consolidated workflow."""
+    jobs = None
+    if log_policy == local_const.LOG_POLICY_TEST_STEPS or info["name"] == local_const.WF_ALL_ORDERS:
+        jobs = get_jobs(tokenpool, fork_slug, info)
+    if log_policy == local_const.LOG_POLICY_TEST_STEPS:
+        log = get_test_step_log(tokenpool, fork_slug, jobs)
+    else:
+        log = token_pool.query_binary(
+            mytokenpool=tokenpool,
+            myurl=local_const.CURL_RUN_LOG_URL.format(slug=fork_slug, run_id=info["id"]))
+    for order in get_run_orders(info):
+        order_log = split_order_log(log, jobs, order, log_policy) if info["name"] == local_const.WF_ALL_ORDERS else log
+        run_log_file = os.path.join(save_folder, local_const.RUN_LOG_FILE.format(run_name=order))
+        artifact_manifest.atomic_write(run_log_file, order_log)
+
+
+def fetch_log(tokenpool, save_folder: str, order: str, log_policy: str=local_const.LOG_POLICY_FULL) -> str:
+    """Path of the log of the rerun of an order in save_folder, downloaded first if the download policy skipped it.
+
+    Return None if the rerun has no results yet.
+    """
+    run_meta_file = os.path.join(save_folder, local_const.RUN_META_FILE.format(run_name=order))
+    if not os.path.exists(run_meta_file):
+        return None
+    with open(run_meta_file, "r") as f:
+        info = json.load(f)
+    run_log_file = os.path.join(save_folder, local_const.RUN_LOG_FILE.format(run_name=order))
+    if not artifact_manifest.is_complete(run_log_file):
+        print(f"[global-run] Fetch log of rerun_id: {info['id']}, {info['name']}")
+        download_log(tokenpool, info["repository"]["full_name"], save_folder, info, log_policy)
+    return run_log_file
+
+
+def download_artifact(tokenpool, fork_slug: str, save_folder: str, info: dict) -> None:
+    """Download workflow run artifact metadata, then the test report artifact of each order as zip."""
+    rerun_id, run_name = info["id"], info["name"]
+    art_query = local_const.CURL_RUN_ARTIFACT_URL.format(slug=fork_slug, run_id=rerun_id)
+    art_info = token_pool.query_info(tokenpool, art_query)
+    art_meta_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_META_FILE.format(run_name=run_name))
+    artifact_manifest.atomic_write_json(art_meta_file, art_info)
+    for order in get_run_orders(info):
+        art_download_query = local_utils.get_test_report_url(art_info, rerun_id, get_order_artifact_name(info, order))
+        if art_download_query is not None:
+            art = token_pool.query_binary(mytokenpool=tokenpool, myurl=art_download_query)
+            art_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_FILE.format(run_name=order))
+            artifact_manifest.atomic_write(art_file, art)
+
+
+def download_reruns(
+        tokenpool,
+        project: str,
+        fork_slug: str,
+        reruns: List[dict],
+        max_workers: int=local_const.MAX_DOWNLOAD_WORKERS,
+        log_policy: str=local_const.LOG_POLICY,
+        ) -> int:
+    """Download reruns, each a dict with the origin run_id, its save_folder and the workflow run info.
+
+    log_policy: which logs to download, one of local_const.LOG_POLICIES
+    Return the number of reruns fully downloaded.
+    """
+    if log_policy not in local_const.LOG_POLICIES:
+        raise ValueError(f"unknown log policy {log_policy}, expected one of {local_const.LOG_POLICIES}")
+    journal = rerun_journal.get_journal()
+    num_downloaded = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # future -> index of its rerun, and number of unfinished tasks per rerun.
+        futures = {}
+        pending = []
+        failed = set()
+        for i, rerun in enumerate(reruns):
+            os.makedirs(rerun["save_folder"], exist_ok=True)
+            futures[executor.submit(download_artifact, tokenpool, fork_slug, rerun["save_folder"], rerun["info"])] = i
+            pending.append(1)
+            if should_download_log(rerun["info"], log_policy):
+                futures[executor.submit(download_log, tokenpool, fork_slug, rerun["save_folder"], rerun["info"], log_policy)] = i
+                pending[i] += 1
+        for future in as_completed(futures):
+            i = futures[future]
+            rerun = reruns[i]
+            info = rerun["info"]
+            pending[i] -= 1
+            if future.exception() is not None:
+                print(f"[global-run] Failed to download rerun_id: {info['id']}, {info['name']}: {future.exception()}")
+                journal.record_error(project, rerun["run_id"], info["name"], repr(future.exception()))
+                failed.add(i)
+            if pending[i] > 0 or i in failed:
+                continue
+            # Write workflow run metadata last, has_rerun_results treats it as the completion marker.
+            for order in get_run_orders(info):
+                run_meta_file = os.path.join(rerun["save_folder"], local_const.RUN_META_FILE.format(run_name=order))
+                artifact_manifest.atomic_write_json(run_meta_file, info)
+            journal.record_downloaded(project, rerun["run_id"], info["name"])
+            num_downloaded += 1
+            print(f"[global-run] Downloaded rerun_id: {info['id']}, original: {rerun['run_id']}, {info['name']}, {num_downloaded}/{len(reruns)}")
+    return num_downloaded
@@ -1,10 +1,8 @@
 import datetime
-import glob
 import json
 import os
 import sys
-import time
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 import pandas as pd
@@ -15,18 +13,34 @@ local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
 sys.path.append(parent_dir)
 sys.path.append(local_dir)
 
+import artifact_manifest
+import budget_planner
+import compact_test_report
+import consolidated_workflow
+import fast_import_commit
+import interval_index
+import local_backend
 import local_const
 import local_utils
+import process_runner
+import rerun_download
+import rerun_journal
+import run_watcher
+import snapshot_dedup
 import token_pool
+import workspace_manager
+import worktree_pool
+import worktree_sync
 
 TOKENPOOL = token_pool.TokenPool()
 
 ACTION_RERUN = "rerun"
 ACTION_SETUP = "setup"
 ACTION_DOWNLOAD = "download"
+ACTION_RERUN_LOCAL = "rerun_local"
 
 END_DATE_STR = (datetime.datetime.today() + datetime.timedelta(days=2)).strftime('%Y-%m-%d')
-WORKFLOW_SEARCH_URL = "https://api.github.com/repos/{slug}/actions/runs?&per_page=100&page={page_number}"
+WORKFLOW_SEARCH_URL = local_const.CURL_RUN_URL + "?&per_page=100&page={page_number}"
 
 
 class ForkProject:
@@ -37,9 +51,20 @@ class ForkProject:
             fork_slug: str,
             fork_branch: str,
             edited_ci_file_paths: List[str],
+            use_fast_import: bool=False,
+            consolidate_orders: bool=False,
+            snapshot_bucket_days: int=local_const.SNAPSHOT_BUCKET_DAYS,
+            compact_report: bool=False,
+            budget_minutes: float=None,
             ) -> None:
         """
         edited_ci_file_paths: workflow files we edited
+        use_fast_import: create build commits with git fast-import instead of in the codebase folder
+        consolidate_orders: push one workflow running all orders on one install, see consolidated_workflow
+        snapshot_bucket_days: builds of a head_sha started within the same bucket of days are rerun once (0: off), see snapshot_dedup
+        compact_report: upload the compact test report instead of the full one, see compact_test_report
+        budget_minutes: if set, rerun the builds budget_planner picks within this many runner minutes,
+        instead of the first builds
         """
         self.name = name
         self.origin_slug = origin_slug
@@ -48,7 +73,24 @@ class ForkProject:
         self.fork_clone_url = local_const.GITHUB_SSH_URL.format(slug=fork_slug)
         self.fork_branch = fork_branch
         self.ci_file_paths = edited_ci_file_paths
+        self.use_fast_import = use_fast_import
+        self.consolidate_orders = consolidate_orders
+        self.snapshot_bucket_days = snapshot_bucket_days
+        self.compact_report = compact_report
+        self.budget_minutes = budget_minutes
+        # Workflow runs triggered by each push.
+        self.run_names = [local_const.WF_ALL_ORDERS] if consolidate_orders else local_const.CI_WORKFLOW_NAMES
         self.init_datafolders()
+        # setup fell back to the workflows of each order.
+        if consolidate_orders and os.path.exists(self.ci_file_backup_dir) and not os.path.exists(self.workflow_backup_dir):
+            self.use_order_workflows()
+        # Tracks runs of the fork branch, from webhook events if a receiver is configured, else by polling.
+        self.watcher = run_watcher.RunWatcher(self.fork_slug, self.fork_branch, TOKENPOOL)
+        receiver = run_watcher.get_webhook_receiver()
+        if receiver is not None:
+            receiver.register(self.watcher)
+        self.last_pushed_sha = None
+        self.workspace = workspace_manager.Workspace(self.codebase_dir, self.fork_clone_url, self.origin_clone_url)
 
     def init_datafolders(self) -> None:
         """setup folders to store data for this project"""
@@ -58,141 +100,218 @@ class ForkProject:
         fork_codebase_dir = os.path.join(self.project_dir, "fork_codebase")
         self.codebase_dir = os.path.join(fork_codebase_dir, self.name)
         self.ci_file_backup_dir = os.path.join(self.project_dir, local_const.CI_FILE_BACKUP_DIR)
+        workflow_dir = consolidated_workflow.CONSOLIDATED_WORKFLOW_DIR if self.consolidate_orders else "workflows"
+        self.workflow_backup_dir = os.path.join(self.ci_file_backup_dir, workflow_dir)
         self.workflowrun_dir = os.path.join(self.project_dir, local_const.WORKFLOWRUN_DIR)
 
+    def use_order_workflows(self) -> None:
+        """Push the workflow of each order, for projects whose workflows cannot be consolidated."""
+        self.consolidate_orders = False
+        self.run_names = local_const.CI_WORKFLOW_NAMES
+        self.workflow_backup_dir = os.path.join(self.ci_file_backup_dir, "workflows")
+
     def setup(self) -> None:
         """Setup/Reset the local fork folder and ci_file_backup folder."""
         print("[global-run] Setting up")
-        # Clean up the old fork clone.
-        fork_codebase_dir = os.path.join(self.project_dir, "fork_codebase")
-        if os.path.exists(fork_codebase_dir):
-            os.system(f"rm -rf {fork_codebase_dir}/*")
-        if os.path.exists(self.ci_file_backup_dir):
-            os.system(f"rm -rf {self.ci_file_backup_dir}")
+        # Clean up the old CI file backup.
+        process_runner.remove(self.ci_file_backup_dir)
 
         # Create folders.
-        os.makedirs(fork_codebase_dir, exist_ok=True)
         os.makedirs(self.ci_file_backup_dir, exist_ok=True)
         os.makedirs(self.workflowrun_dir, exist_ok=True)
 
-        # Clone the project fork.
-        current_dir = os.getcwd()
-        os.chdir(fork_codebase_dir)
-        os.system(f"git clone {self.fork_clone_url} {self.name}")
-        os.chdir(current_dir)
+        # Clone the project fork, or reuse the clone of a previous session.
+        self.workspace.ensure_clone()
 
         # Copy the CI files as backup.
         print("[global-run] Back up modified .github/workflows")
-        os.chdir(self.codebase_dir)
         # Check out fork branch with modified CI files.
-        os.system(f"git checkout {local_const.EDIT_CI_FILE_BRANCH}")
-        os.system("git pull")
+        process_runner.git(self.codebase_dir, ["checkout", local_const.EDIT_CI_FILE_BRANCH])
+        process_runner.git(self.codebase_dir, ["pull"])
         # Backup modified CI files.
-        os.system(f"cp -r .github/workflows {self.ci_file_backup_dir}")
+        process_runner.copy_tree(os.path.join(self.codebase_dir, ".github", "workflows"), os.path.join(self.ci_file_backup_dir, "workflows"))
         for file in self.ci_file_paths:
-            file_dir = os.path.dirname(file)
-            os.makedirs(os.path.join(self.ci_file_backup_dir, file_dir), exist_ok=True)
-            os.system(f"cp {file} {self.ci_file_backup_dir}/{file}")
+            process_runner.copy_file(os.path.join(self.codebase_dir, file), os.path.join(self.ci_file_backup_dir, file))
+
+        if self.compact_report:
+            print("[global-run] Upload compact test reports")
+            try:
+                compact_test_report.add_compact_report_steps(os.path.join(self.ci_file_backup_dir, "workflows"))
+            except ValueError as e:
+                print(f"[global-run] Warning: cannot upload compact test reports of {self.name}, uploading full ones: {e}")
+                self.compact_report = False
+
+        if self.consolidate_orders:
+            print("[global-run] Merge the order workflows")
+            try:
+                consolidated_workflow.write_consolidated_workflow(self.ci_file_backup_dir)
+            except ValueError as e:
+                print(f"[global-run] Warning: cannot merge the order workflows of {self.name}, rerunning them separately: {e}")
+                self.use_order_workflows()
+
+        if self.compact_report:
+            process_runner.copy_file(
+                compact_test_report.__file__,
+                os.path.join(self.workflow_backup_dir, os.path.basename(compact_test_report.SCRIPT_PATH)))
 
         # Checkout back to the default branch.
-        os.system(f"git checkout {self.fork_branch}")
-
-        # Back to script dir and finish.
-        os.chdir(current_dir)
+        process_runner.git(self.codebase_dir, ["checkout", self.fork_branch])
 
-    def rerun(self, num_builds_to_run: int=50) -> None:
+    def rerun(self, num_builds_to_run: int=50, pipeline_depth: int=0) -> None:
         """Rerun builds for a project.
 
         num_builds_to_run: number of builds to run.
+        pipeline_depth: if > 0, prepare build commits ahead with rerun_pipelined.
+        """
+        plan = self.get_rerun_plan(num_builds_to_run)
+        if pipeline_depth > 0:
+            self.rerun_pipelined(plan, pipeline_depth)
+            return
+        for step in plan:
+            # Wait until the previous build's runs are listed, so that Github API result is updated.
+            self.wait_for_submitted_runs()
+            if step["wait_for_previous"]:
+                # Simulate overlapping by starting them in parallel
+                self.wait_till_all_previous_runs_finish()
+            self.submit_build_to_rerun(step["build"])
+
+    def rerun_pipelined(self, plan: List[dict], pipeline_depth: int) -> None:
+        """Rerun a plan, preparing the commits of the next builds in the background while earlier ones run.
+
+        pipeline_depth: number of builds prepared at the same time, each in its own worktree
+        (with git fast-import when use_fast_import is set).
+        """
+        self.fetch_upstream()
+        pool = None
+        if not self.use_fast_import:
+            pool = worktree_pool.WorktreePool(self.codebase_dir, os.path.join(self.project_dir, "worktrees"), pipeline_depth)
+        with ThreadPoolExecutor(max_workers=pipeline_depth) as executor:
+            commits = []
+            num_submitted = 0
+            for step in plan:
+                # Prepare at most pipeline_depth builds ahead of the pushes.
+                while num_submitted < len(plan) and len(commits) < pipeline_depth:
+                    commits.append(executor.submit(self.prepare_build_commit, plan[num_submitted]["build"], pool))
+                    num_submitted += 1
+                commit = commits.pop(0)
+                # Same waits as rerun, the push is released once the build's commit is ready.
+                self.wait_for_submitted_runs()
+                if step["wait_for_previous"]:
+                    self.wait_till_all_previous_runs_finish()
+                self.push_build_commit(step["build"], commit.result())
+
+    def get_rerun_plan(self, num_builds_to_run: int=50) -> List[dict]:
+        """List the builds to rerun in order, and whether each must wait for all previous runs to finish.
+
+        num_builds_to_run: number of builds to run, unless budget_minutes is set.
         """
         # Load global test run dataset.
         df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
         # Rerun test run builds for the project.
         builds = df[df["project"] == self.name].to_dict("records")
-        print(f"[global-run] Number of runs: {len(builds)}")
+        index = interval_index.load_interval_index(self.name, builds=builds)
+        duplicate_of = snapshot_dedup.get_duplicate_of(builds, self.snapshot_bucket_days)
+        print(f"[global-run] Number of runs: {len(builds)}, rerun through an earlier build of the same snapshot: {len(duplicate_of)}")
+        if self.budget_minutes is not None:
+            return self.get_budget_plan(builds, duplicate_of)
+        plan = []
+        # Whether a skipped build would have waited for all previous runs to finish.
+        skipped_wait = False
         for i, build in enumerate(builds):
             # Skip if this build bas been rerun.
             if self.has_rerun_results(build["run_id"]):
                 continue
             # Submit first build.
             if i == 0:
-                self.submit_build_to_rerun(build)
+                plan.append({"build": build, "is_first": True, "wait_for_previous": False})
                 continue
-            #  Get the previous build info.
-            is_overlap = check_overlap(builds[i-1], build)
+            #  Whether the build overlaps with the previous build.
+            is_overlap = index.overlaps_prev[int(build["run_id"])]
             # Stop around given limit at a non-overlapping build.
             if i >= num_builds_to_run and not is_overlap:
                 break
-            if not is_overlap:
-                # Simulate overlapping by starting them in parallel
-                self.wait_till_all_previous_runs_finish()
-            # Wait a bit before the next run, so that Github API result is updated.
-            time.sleep(10)
-            self.submit_build_to_rerun(build)
+            # Results of the first build of the snapshot are copied to this build after download.
+            if int(build["run_id"]) in duplicate_of:
+                skipped_wait = skipped_wait or not is_overlap
+                continue
+            plan.append({"build": build, "is_first": False, "wait_for_previous": not is_overlap or skipped_wait})
+            skipped_wait = False
+        return plan
+
+    def get_budget_plan(self, builds: List[dict], duplicate_of: dict) -> List[dict]:
+        """Rerun plan of the builds budget_planner picks within budget_minutes."""
+        stats = budget_planner.load_rerun_stats(self.name, self.workflowrun_dir)
+        costs = budget_planner.estimate_costs(builds, stats, len(local_const.CI_WORKFLOW_NAMES), self.consolidate_orders)
+        selection = budget_planner.select_builds(builds, costs, self.budget_minutes, self.has_rerun_results, duplicate_of)
+        print(
+            f"[global-run] Budget of {self.budget_minutes} minutes: {len(selection['run_ids'])} builds, "
+            + f"{selection['minutes']:.0f} minutes estimated, {selection['num_failures']} failed builds covered"
+        )
+        run_ids = set(selection["run_ids"])
+        plan = []
+        for build in builds:
+            if int(build["run_id"]) not in run_ids:
+                continue
+            # Builds in between are skipped, wait unless the build overlapped with the previous selected one.
+            is_overlap = len(plan) > 0 and check_overlap(plan[-1]["build"], build)
+            plan.append({"build": build, "is_first": len(plan) == 0, "wait_for_previous": len(plan) > 0 and not is_overlap})
+        return plan
+
+    def copy_snapshot_results(self, builds: List[dict]=None) -> None:
+        """Copy the results of rerun builds to the builds of the same snapshot left out of the rerun plan."""
+        if builds is None:
+            df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
+            builds = df[df["project"] == self.name].to_dict("records")
+        num_copied = snapshot_dedup.copy_snapshot_results(self.workflowrun_dir, builds, self.snapshot_bucket_days)
+        if num_copied > 0:
+            print(f"[global-run] Copied results to {num_copied} builds of rerun snapshots")
 
     def wait_till_all_previous_runs_finish(self) -> None:
         """Wait until all running github action builds are finished."""
-        query = WORKFLOW_SEARCH_URL.format(slug=self.fork_slug, page_number=1)
-        info = token_pool.query_info(TOKENPOOL, query)
-        while has_running_workflow_runs(info):
-            print("[global-run] Waiting running runs to finish.")
-            time.sleep(60)
-            # Query update info again.
-            info = token_pool.query_info(TOKENPOOL, query)
+        print("[global-run] Waiting running runs to finish.")
+        self.watcher.wait_until_idle()
+
+    def wait_for_submitted_runs(self, timeout: int=60) -> None:
+        """Wait until GitHub lists the runs of the last pushed build, so that later waits see them."""
+        if self.last_pushed_sha is None:
+            return
+        if not self.watcher.wait_for_registered_runs(self.last_pushed_sha, len(self.run_names), timeout=timeout):
+            print(f"[global-run] Runs of {self.last_pushed_sha} not listed after {timeout}s, continuing.")
+        # Remember which runs belong to the push.
+        journal = rerun_journal.get_journal()
+        for run in self.watcher.get_runs(self.last_pushed_sha):
+            if run["name"] in self.run_names:
+                journal.record_run(self.name, rerun_journal.get_origin_run_id(run), run)
 
     def submit_build_to_rerun(self, build: dict) -> None:
         """Rerun a build."""
+        if self.use_fast_import:
+            self.submit_build_with_fast_import(build)
+            return
         print("\n[global-run] build info:", build)
         project = build["project"]
         run_id = build["run_id"]
         head_sha = build["head_sha"]
-        run_conclusion = build["run_conclusion"]
-        head_branch = build["head_branch"]
 
         # Reset codebase.
         self.reset_codebase_to_origin_head()
 
-        # Remove everything but .git folder.
+        # Sync the build snapshot into the codebase, keeping the .git folder.
         print("\n[global-run] Reconstruct build commit")
-        normal_files = glob.glob(os.path.join(self.codebase_dir, "*"))
-        hidden_files = glob.glob(os.path.join(self.codebase_dir, ".*"))
-        for file in normal_files + hidden_files:
-            if os.path.basename(file) != ".git":
-                os.system(f"rm -rf {file}")
-        # Unzip {head_sha}.zip and copy all files to a temp folder.
-        temp_extract_folder = os.path.join(self.project_dir, "temp_zip_extract")
-        os.makedirs(temp_extract_folder, exist_ok=True)
         zip_file = os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "repo_zips", project, f"{head_sha}.zip")
-        # Extract the zip file to a temporary folder.
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(temp_extract_folder)
-        # Copy all files from the unzipped folder to the codebase folder.
-        owner, project = self.origin_slug.split("/")
-        head_sha_prefix = head_sha[:7]
-        os.system(f"cp -r {temp_extract_folder}/{owner}-{project}-{head_sha_prefix}/. {self.codebase_dir}/")
-        # Remove the temporary extraction folder.
-        os.system(f"rm -rf {temp_extract_folder}/{owner}-{project}-{head_sha_prefix}")
+        sync_stats = worktree_sync.sync_zip_to_worktree(zip_file, self.codebase_dir)
+        print(f"[global-run] Synced snapshot: {sync_stats}")
 
         # Copy backed up .github/workflows to the codebase folder.
-        os.makedirs(f"{self.codebase_dir}/.github/workflows", exist_ok=True)
-        os.system(f"rm -rf {self.codebase_dir}/.github/workflows/*")
-        os.system(f"cp -r {self.ci_file_backup_dir}/workflows/. {self.codebase_dir}/.github/workflows/")
+        process_runner.replace_tree(self.workflow_backup_dir, os.path.join(self.codebase_dir, ".github", "workflows"))
         for file in self.ci_file_paths:
-            # print(f"cp {self.ci_file_backup_dir}/{file} {self.codebase_dir}/{file}")
-            os.makedirs(f"{self.codebase_dir}/{os.path.dirname(file)}", exist_ok=True)
-            os.system(f"cp {self.ci_file_backup_dir}/{file} {self.codebase_dir}/{file}")
+            process_runner.copy_file(os.path.join(self.ci_file_backup_dir, file), os.path.join(self.codebase_dir, file))
 
         # Add uv.toml for the uv library, allowing us to install deps with versions
         # released prior to a configured date.
         # https://docs.astral.sh/uv/reference/settings/#exclude-newer
-        run_started_at = build["run_started_at"]
-        uv_file_lines = [
-            f"exclude-newer = \"{run_started_at}\"",
-            "[pip]",
-            "system = true",
-        ]
         with open(os.path.join(self.codebase_dir, "uv.toml"), "w") as f:
-            f.write("\n".join(uv_file_lines) + "\n")
+            f.write(get_uv_toml(build))
 
         # Add run_id to repo that can be fetched as seed for random RTP order.
         with open(os.path.join(self.codebase_dir, "pytest_ranking_seed.txt"), "w") as f:
@@ -200,86 +319,147 @@ class ForkProject:
 
         # Push this version of the code as commit.
         print("\n[global-run] Push code")
-        current_dir = os.getcwd()
-        os.chdir(self.codebase_dir)
-        message = f"run_id={run_id}, outcome={run_conclusion}, bh={head_branch}, sha={head_sha}"
+        message = get_commit_message(build)
         # Run id from commit message will be extracted to use as Random RTP order seed, via:
         # git log -1 --pretty=%B | tr -d '\n' | awk -F'run_id=' '{print $2}' | awk -F',' '{print $1}'
-        os.system("git add .")
-        os.system(f"git commit -m '{message}'")
-        os.system(f"git push origin HEAD:{self.fork_branch} --force")
-        os.chdir(current_dir)
+        process_runner.git(self.codebase_dir, ["add", "."])
+        # Allow an empty commit, so that a snapshot equal to the fork branch still triggers the runs.
+        process_runner.git(self.codebase_dir, ["commit", "--allow-empty", "-m", message])
+        commit_sha = process_runner.git(self.codebase_dir, ["rev-parse", "HEAD"])
+        # Record the push first, so runs of the previous push of the build are stale as soon as the new ones show up.
+        rerun_journal.get_journal().record_submitted(self.name, run_id, self.run_names, commit_sha, self.fork_slug)
+        process_runner.git(self.codebase_dir, ["push", "origin", f"HEAD:{self.fork_branch}", "--force"])
+        self.last_pushed_sha = commit_sha
+
+    def submit_build_with_fast_import(self, build: dict) -> None:
+        """Rerun a build, creating its commit with git fast-import without touching the codebase folder."""
+        print("\n[global-run] build info:", build)
+        self.fetch_upstream()
+
+        print("\n[global-run] Import build commit")
+        commit_sha = self.prepare_build_commit(build)
+        self.push_build_commit(build, commit_sha)
+
+    def prepare_build_commit(self, build: dict, pool: worktree_pool.WorktreePool=None) -> str:
+        """Create the commit of a build under refs/rerun/{run_id}, in a worktree of pool or with git fast-import, return its sha."""
+        run_id = build["run_id"]
+        commit_args = {
+            "zip_file": os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "repo_zips", build["project"], f"{build['head_sha']}.zip"),
+            "parent": f"upstream/{self.fork_branch}",
+            "ref": fast_import_commit.RERUN_REF.format(run_id=run_id),
+            "message": get_commit_message(build) + "\n",
+            "overlay_files": fast_import_commit.get_overlay_files(self.ci_file_backup_dir, self.ci_file_paths, self.workflow_backup_dir),
+            "overlay_contents": {
+                "uv.toml": get_uv_toml(build).encode("utf-8"),
+                "pytest_ranking_seed.txt": str(run_id).encode("utf-8"),
+            },
+        }
+        if pool is None:
+            return fast_import_commit.commit_zip_snapshot(self.codebase_dir, **commit_args)
+        worktree_dir = pool.acquire()
+        try:
+            return worktree_pool.commit_in_worktree(worktree_dir, **commit_args)
+        finally:
+            pool.release(worktree_dir)
+
+    def push_build_commit(self, build: dict, commit_sha: str) -> None:
+        """Push a commit made by prepare_build_commit to the fork branch."""
+        run_id = build["run_id"]
+        ref = fast_import_commit.RERUN_REF.format(run_id=run_id)
+        print(f"\n[global-run] Push code of {run_id}")
+        rerun_journal.get_journal().record_submitted(self.name, run_id, self.run_names, commit_sha, self.fork_slug)
+        process_runner.git(self.codebase_dir, ["push", "origin", f"{ref}:refs/heads/{self.fork_branch}", "--force"])
+        self.last_pushed_sha = commit_sha
 
     def reset_codebase_to_origin_head(self) -> None:
-        current_dir = os.getcwd()
-        os.chdir(self.codebase_dir)
-        # Clean up any uncommitted changes.
-        print("[global-run] Clean local changes in fork")
-        os.system("git reset --hard")
-        os.system("git clean -fd")
-        os.system(f"git checkout {self.fork_branch}")
-
-        # Reset the fork to origin.
+        # The files are replaced by the build snapshot next, only the branch is moved back to origin.
         print("[global-run] Reset fork to origin")
-        os.system(f"git remote add upstream {self.origin_clone_url}")
-        os.system("git fetch upstream")
-        os.system(f"git checkout {self.fork_branch}")
-        os.system(f"git reset --hard upstream/{self.fork_branch}")
-        # os.system(f"git push --force origin {self.fork_branch}")
-        os.chdir(current_dir)
+        self.workspace.reset_to_upstream(self.fork_branch)
+
+    def fetch_upstream(self) -> None:
+        self.workspace.fetch_upstream(self.fork_branch)
 
     def has_rerun_results(self, run_id: int) -> bool:
+        if rerun_journal.get_journal().is_downloaded(self.name, run_id, self.run_names):
+            return True
+        # Builds downloaded before the journal existed.
         artifact_files = [
             os.path.join(
                 self.workflowrun_dir, str(int(run_id)), local_const.RUN_META_FILE.format(run_name=order)
             )
             for order in local_const.CI_WORKFLOW_NAMES
         ]
-        return all(os.path.exists(file) for file in artifact_files)
+        return all(artifact_manifest.is_complete(file) for file in artifact_files)
+
+    def download_rerun_results(self, num_builds_to_download: int=50, start_date: str="2025-02-28", end_date: str=END_DATE_STR, full_scan: bool=False, max_workers: int=local_const.MAX_DOWNLOAD_WORKERS, log_policy: str=local_const.LOG_POLICY) -> None:
+        """Download all completed reruns.
 
-    def download_rerun_results(self, num_builds_to_download: int=50, start_date: str="2025-02-28", end_date: str=END_DATE_STR) -> None:
-        """Download all completed reruns."""
+        full_scan: list every run of the fork since start_date, instead of only the runs of pushes
+        the rerun journal has outstanding (runs pushed before the journal existed are only found this way).
+        max_workers: number of logs and artifacts downloaded concurrently.
+        log_policy: which run logs to download with the artifacts, see rerun_download.
+        """
         # Get a list of builds that should be downloaded.
         df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
         builds = df[df["project"] == self.name].to_dict("records")
+        index = interval_index.load_interval_index(self.name, builds=builds)
         reran_build_ids = set()
         for i, build in enumerate(builds):
             if i == 0:
                 reran_build_ids.add(build["run_id"])
                 continue
-            is_overlap = check_overlap(builds[i-1], build)
+            is_overlap = index.overlaps_prev[int(build["run_id"])]
             if i >= num_builds_to_download and not is_overlap:
                 break
             reran_build_ids.add(build["run_id"])
 
         # Get a list of workflow reruns.
-        print("[global-run] Get workflow rerun list")
-        rerun_info = []
-        for page_number in range(1, 1000):
-            query = WORKFLOW_SEARCH_URL.format(slug=self.fork_slug, page_number=page_number)
-            query = query + f"&created={start_date}..{end_date}"
-            print(f"querying {query}")
-            info = token_pool.query_info(TOKENPOOL, query)
-            if len(info) < 1 or len(info["workflow_runs"]) < 1:
-                break
-            rerun_info += info["workflow_runs"]
+        journal = rerun_journal.get_journal()
+        # Builds pushed before, including those the budget planner picked beyond the first builds.
+        reran_build_ids |= set(entry["run_id"] for entry in journal.get_entries(self.name))
+        if journal.has_fork_entries(self.name, self.fork_slug, self.run_names) and not full_scan:
+            # Only look up the runs of pushes whose results are still outstanding.
+            pushed_shas = sorted(set(entry["pushed_sha"] for entry in journal.get_outstanding(self.name, self.fork_slug)))
+            print(f"[global-run] Get workflow reruns of {len(pushed_shas)} outstanding pushes")
+            rerun_info = []
+            for head_sha in pushed_shas:
+                query = local_const.CURL_COMMIT_RUNS_URL.format(slug=self.fork_slug, head_sha=head_sha)
+                rerun_info += token_pool.query_info(TOKENPOOL, query).get("workflow_runs", [])
+        else:
+            print("[global-run] Get workflow rerun list")
+            rerun_info = []
+            for page_number in range(1, 1000):
+                query = WORKFLOW_SEARCH_URL.format(slug=self.fork_slug, page_number=page_number)
+                query = query + f"&created={start_date}..{end_date}"
+                print(f"querying {query}")
+                info = token_pool.query_info(TOKENPOOL, query)
+                if len(info) < 1 or len(info["workflow_runs"]) < 1:
+                    break
+                rerun_info += info["workflow_runs"]
         print(f"[global-run] Workflow rerun list length: {len(rerun_info)}")
         # Keep only RTP reruns, sort reruns from most recent from the oldest.
-        rerun_info = [run for run in rerun_info if "run_id" in run["display_title"] and run["name"] in local_const.CI_WORKFLOW_NAMES]
+        rerun_names = local_const.CI_WORKFLOW_NAMES + [local_const.WF_ALL_ORDERS]
+        rerun_info = [run for run in rerun_info if "run_id" in run["display_title"] and run["name"] in rerun_names]
         rerun_info.sort(key=lambda x: local_utils.timestring_to_timestamp(x["created_at"]).timestamp(), reverse=True)
+        if len(rerun_info) == 0:
+            print("[global-run] No workflow reruns to download")
+            self.copy_snapshot_results(builds)
+            return
         print(
             f"[global-run] Valid workflow rerun list length: {len(rerun_info)}, "
             + f"latest {rerun_info[0]['created_at']}, oldest: {rerun_info[-1]['created_at']}"
         )
         download_ordered_runs = set()
+        reruns = []
         for info in rerun_info:
             run_name = info["name"]
-            origin_run_id = int(info["display_title"].split(", ")[0].replace("run_id=", ""))
+            origin_run_id = rerun_journal.get_origin_run_id(info)
             rerun_id = info["id"]
             rerun_conclusion = info["conclusion"]
             # Skip non reran builds.
             if origin_run_id not in reran_build_ids:
                 continue
+            journal.record_run(self.name, origin_run_id, info)
             # Skip cancelled runs.
             if rerun_conclusion not in ["success", "failure"]:
                 continue
@@ -291,44 +471,30 @@ class ForkProject:
             if ordered_run_id in download_ordered_runs:
                 continue
 
-            save_folder = os.path.join(self.workflowrun_dir, str(origin_run_id))
-            os.makedirs(save_folder, exist_ok=True)
-
             print(f"[global-run] rerun_id: {rerun_id}, original: {origin_run_id}, {run_name}, {len(download_ordered_runs)}, {info['created_at']}")
             download_ordered_runs.add(ordered_run_id)
-            # Download workflow run metadata.
-            run_meta_file = os.path.join(save_folder, local_const.RUN_META_FILE.format(run_name=run_name))
-            with open(run_meta_file, "w") as f:
-                json.dump(info, f, indent=2)
-            # Download workflow run log as zip.
-            log = token_pool.query_binary(
-                mytokenpool=TOKENPOOL,
-                myurl=local_const.CURL_RUN_LOG_URL.format(slug=self.fork_slug, run_id=rerun_id))
-            run_log_file = os.path.join(save_folder, local_const.RUN_LOG_FILE.format(run_name=run_name))
-            with open(run_log_file, "wb") as f:
-                f.write(log)
-            # Download workflow run artifact metadata.
-            art_query = local_const.CURL_RUN_ARTIFACT_URL.format(slug=self.fork_slug, run_id=rerun_id)
-            art_info = token_pool.query_info(TOKENPOOL, art_query)
-            art_meta_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_META_FILE.format(run_name=run_name))
-            with open(art_meta_file, "w") as f:
-                json.dump(art_info, f, indent=2)
-            # Download artifact as zip.
-            art_download_query = local_utils.get_test_report_url(art_info, rerun_id, local_const.ARTIFACT_NAME)
-            if art_download_query is not None:
-                art = token_pool.query_binary(mytokenpool=TOKENPOOL, myurl=art_download_query)
-                art_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_FILE.format(run_name=run_name))
-                with open(art_file, "wb") as f:
-                    f.write(art)
-
-
-def has_running_workflow_runs(workflow_search_info) -> bool:
-    running_states = ["in_progress", "queued", "requested", "waiting", "pending"]
-    runs = workflow_search_info["workflow_runs"]
-    for run in runs:
-        if run["status"] in running_states:
-            return True
-    return False
+            reruns.append({
+                "run_id": origin_run_id,
+                "save_folder": os.path.join(self.workflowrun_dir, str(origin_run_id)),
+                "info": info,
+            })
+        num_downloaded = rerun_download.download_reruns(TOKENPOOL, self.name, self.fork_slug, reruns, max_workers, log_policy)
+        print(f"[global-run] Downloaded {num_downloaded} of {len(reruns)} reruns")
+        self.copy_snapshot_results(builds)
+
+
+def get_commit_message(build: dict) -> str:
+    return f"run_id={build['run_id']}, outcome={build['run_conclusion']}, bh={build['head_branch']}, sha={build['head_sha']}"
+
+
+def get_uv_toml(build: dict) -> str:
+    """uv.toml restricting installed deps to versions released before the build started."""
+    uv_file_lines = [
+        f"exclude-newer = \"{build['run_started_at']}\"",
+        "[pip]",
+        "system = true",
+    ]
+    return "\n".join(uv_file_lines) + "\n"
 
 
 def check_overlap(prev_build: dict, build: dict) -> bool:
@@ -337,23 +503,36 @@ def check_overlap(prev_build: dict, build: dict) -> bool:
     return build_started_at < prev_build_updated_at
 
 
-def run_project(project_info, actions: list):
-    # Initialize project metadata.
-    proj = ForkProject(
+def make_fork_project(project_info: dict) -> ForkProject:
+    """ForkProject with the options of a project in project_meta.json."""
+    return ForkProject(
         name=project_info["name"],
         origin_slug=project_info["origin_slug"],
         fork_slug=project_info["fork_slug"],
         fork_branch=project_info["fork_branch"],
-        edited_ci_file_paths=project_info["edited_ci_file_paths"])
+        edited_ci_file_paths=project_info["edited_ci_file_paths"],
+        use_fast_import=project_info.get("use_fast_import", False),
+        consolidate_orders=project_info.get("consolidate_orders", False),
+        snapshot_bucket_days=project_info.get("snapshot_bucket_days", local_const.SNAPSHOT_BUCKET_DAYS),
+        compact_report=project_info.get("compact_report", False),
+        budget_minutes=project_info.get("budget_minutes"))
+
+
+def run_project(project_info, actions: list):
+    # Initialize project metadata.
+    proj = make_fork_project(project_info)
 
     if ACTION_SETUP in actions:
         proj.setup()
 
     if ACTION_RERUN in actions:
-        proj.rerun()
+        proj.rerun(pipeline_depth=project_info.get("pipeline_depth", 0))
+
+    if ACTION_RERUN_LOCAL in actions:
+        local_backend.make_local_backend(proj, project_info).rerun()
 
     if ACTION_DOWNLOAD in actions:
-        proj.download_rerun_results()
+        proj.download_rerun_results(log_policy=project_info.get("log_policy", local_const.LOG_POLICY))
 
 
 def runner():
@@ -370,12 +549,7 @@ def runner():
 def rerun_single_build(project, run_id):
     project_infos = json.load(open("project_meta.json", "r"))
     project_info = project_infos[project]
-    proj = ForkProject(
-        name=project_info["name"],
-        origin_slug=project_info["origin_slug"],
-        fork_slug=project_info["fork_slug"],
-        fork_branch=project_info["fork_branch"],
-        edited_ci_file_paths=project_info["edited_ci_file_paths"])
+    proj = make_fork_project(project_info)
     df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
     # Setup
     proj.setup()
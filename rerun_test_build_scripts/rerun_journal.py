@@ -0,0 +1,183 @@
+"""Durable journal of reruns, one entry per (project, run_id, order).
+
+Entries move through the states submitted -> running -> completed -> downloaded -> parsed, and
+record the commit pushed for the build, the id of the GitHub Actions run of that commit
+(rerun_id), its conclusion, and the last error. A build pushed again starts over as submitted,
+so runs of older pushes are not mistaken for the latest rerun.
+
+Usage: python3 rerun_journal.py [PROJECT]
+"""
+
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+from typing import List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+
+SUBMITTED = "submitted"
+RUNNING = "running"
+COMPLETED = "completed"
+DOWNLOADED = "downloaded"
+PARSED = "parsed"
+STATES = [SUBMITTED, RUNNING, COMPLETED, DOWNLOADED, PARSED]
+
+# Conclusions of completed runs that have results to download.
+DOWNLOADABLE_CONCLUSIONS = ["success", "failure"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reruns (
+    project TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    run_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    pushed_sha TEXT,
+    rerun_id INTEGER,
+    conclusion TEXT,
+    error TEXT,
+    submitted_at TEXT,
+    updated_at TEXT NOT NULL,
+    fork_slug TEXT,
+    PRIMARY KEY (project, run_id, run_name)
+)
+"""
+
+
+def now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_origin_run_id(run: dict) -> int:
+    """Id of the original build a rerun belongs to, from the `run_id=...` commit message of the push."""
+    return int(run["display_title"].split(", ")[0].replace("run_id=", ""))
+
+
+class RerunJournal:
+    def __init__(self, db_file: str=local_const.RERUN_JOURNAL_FILE) -> None:
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets readers in other processes see entries while a rerun is writing.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        # Journals created before reruns were spread over several forks.
+        columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(reruns)")]
+        if "fork_slug" not in columns:
+            self.conn.execute("ALTER TABLE reruns ADD COLUMN fork_slug TEXT")
+
+    def execute(self, query: str, params: tuple=()) -> List[dict]:
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query, params).fetchall()]
+
+    def record_submitted(self, project: str, run_id: int, run_names: List[str], pushed_sha: str, fork_slug: str=None) -> None:
+        """A build is about to be pushed to fork_slug, its runs of every order are expected on pushed_sha."""
+        t = now()
+        with self.lock, self.conn:
+            for run_name in run_names:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO reruns VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL, ?, ?, ?)",
+                    (project, int(run_id), run_name, SUBMITTED, pushed_sha, t, t, fork_slug))
+
+    def record_run(self, project: str, run_id: int, run: dict) -> None:
+        """Record the status of a GitHub Actions run of a build, from the runs API or a webhook event."""
+        state = COMPLETED if run["status"] == "completed" else RUNNING
+        with self.lock, self.conn:
+            entry = self.conn.execute(
+                "SELECT * FROM reruns WHERE project = ? AND run_id = ? AND run_name = ?",
+                (project, int(run_id), run["name"])).fetchone()
+            if entry is None:
+                # Runs pushed before the journal existed.
+                self.conn.execute(
+                    "INSERT INTO reruns VALUES (?, ?, ?, ?, ?, ?, ?, NULL, NULL, ?, NULL)",
+                    (project, int(run_id), run["name"], state, run["head_sha"], run["id"], run["conclusion"], now()))
+                return
+            # Ignore runs of older pushes of the build, and never move back from downloaded/parsed.
+            if entry["pushed_sha"] not in [None, run["head_sha"]]:
+                return
+            if STATES.index(entry["state"]) >= STATES.index(DOWNLOADED) and entry["rerun_id"] == run["id"]:
+                return
+            # A workflow rerun on the same push supersedes earlier runs, and run ids only grow.
+            if entry["rerun_id"] is not None and run["id"] < entry["rerun_id"]:
+                return
+            self.conn.execute(
+                "UPDATE reruns SET state = ?, pushed_sha = ?, rerun_id = ?, conclusion = ?, updated_at = ? "
+                + "WHERE project = ? AND run_id = ? AND run_name = ?",
+                (state, run["head_sha"], run["id"], run["conclusion"], now(), project, int(run_id), run["name"]))
+
+    def set_state(self, project: str, run_id: int, run_name: str, state: str, error: str=None) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE reruns SET state = ?, error = ?, updated_at = ? WHERE project = ? AND run_id = ? AND run_name = ?",
+                (state, error, now(), project, int(run_id), run_name))
+
+    def record_downloaded(self, project: str, run_id: int, run_name: str) -> None:
+        self.set_state(project, run_id, run_name, DOWNLOADED)
+
+    def record_parsed(self, project: str, run_id: int, run_name: str) -> None:
+        self.set_state(project, run_id, run_name, PARSED)
+
+    def record_error(self, project: str, run_id: int, run_name: str, error: str) -> None:
+        """Keep the state of an entry, noting why its last step failed."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE reruns SET error = ?, updated_at = ? WHERE project = ? AND run_id = ? AND run_name = ?",
+                (error, now(), project, int(run_id), run_name))
+
+    def get_entries(self, project: str, run_id: int=None) -> List[dict]:
+        if run_id is None:
+            return self.execute("SELECT * FROM reruns WHERE project = ? ORDER BY run_id, run_name", (project,))
+        return self.execute("SELECT * FROM reruns WHERE project = ? AND run_id = ? ORDER BY run_name", (project, int(run_id)))
+
+    def get_outstanding(self, project: str, fork_slug: str=None) -> List[dict]:
+        """Entries still to be downloaded: not completed yet, or completed with results.
+
+        fork_slug: only entries pushed to that fork, or to an unknown fork.
+        """
+        placeholders = ", ".join("?" for _ in DOWNLOADABLE_CONCLUSIONS)
+        entries = self.execute(
+            f"SELECT * FROM reruns WHERE project = ? AND (state IN (?, ?) OR (state = ? AND conclusion IN ({placeholders})))",
+            (project, SUBMITTED, RUNNING, COMPLETED, *DOWNLOADABLE_CONCLUSIONS))
+        return [entry for entry in entries if fork_slug is None or entry["fork_slug"] in [None, fork_slug]]
+
+    def has_fork_entries(self, project: str, fork_slug: str, run_names: List[str]) -> bool:
+        """Whether builds of project were pushed to fork_slug for run_names since the journal exists."""
+        placeholders = ", ".join("?" for _ in run_names)
+        return len(self.execute(
+            f"SELECT 1 FROM reruns WHERE project = ? AND fork_slug = ? AND run_name IN ({placeholders}) LIMIT 1",
+            (project, fork_slug, *run_names))) > 0
+
+    def is_downloaded(self, project: str, run_id: int, run_names: List[str]) -> bool:
+        """Whether results of every order of a build are downloaded."""
+        states = {entry["run_name"]: entry["state"] for entry in self.get_entries(project, run_id)}
+        return all(states.get(run_name) in [DOWNLOADED, PARSED] for run_name in run_names)
+
+    def summary(self, project: str=None) -> List[dict]:
+        if project is None:
+            return self.execute("SELECT project, state, COUNT(*) AS count FROM reruns GROUP BY project, state ORDER BY project, state")
+        return self.execute("SELECT project, state, COUNT(*) AS count FROM reruns WHERE project = ? GROUP BY state ORDER BY state", (project,))
+
+
+JOURNAL = None
+
+
+def get_journal() -> RerunJournal:
+    """The process-wide journal, opened on first use."""
+    global JOURNAL
+    if JOURNAL is None:
+        JOURNAL = RerunJournal()
+    return JOURNAL
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    for row in get_journal().summary(args[0] if len(args) > 0 else None):
+        print(f"{row['project']}\t{row['state']}\t{row['count']}")
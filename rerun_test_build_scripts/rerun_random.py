@@ -1,10 +1,7 @@
 import datetime
-import glob
 import json
 import os
 import sys
-import time
-import zipfile
 from typing import List
 
 import pandas as pd
@@ -15,9 +12,17 @@ local_dir = os.path.join(script_dir, "..", "sync_prs")
 sys.path.append(parent_dir)
 sys.path.append(local_dir)
 
+import artifact_manifest
+import fast_import_commit
 import local_const
 import local_utils
+import process_runner
+import rerun_download
+import rerun_journal
+import run_watcher
 import token_pool
+import workspace_manager
+import worktree_sync
 
 TOKENPOOL = token_pool.TokenPool()
 
@@ -28,7 +33,7 @@ ACTION_DOWNLOAD = "download"
 BUILD_WITH_REAL_FAILED_TESTS_JSON_FILE = "eval_results/parsed_rerun_results/regression_failed_runs.json"
 
 END_DATE_STR = (datetime.datetime.today() + datetime.timedelta(days=2)).strftime('%Y-%m-%d')
-WORKFLOW_SEARCH_URL = "https://api.github.com/repos/{slug}/actions/runs?&per_page=100&page={page_number}"
+WORKFLOW_SEARCH_URL = local_const.CURL_RUN_URL + "?&per_page=100&page={page_number}"
 
 
 class ForkProject:
@@ -40,12 +45,21 @@ class ForkProject:
             fork_branch: str,
             edited_ci_file_paths: List[str],
             rerun_order: str,
+            use_fast_import: bool=False,
+            replica_fork_slug: str=None,
             ) -> None:
         """
         Rerun the same order multiple times.
         edited_ci_file_paths: workflow files we edited
+        use_fast_import: create build commits with git fast-import instead of in the codebase folder
+        replica_fork_slug: another fork to push builds to instead of `{fork_slug}-{rerun_order}`, with its own workspace
         """
-        fork_slug = fork_slug + "-" + rerun_order
+        if replica_fork_slug is None:
+            fork_slug = fork_slug + "-" + rerun_order
+            self.workspace_name = name
+        else:
+            fork_slug = replica_fork_slug
+            self.workspace_name = replica_fork_slug.replace("/", "__")
         self.rerun_order = rerun_order
         self.name = name
         self.origin_slug = origin_slug
@@ -54,7 +68,15 @@ class ForkProject:
         self.fork_clone_url = local_const.GITHUB_SSH_URL.format(slug=fork_slug)
         self.fork_branch = fork_branch
         self.ci_file_paths = edited_ci_file_paths
+        self.use_fast_import = use_fast_import
         self.init_datafolders()
+        # Tracks runs of the fork branch, from webhook events if a receiver is configured, else by polling.
+        self.watcher = run_watcher.RunWatcher(self.fork_slug, self.fork_branch, TOKENPOOL)
+        receiver = run_watcher.get_webhook_receiver()
+        if receiver is not None:
+            receiver.register(self.watcher)
+        self.last_pushed_sha = None
+        self.workspace = workspace_manager.Workspace(self.codebase_dir, self.fork_clone_url)
 
     def init_datafolders(self) -> None:
         """setup folders to store data for this project"""
@@ -63,54 +85,44 @@ class ForkProject:
         os.makedirs(self.ORDER_RERUN_DIR, exist_ok=True)
         # Set up rerun order copies.
         self.RERUN_WORKFLOW_NAMES = [f"{self.rerun_order}_{i}" for i in range(1, 11)]
+        # Same as ForkProject.run_names of rerun_global_runs, for orchestrator.
+        self.run_names = self.RERUN_WORKFLOW_NAMES
 
         # Make home folder for the project.
         self.project_dir = os.path.join(self.ORDER_RERUN_DIR, self.name)
         os.makedirs(self.project_dir, exist_ok=True)
         fork_codebase_dir = os.path.join(self.project_dir, "fork_codebase")
-        self.codebase_dir = os.path.join(fork_codebase_dir, self.name)
-        self.ci_file_backup_dir = os.path.join(self.project_dir, local_const.CI_FILE_BACKUP_DIR)
+        self.codebase_dir = os.path.join(fork_codebase_dir, self.workspace_name)
+        # Each fork has its own clone and CI file backup, results of all forks go to the same folder.
+        backup_dir = local_const.CI_FILE_BACKUP_DIR if self.workspace_name == self.name else f"{local_const.CI_FILE_BACKUP_DIR}_{self.workspace_name}"
+        self.ci_file_backup_dir = os.path.join(self.project_dir, backup_dir)
         self.workflowrun_dir = os.path.join(self.project_dir, local_const.WORKFLOWRUN_DIR)
 
     def setup(self) -> None:
         """Setup/Reset the local fork folder and ci_file_backup folder."""
         print("[global-run] Setting up")
-        # Clean up the old fork clone.
-        fork_codebase_dir = os.path.join(self.project_dir, "fork_codebase")
-        if os.path.exists(fork_codebase_dir):
-            os.system(f"rm -rf {fork_codebase_dir}/*")
-        if os.path.exists(self.ci_file_backup_dir):
-            os.system(f"rm -rf {self.ci_file_backup_dir}")
+        # Clean up the old CI file backup.
+        process_runner.remove(self.ci_file_backup_dir)
 
         # Create folders.
-        os.makedirs(fork_codebase_dir, exist_ok=True)
         os.makedirs(self.ci_file_backup_dir, exist_ok=True)
         os.makedirs(self.workflowrun_dir, exist_ok=True)
 
-        # Clone the project fork.
-        current_dir = os.getcwd()
-        os.chdir(fork_codebase_dir)
-        os.system(f"git clone {self.fork_clone_url} {self.name}")
-        os.chdir(current_dir)
+        # Clone the project fork, or reuse the clone of a previous session.
+        self.workspace.ensure_clone()
 
         # Copy the CI files as backup.
         print("[global-run] Back up modified .github/workflows")
-        os.chdir(self.codebase_dir)
         # Check out fork branch with modified CI files.
-        os.system(f"git checkout {local_const.EDIT_CI_FILE_BRANCH}")
-        os.system("git pull")
+        process_runner.git(self.codebase_dir, ["checkout", local_const.EDIT_CI_FILE_BRANCH])
+        process_runner.git(self.codebase_dir, ["pull"])
         # Backup modified CI files.
-        os.system(f"cp -r .github/workflows {self.ci_file_backup_dir}")
+        process_runner.copy_tree(os.path.join(self.codebase_dir, ".github", "workflows"), os.path.join(self.ci_file_backup_dir, "workflows"))
         for file in self.ci_file_paths:
-            file_dir = os.path.dirname(file)
-            os.makedirs(os.path.join(self.ci_file_backup_dir, file_dir), exist_ok=True)
-            os.system(f"cp {file} {self.ci_file_backup_dir}/{file}")
+            process_runner.copy_file(os.path.join(self.codebase_dir, file), os.path.join(self.ci_file_backup_dir, file))
 
         # Checkout back to the default branch.
-        os.system(f"git checkout {self.fork_branch}")
-
-        # Back to script dir and finish.
-        os.chdir(current_dir)
+        process_runner.git(self.codebase_dir, ["checkout", self.fork_branch])
 
 
     def rerun(self) -> None:
@@ -126,111 +138,126 @@ class ForkProject:
             # Skip if this build bas been rerun.
             if self.has_rerun_results(run_id):
                 continue
+            # Wait until the previous build's runs are listed, so that Github API result is updated.
+            self.wait_for_submitted_runs()
             # This is for throttle, only 10 concurrent builds running at max
             if i % 2 == 0:
                 self.wait_till_all_previous_runs_finish()
-            # Wait a bit before the next run, so that Github API result is updated.
-            time.sleep(10)
             build = df[(df["project"] == self.name) & (df["run_id"] == run_id)].to_dict("records")[0]
             self.submit_build_to_rerun(build)
 
     def wait_till_all_previous_runs_finish(self) -> None:
         """Wait until all running github action builds are finished."""
-        query = WORKFLOW_SEARCH_URL.format(slug=self.fork_slug, page_number=1)
-        info = token_pool.query_info(TOKENPOOL, query)
-        while has_running_workflow_runs(info):
-            print("[global-run] Waiting running runs to finish.")
-            time.sleep(60)
-            # Query update info again.
-            info = token_pool.query_info(TOKENPOOL, query)
+        print("[global-run] Waiting running runs to finish.")
+        self.watcher.wait_until_idle()
+
+    def wait_for_submitted_runs(self, timeout: int=60) -> None:
+        """Wait until GitHub lists the runs of the last pushed build, so that later waits see them."""
+        if self.last_pushed_sha is None:
+            return
+        if not self.watcher.wait_for_registered_runs(self.last_pushed_sha, len(self.RERUN_WORKFLOW_NAMES), timeout=timeout):
+            print(f"[global-run] Runs of {self.last_pushed_sha} not listed after {timeout}s, continuing.")
+        # Remember which runs belong to the push.
+        journal = rerun_journal.get_journal()
+        for run in self.watcher.get_runs(self.last_pushed_sha):
+            if run["name"] in self.RERUN_WORKFLOW_NAMES:
+                journal.record_run(self.name, rerun_journal.get_origin_run_id(run), run)
 
     def submit_build_to_rerun(self, build: dict) -> None:
         """Rerun a build."""
+        if self.use_fast_import:
+            self.submit_build_with_fast_import(build)
+            return
         print("\n[global-run] build info:", build)
         project = build["project"]
         run_id = build["run_id"]
         head_sha = build["head_sha"]
-        run_conclusion = build["run_conclusion"]
-        head_branch = build["head_branch"]
 
         # Reset codebase.
         self.reset_codebase_to_origin_head()
 
-        # Remove everything but .git folder.
+        # Sync the build snapshot into the codebase, keeping the .git folder.
         print("\n[global-run] Reconstruct build commit")
-        normal_files = glob.glob(os.path.join(self.codebase_dir, "*"))
-        hidden_files = glob.glob(os.path.join(self.codebase_dir, ".*"))
-        for file in normal_files + hidden_files:
-            if os.path.basename(file) != ".git":
-                os.system(f"rm -rf {file}")
-        # Unzip {head_sha}.zip and copy all files to a temp folder.
-        temp_extract_folder = os.path.join(self.project_dir, "temp_zip_extract")
-        os.makedirs(temp_extract_folder, exist_ok=True)
         zip_file = os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "repo_zips", project, f"{head_sha}.zip")
-        # Extract the zip file to a temporary folder.
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(temp_extract_folder)
-        # Copy all files from the unzipped folder to the codebase folder.
-        owner, project = self.origin_slug.split("/")
-        head_sha_prefix = head_sha[:7]
-        os.system(f"cp -r {temp_extract_folder}/{owner}-{project}-{head_sha_prefix}/. {self.codebase_dir}/")
-        # Remove the temporary extraction folder.
-        os.system(f"rm -rf {temp_extract_folder}/{owner}-{project}-{head_sha_prefix}")
+        sync_stats = worktree_sync.sync_zip_to_worktree(zip_file, self.codebase_dir)
+        print(f"[global-run] Synced snapshot: {sync_stats}")
 
         # Copy backed up .github/workflows to the codebase folder.
-        os.makedirs(f"{self.codebase_dir}/.github/workflows", exist_ok=True)
-        os.system(f"rm -rf {self.codebase_dir}/.github/workflows/*")
-        os.system(f"cp -r {self.ci_file_backup_dir}/workflows/. {self.codebase_dir}/.github/workflows/")
+        process_runner.replace_tree(os.path.join(self.ci_file_backup_dir, "workflows"), os.path.join(self.codebase_dir, ".github", "workflows"))
         for file in self.ci_file_paths:
-            # print(f"cp {self.ci_file_backup_dir}/{file} {self.codebase_dir}/{file}")
-            os.makedirs(f"{self.codebase_dir}/{os.path.dirname(file)}", exist_ok=True)
-            os.system(f"cp {self.ci_file_backup_dir}/{file} {self.codebase_dir}/{file}")
+            process_runner.copy_file(os.path.join(self.ci_file_backup_dir, file), os.path.join(self.codebase_dir, file))
 
         # Add uv.toml for the uv library, allowing us to install deps with versions
         # released prior to a configured date.
         # https://docs.astral.sh/uv/reference/settings/#exclude-newer
-        run_started_at = build["run_started_at"]
-        uv_file_lines = [
-            f"exclude-newer = \"{run_started_at}\"",
-            "[pip]",
-            "system = true",
-        ]
         with open(os.path.join(self.codebase_dir, "uv.toml"), "w") as f:
-            f.write("\n".join(uv_file_lines) + "\n")
+            f.write(get_uv_toml(build))
 
         # Push this version of the code as commit.
         print("\n[global-run] Push code")
-        current_dir = os.getcwd()
-        os.chdir(self.codebase_dir)
-        message = f"run_id={run_id}, outcome={run_conclusion}, bh={head_branch}, sha={head_sha}"
+        message = get_commit_message(build)
         # Run id from commit message will be extracted to use as Random RTP order seed, via:
         # git log -1 --pretty=%B | tr -d '\n' | awk -F'run_id=' '{print $2}' | awk -F',' '{print $1}'
-        os.system("git add .")
-        os.system(f"git commit -m '{message}'")
-        os.system(f"git push origin HEAD:{self.fork_branch} --force")
-        os.chdir(current_dir)
+        process_runner.git(self.codebase_dir, ["add", "."])
+        # Allow an empty commit, so that a snapshot equal to the fork branch still triggers the runs.
+        process_runner.git(self.codebase_dir, ["commit", "--allow-empty", "-m", message])
+        commit_sha = process_runner.git(self.codebase_dir, ["rev-parse", "HEAD"])
+        # Record the push first, so runs of the previous push of the build are stale as soon as the new ones show up.
+        rerun_journal.get_journal().record_submitted(self.name, run_id, self.RERUN_WORKFLOW_NAMES, commit_sha, self.fork_slug)
+        process_runner.git(self.codebase_dir, ["push", "origin", f"HEAD:{self.fork_branch}", "--force"])
+        self.last_pushed_sha = commit_sha
+
+    def submit_build_with_fast_import(self, build: dict) -> None:
+        """Rerun a build, creating its commit with git fast-import without touching the codebase folder."""
+        print("\n[global-run] build info:", build)
+        run_id = build["run_id"]
+
+        print("\n[global-run] Import build commit")
+        zip_file = os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "repo_zips", build["project"], f"{build['head_sha']}.zip")
+        ref = fast_import_commit.RERUN_REF.format(run_id=run_id)
+        commit_sha = fast_import_commit.commit_zip_snapshot(
+            self.codebase_dir,
+            zip_file,
+            parent=self.fork_branch,
+            ref=ref,
+            message=get_commit_message(build) + "\n",
+            overlay_files=fast_import_commit.get_overlay_files(self.ci_file_backup_dir, self.ci_file_paths),
+            overlay_contents={
+                "uv.toml": get_uv_toml(build).encode("utf-8"),
+            })
+
+        print("\n[global-run] Push code")
+        rerun_journal.get_journal().record_submitted(self.name, run_id, self.RERUN_WORKFLOW_NAMES, commit_sha, self.fork_slug)
+        process_runner.git(self.codebase_dir, ["push", "origin", f"{ref}:refs/heads/{self.fork_branch}", "--force"])
+        self.last_pushed_sha = commit_sha
 
     def reset_codebase_to_origin_head(self) -> None:
-        current_dir = os.getcwd()
-        os.chdir(self.codebase_dir)
         # Clean up any uncommitted changes.
         print("[global-run] Clean local changes in fork")
-        os.system("git reset --hard")
-        os.system("git clean -fd")
-        os.system(f"git checkout {self.fork_branch}")
-        os.chdir(current_dir)
+        process_runner.git(self.codebase_dir, ["reset", "--hard"])
+        process_runner.git(self.codebase_dir, ["clean", "-fd"])
+        process_runner.git(self.codebase_dir, ["checkout", self.fork_branch])
 
     def has_rerun_results(self, run_id: int) -> bool:
+        if rerun_journal.get_journal().is_downloaded(self.name, run_id, self.RERUN_WORKFLOW_NAMES):
+            return True
+        # Builds downloaded before the journal existed.
         artifact_files = [
             os.path.join(
                 self.workflowrun_dir, str(int(run_id)), local_const.RUN_META_FILE.format(run_name=order)
             )
             for order in self.RERUN_WORKFLOW_NAMES
         ]
-        return all(os.path.exists(file) for file in artifact_files)
+        return all(artifact_manifest.is_complete(file) for file in artifact_files)
 
-    def download_rerun_results(self, start_date: str="2025-03-05", end_date: str=END_DATE_STR) -> None:
-        """Download all completed reruns."""
+    def download_rerun_results(self, start_date: str="2025-03-05", end_date: str=END_DATE_STR, full_scan: bool=False, max_workers: int=local_const.MAX_DOWNLOAD_WORKERS, log_policy: str=local_const.LOG_POLICY) -> None:
+        """Download all completed reruns.
+
+        full_scan: list every run of the fork since start_date, instead of only the runs of pushes
+        the rerun journal has outstanding (runs pushed before the journal existed are only found this way).
+        max_workers: number of logs and artifacts downloaded concurrently.
+        log_policy: which run logs to download with the artifacts, see rerun_download.
+        """
         # Get a list of builds that should be downloaded.
         run_ids = json.load(open(BUILD_WITH_REAL_FAILED_TESTS_JSON_FILE, "r"))
         df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
@@ -239,33 +266,48 @@ class ForkProject:
         reran_build_ids = set(run_ids)
 
         # Get a list of workflow reruns.
-        print("[global-run] Get workflow rerun list")
-        rerun_info = []
-        for page_number in range(1, 1000):
-            query = WORKFLOW_SEARCH_URL.format(slug=self.fork_slug, page_number=page_number)
-            query = query + f"&created={start_date}..{end_date}"
-            print(f"querying {query}")
-            info = token_pool.query_info(TOKENPOOL, query)
-            if len(info) < 1 or len(info["workflow_runs"]) < 1:
-                break
-            rerun_info += info["workflow_runs"]
+        journal = rerun_journal.get_journal()
+        if journal.has_fork_entries(self.name, self.fork_slug, self.RERUN_WORKFLOW_NAMES) and not full_scan:
+            # Only look up the runs of pushes whose results are still outstanding.
+            pushed_shas = sorted(set(entry["pushed_sha"] for entry in journal.get_outstanding(self.name, self.fork_slug)))
+            print(f"[global-run] Get workflow reruns of {len(pushed_shas)} outstanding pushes")
+            rerun_info = []
+            for head_sha in pushed_shas:
+                query = local_const.CURL_COMMIT_RUNS_URL.format(slug=self.fork_slug, head_sha=head_sha)
+                rerun_info += token_pool.query_info(TOKENPOOL, query).get("workflow_runs", [])
+        else:
+            print("[global-run] Get workflow rerun list")
+            rerun_info = []
+            for page_number in range(1, 1000):
+                query = WORKFLOW_SEARCH_URL.format(slug=self.fork_slug, page_number=page_number)
+                query = query + f"&created={start_date}..{end_date}"
+                print(f"querying {query}")
+                info = token_pool.query_info(TOKENPOOL, query)
+                if len(info) < 1 or len(info["workflow_runs"]) < 1:
+                    break
+                rerun_info += info["workflow_runs"]
         print(f"[global-run] Workflow rerun list length: {len(rerun_info)}")
         # Keep only RTP reruns, sort reruns from most recent from the oldest.
         rerun_info = [run for run in rerun_info if "run_id" in run["display_title"] and run["name"] in self.RERUN_WORKFLOW_NAMES]
         rerun_info.sort(key=lambda x: local_utils.timestring_to_timestamp(x["created_at"]).timestamp(), reverse=True)
+        if len(rerun_info) == 0:
+            print("[global-run] No workflow reruns to download")
+            return
         print(
             f"[global-run] Valid workflow rerun list length: {len(rerun_info)}, "
             + f"latest {rerun_info[0]['created_at']}, oldest: {rerun_info[-1]['created_at']}"
         )
         download_ordered_runs = set()
+        reruns = []
         for info in rerun_info:
             run_name = info["name"]
-            origin_run_id = int(info["display_title"].split(", ")[0].replace("run_id=", ""))
+            origin_run_id = rerun_journal.get_origin_run_id(info)
             rerun_id = info["id"]
             rerun_conclusion = info["conclusion"]
             # Skip non reran builds.
             if origin_run_id not in reran_build_ids:
                 continue
+            journal.record_run(self.name, origin_run_id, info)
             # Skip cancelled runs.
             if rerun_conclusion not in ["success", "failure"]:
                 continue
@@ -277,44 +319,30 @@ class ForkProject:
             if ordered_run_id in download_ordered_runs:
                 continue
 
-            save_folder = os.path.join(self.workflowrun_dir, str(origin_run_id))
-            os.makedirs(save_folder, exist_ok=True)
-
             print(f"[global-run] rerun_id: {rerun_id}, original: {origin_run_id}, {run_name}, {len(download_ordered_runs)}, {info['created_at']}")
             download_ordered_runs.add(ordered_run_id)
-            # Download workflow run metadata.
-            run_meta_file = os.path.join(save_folder, local_const.RUN_META_FILE.format(run_name=run_name))
-            with open(run_meta_file, "w") as f:
-                json.dump(info, f, indent=2)
-            # Download workflow run log as zip.
-            log = token_pool.query_binary(
-                mytokenpool=TOKENPOOL,
-                myurl=local_const.CURL_RUN_LOG_URL.format(slug=self.fork_slug, run_id=rerun_id))
-            run_log_file = os.path.join(save_folder, local_const.RUN_LOG_FILE.format(run_name=run_name))
-            with open(run_log_file, "wb") as f:
-                f.write(log)
-            # Download workflow run artifact metadata.
-            art_query = local_const.CURL_RUN_ARTIFACT_URL.format(slug=self.fork_slug, run_id=rerun_id)
-            art_info = token_pool.query_info(TOKENPOOL, art_query)
-            art_meta_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_META_FILE.format(run_name=run_name))
-            with open(art_meta_file, "w") as f:
-                json.dump(art_info, f, indent=2)
-            # Download artifact as zip.
-            art_download_query = local_utils.get_test_report_url(art_info, rerun_id, local_const.ARTIFACT_NAME)
-            if art_download_query is not None:
-                art = token_pool.query_binary(mytokenpool=TOKENPOOL, myurl=art_download_query)
-                art_file = os.path.join(save_folder, local_const.RUN_ARTIFACT_FILE.format(run_name=run_name))
-                with open(art_file, "wb") as f:
-                    f.write(art)
-
-
-def has_running_workflow_runs(workflow_search_info) -> bool:
-    running_states = ["in_progress", "queued", "requested", "waiting", "pending"]
-    runs = workflow_search_info["workflow_runs"]
-    for run in runs:
-        if run["status"] in running_states:
-            return True
-    return False
+            reruns.append({
+                "run_id": origin_run_id,
+                "save_folder": os.path.join(self.workflowrun_dir, str(origin_run_id)),
+                "info": info,
+            })
+        num_downloaded = rerun_download.download_reruns(TOKENPOOL, self.name, self.fork_slug, reruns, max_workers, log_policy)
+        print(f"[global-run] Downloaded {num_downloaded} of {len(reruns)} reruns")
+
+
+def get_commit_message(build: dict) -> str:
+    return f"run_id={build['run_id']}, outcome={build['run_conclusion']}, bh={build['head_branch']}, sha={build['head_sha']}"
+
+
+def get_uv_toml(build: dict) -> str:
+    """uv.toml restricting installed deps to versions released before the build started."""
+    uv_file_lines = [
+        f"exclude-newer = \"{build['run_started_at']}\"",
+        "[pip]",
+        "system = true",
+    ]
+    return "\n".join(uv_file_lines) + "\n"
+
 
 def run_project(project_info, actions: list):
     # Initialize project metadata.
@@ -324,7 +352,8 @@ def run_project(project_info, actions: list):
         fork_slug=project_info["fork_slug"],
         fork_branch=project_info["fork_branch"],
         edited_ci_file_paths=project_info["edited_ci_file_paths"],
-        rerun_order=local_const.WF_RANDOM)
+        rerun_order=local_const.WF_RANDOM,
+        use_fast_import=project_info.get("use_fast_import", False))
 
     if ACTION_SETUP in actions:
         proj.setup()
@@ -333,7 +362,7 @@ def run_project(project_info, actions: list):
         proj.rerun()
 
     if ACTION_DOWNLOAD in actions:
-        proj.download_rerun_results()
+        proj.download_rerun_results(log_policy=project_info.get("log_policy", local_const.LOG_POLICY))
 
 
 def runner():
@@ -0,0 +1,242 @@
+"""Detect when workflow runs of a fork branch are registered or finished.
+
+A RunWatcher learns about runs from `workflow_run` webhook events, received by a local
+WebhookReceiver (the fork's webhook must point at it, e.g., through a tunnel), and falls back to
+polling the runs of the branch with conditional requests: those of one head_sha while waiting for a
+push to be listed, and the queued and in-progress ones while waiting for the branch to be idle.
+Polling starts every few seconds and backs off while nothing changes, or while webhook events
+keep the watcher up to date.
+
+send_workflow_run_event posts a signed event to a receiver, standing in for GitHub in local tests.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import token_pool
+
+BRANCH_RUNS_URL = local_const.CURL_RUN_URL + "?branch={branch}&per_page=100"
+
+MIN_POLL_INTERVAL = 5
+MAX_POLL_INTERVAL = 60
+
+# Polled in lifecycle order while waiting for idle, so a run moving on between two polls is still listed.
+IDLE_POLL_STATUS = ["queued", "in_progress"]
+
+
+class RunWatcher:
+    def __init__(self, slug: str, branch: str, tokenpool, min_interval: int=MIN_POLL_INTERVAL, max_interval: int=MAX_POLL_INTERVAL) -> None:
+        self.slug = slug
+        self.branch = branch
+        self.tokenpool = tokenpool
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Known runs of the branch, run id -> run, from both events and polls.
+        self.runs = {}
+        self.condition = threading.Condition()
+        # Last ETag and response per polled url.
+        self.etags = {}
+        self.last_event_at = 0
+        # Incremented whenever a run changes, for waiters that cannot block on condition.
+        self.version = 0
+
+    def update_run(self, run: dict) -> bool:
+        """Record a run unless what we know about it is newer, return whether it changed."""
+        if run.get("head_branch") != self.branch:
+            return False
+        known = self.runs.get(run["id"])
+        if known is not None and known.get("updated_at", "") > run.get("updated_at", ""):
+            return False
+        changed = known is None or known.get("status") != run.get("status")
+        self.runs[run["id"]] = run
+        if changed:
+            self.version += 1
+        return changed
+
+    def handle_event(self, run: dict) -> None:
+        """Take the workflow_run of a webhook event and wake up waiters."""
+        with self.condition:
+            self.last_event_at = time.time()
+            if self.update_run(run):
+                self.condition.notify_all()
+
+    def get_runs_url(self, head_sha: str=None, status: str=None) -> str:
+        url = BRANCH_RUNS_URL.format(slug=self.slug, branch=self.branch)
+        if head_sha is not None:
+            url += f"&head_sha={head_sha}"
+        if status is not None:
+            url += f"&status={status}"
+        return url
+
+    def poll(self, head_sha: str=None, status: str=None) -> bool:
+        """Query runs of the branch, return whether anything changed since the last poll of that query."""
+        url = self.get_runs_url(head_sha, status)
+        etag, _ = self.etags.get(url, (None, None))
+        info, etag = token_pool.query_info_conditional(self.tokenpool, url, etag)
+        if info is None:
+            return False
+        self.etags[url] = (etag, info)
+        runs = info.get("workflow_runs", [])
+        changed = False
+        with self.condition:
+            if head_sha is None and status is None and len(runs) > 0:
+                # Forget runs older than the first page, they can no longer be checked.
+                oldest = min(run["created_at"] for run in runs)
+                self.runs = {k: v for k, v in self.runs.items() if v["created_at"] >= oldest}
+            for run in runs:
+                changed = self.update_run(run) or changed
+        return changed
+
+    def poll_incomplete(self) -> bool:
+        """Poll the queued and in-progress runs of the branch, return whether anything changed.
+
+        Known incomplete runs listed by neither poll have moved on, e.g., completed; only then the
+        unfiltered runs of the branch are polled to learn their status.
+        """
+        changed = False
+        listed = set()
+        for status in IDLE_POLL_STATUS:
+            changed = self.poll(status=status) or changed
+            _, info = self.etags.get(self.get_runs_url(status=status), (None, {}))
+            listed |= set(run["id"] for run in info.get("workflow_runs", []))
+        with self.condition:
+            moved_on = [
+                run for run in self.runs.values()
+                if run["status"] in local_const.INCOMPLETE_STATUS and run["id"] not in listed
+            ]
+        if len(moved_on) > 0:
+            changed = self.poll() or changed
+        return changed
+
+    def get_runs(self, head_sha: str=None) -> List[dict]:
+        with self.condition:
+            return [run for run in self.runs.values() if head_sha is None or run["head_sha"] == head_sha]
+
+    def next_interval(self, interval: float, changed: bool) -> float:
+        """Seconds to the next poll: back off while polls see no change, or while webhook events are arriving."""
+        has_events = time.time() - self.last_event_at < self.max_interval
+        return self.max_interval if has_events else (self.min_interval if changed else min(2 * interval, self.max_interval))
+
+    def wait_for(self, check: Callable[[List[dict]], bool], head_sha: str=None, timeout: float=None, poll: Callable[[], bool]=None) -> bool:
+        """Wait until check(known runs of the branch or head_sha) holds, return False on timeout.
+
+        poll: fallback query returning whether anything changed, polls the runs of head_sha by default.
+        """
+        poll = poll if poll is not None else lambda: self.poll(head_sha)
+        start = time.time()
+        interval = self.min_interval
+        while True:
+            changed = poll()
+            if check(self.get_runs(head_sha)):
+                return True
+            interval = self.next_interval(interval, changed)
+            deadline = time.time() + interval
+            if timeout is not None:
+                if time.time() - start >= timeout:
+                    return False
+                deadline = min(deadline, start + timeout)
+            # Between polls, re-check whenever an event changes a run.
+            with self.condition:
+                while time.time() < deadline:
+                    self.condition.wait(deadline - time.time())
+                    if check([run for run in self.runs.values() if head_sha is None or run["head_sha"] == head_sha]):
+                        return True
+
+    def wait_until_idle(self, timeout: float=None) -> bool:
+        """Wait until no run of the branch is incomplete."""
+        return self.wait_for(
+            lambda runs: all(run["status"] not in local_const.INCOMPLETE_STATUS for run in runs),
+            timeout=timeout, poll=self.poll_incomplete)
+
+    def wait_for_registered_runs(self, head_sha: str, num_runs: int, timeout: float=None) -> bool:
+        """Wait until GitHub lists num_runs runs for a pushed commit."""
+        return self.wait_for(lambda runs: len(runs) >= num_runs, head_sha=head_sha, timeout=timeout)
+
+
+def get_signature(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+class WebhookReceiver:
+    """Receive GitHub webhook events on a local port and dispatch workflow_run events to watchers."""
+    def __init__(self, port: int, secret: str=None) -> None:
+        self.port = port
+        self.secret = secret
+        # (repository full name, branch) -> watchers
+        self.watchers = {}
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if receiver.secret is not None:
+                    signature = self.headers.get("X-Hub-Signature-256", "")
+                    if not hmac.compare_digest(signature, get_signature(receiver.secret, body)):
+                        self.send_response(401)
+                        self.end_headers()
+                        return
+                if self.headers.get("X-GitHub-Event") == "workflow_run":
+                    receiver.dispatch(json.loads(body))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("", port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def register(self, watcher: RunWatcher) -> None:
+        self.watchers.setdefault((watcher.slug, watcher.branch), []).append(watcher)
+
+    def dispatch(self, payload: dict) -> None:
+        run = payload.get("workflow_run", {})
+        slug = payload.get("repository", {}).get("full_name", "")
+        for watcher in self.watchers.get((slug, run.get("head_branch")), []):
+            watcher.handle_event(run)
+
+    def start(self) -> "WebhookReceiver":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+RECEIVER = None
+
+
+def get_webhook_receiver():
+    """The process-wide receiver, started on first use if local_const.WEBHOOK_PORT is set."""
+    global RECEIVER
+    if RECEIVER is None and local_const.WEBHOOK_PORT is not None:
+        RECEIVER = WebhookReceiver(local_const.WEBHOOK_PORT, local_const.WEBHOOK_SECRET).start()
+    return RECEIVER
+
+
+def send_workflow_run_event(port: int, slug: str, run: dict, action: str, secret: str=None) -> int:
+    """Post a workflow_run event to a local receiver the way GitHub does, return the status code."""
+    body = json.dumps({"action": action, "workflow_run": run, "repository": {"full_name": slug}}).encode("utf-8")
+    headers = {"Content-Type": "application/json", "X-GitHub-Event": "workflow_run"}
+    if secret is not None:
+        headers["X-Hub-Signature-256"] = get_signature(secret, body)
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/", data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request) as response:
+        return response.status
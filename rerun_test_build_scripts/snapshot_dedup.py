@@ -0,0 +1,117 @@
+"""Rerun each build snapshot once, and share its results with the builds of the same snapshot.
+
+lite_test_run_metadata.csv may list several builds of one head_sha (other workflows of the
+commit, re-triggered runs). A snapshot is a head_sha plus the bucket of days its build started in
+(local_const.SNAPSHOT_BUCKET_DAYS), so its builds install deps released before about the same date.
+The first build of a snapshot is rerun, the later ones are left out of the rerun plan, and once the
+results of the first build are complete they are copied to the folders of the others under
+workflow_runs/, so each run_id of the dataset has its results as if it had been rerun.
+The copied reruns keep the metadata of the rerun they come from (rerun id, random order seed).
+
+This changes the analysis inputs, so it is off unless snapshot_bucket_days is set for a project:
+the later builds of a snapshot are not pushed, so the pytest-ranking cache history the next builds
+restore misses their saves, and their random order comes from the seed (run_id) of the first build.
+
+Usage: python3 snapshot_dedup.py PROJECT [BUCKET_DAYS]
+"""
+
+import os
+import shutil
+import sys
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import artifact_manifest
+import local_const
+import wheel_cache
+
+
+def get_snapshot_key(build: dict, bucket_days: int=local_const.SNAPSHOT_BUCKET_DAYS) -> Tuple[str, str]:
+    return build["head_sha"], wheel_cache.get_bucket_start(build["run_started_at"], bucket_days)
+
+
+def get_snapshot_groups(builds: List[dict], bucket_days: int=local_const.SNAPSHOT_BUCKET_DAYS) -> Dict[int, List[int]]:
+    """Map the run_id of the first build of each snapshot with several builds to the run_ids of its later builds.
+
+    No builds are merged for bucket_days 0.
+    """
+    if bucket_days <= 0:
+        return {}
+    firsts = {}
+    groups = {}
+    for build in builds:
+        key = get_snapshot_key(build, bucket_days)
+        run_id = int(build["run_id"])
+        if key not in firsts:
+            firsts[key] = run_id
+        else:
+            groups.setdefault(firsts[key], []).append(run_id)
+    return groups
+
+
+def get_duplicate_of(builds: List[dict], bucket_days: int=local_const.SNAPSHOT_BUCKET_DAYS) -> Dict[int, int]:
+    """Map the run_id of each later build of a snapshot to the run_id of its first build."""
+    return {
+        run_id: first_run_id
+        for first_run_id, run_ids in get_snapshot_groups(builds, bucket_days).items()
+        for run_id in run_ids
+    }
+
+
+def has_results(run_dir: str, run_names: List[str]=local_const.CI_WORKFLOW_NAMES) -> bool:
+    return all(
+        artifact_manifest.is_complete(os.path.join(run_dir, local_const.RUN_META_FILE.format(run_name=run_name)))
+        for run_name in run_names
+    )
+
+
+def copy_results(src_dir: str, dest_dir: str) -> None:
+    """Copy the rerun files of src_dir to dest_dir, run metadata last as it marks the results complete."""
+    names = [
+        name for name in os.listdir(src_dir)
+        if name != artifact_manifest.MANIFEST_FILE and not name.endswith(artifact_manifest.TEMP_SUFFIX)
+    ]
+    names.sort(key=lambda name: name.startswith("run_meta_"))
+    os.makedirs(dest_dir, exist_ok=True)
+    for name in names:
+        temp_path = os.path.join(dest_dir, name + artifact_manifest.TEMP_SUFFIX)
+        shutil.copyfile(os.path.join(src_dir, name), temp_path)
+        os.replace(temp_path, os.path.join(dest_dir, name))
+        artifact_manifest.append_manifest_entries(dest_dir, [artifact_manifest.make_entry(os.path.join(dest_dir, name))])
+
+
+def copy_snapshot_results(workflowrun_dir: str, builds: List[dict], bucket_days: int=local_const.SNAPSHOT_BUCKET_DAYS) -> int:
+    """Copy the results of the first build of each snapshot to its later builds that lack them, return the number of builds copied."""
+    num_copied = 0
+    for first_run_id, run_ids in get_snapshot_groups(builds, bucket_days).items():
+        src_dir = os.path.join(workflowrun_dir, str(first_run_id))
+        if not has_results(src_dir):
+            continue
+        for run_id in run_ids:
+            dest_dir = os.path.join(workflowrun_dir, str(run_id))
+            if has_results(dest_dir):
+                continue
+            copy_results(src_dir, dest_dir)
+            print(f"[snapshot] Copied results of {first_run_id} to {run_id}")
+            num_copied += 1
+    return num_copied
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [2, 3]:
+        exit("Invalid command, example command: python3 snapshot_dedup.py ipython 1")
+    bucket_days = int(sys.argv[2]) if len(sys.argv) == 3 else 1
+    df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "lite_test_run_metadata.csv"))
+    builds = df[df["project"] == sys.argv[1]].to_dict("records")
+    groups = get_snapshot_groups(builds, bucket_days)
+    num_duplicates = sum(len(run_ids) for run_ids in groups.values())
+    print(f"[snapshot] {sys.argv[1]}: {len(builds)} builds, {num_duplicates} rerun through the first build of their snapshot")
+    for first_run_id, run_ids in groups.items():
+        print(f"[snapshot] {first_run_id}: {run_ids}")
@@ -1,7 +1,10 @@
 import datetime
 import json
+import os
+import threading
 import time
 
+import local_const
 import requests
 
 
@@ -11,13 +14,41 @@ def is_corner_case(message):
     return False
 
 
+class BudgetExhausted(Exception):
+    pass
+
+
+class RequestBudget:
+    """Cap on the number of GitHub API requests, shared by all threads using a token pool."""
+    def __init__(self, max_requests):
+        self.max_requests = max_requests
+        self.spent = 0
+        self.lock = threading.Lock()
+
+    def spend(self):
+        with self.lock:
+            if self.spent >= self.max_requests:
+                raise BudgetExhausted(f"Request budget of {self.max_requests} is used up")
+            self.spent += 1
+
+    def remaining(self):
+        with self.lock:
+            return self.max_requests - self.spent
+
+
 class TokenPool:
     def __init__(self):
         self.tokens = [
             # INSERT YOUR GITHUB TOKEN STRING HERE.
         ]
+        # Or list them in RERUN_GITHUB_TOKENS, comma separated (any string works with actions_emulator).
+        self.tokens += [token for token in os.environ.get("RERUN_GITHUB_TOKENS", "").split(",") if token != ""]
         assert len(self.tokens) > 0, "You need to provide GitHub API token."
         self.ptr = 0
+        # Guard the token counters, the pool is shared by download threads.
+        self.lock = threading.RLock()
+        # Optional RequestBudget, checked before every request.
+        self.budget = None
         self.refresh_pool()
 
     def generate_headers(self, token):
@@ -31,37 +62,41 @@ class TokenPool:
         return headers
 
     def refresh_pool(self):
-        print("refreshing token counter")
-        self.counter = {}
-        for token in self.tokens:
-            headers = self.generate_headers(token)
-            html_response = requests.get(url="https://api.github.com/rate_limit", headers=headers)
-            html_response = json.loads(html_response.text)
-            remaining = html_response["resources"]["core"]["remaining"]
-            self.counter[token] = remaining
-            print(token, remaining)
-        # reset pointer to the current available token
-        while self.counter[self.tokens[self.ptr]] == 0:
-            self.ptr += 1
-            self.ptr %= len(self.tokens)
-        print("resetting token pointer to", self.ptr)
+        with self.lock:
+            print("refreshing token counter")
+            self.counter = {}
+            for token in self.tokens:
+                headers = self.generate_headers(token)
+                html_response = requests.get(url=local_const.RATE_LIMIT_URL, headers=headers)
+                html_response = json.loads(html_response.text)
+                remaining = html_response["resources"]["core"]["remaining"]
+                self.counter[token] = remaining
+                print(token, remaining)
+            # reset pointer to the current available token
+            while self.counter[self.tokens[self.ptr]] == 0:
+                self.ptr += 1
+                self.ptr %= len(self.tokens)
+            print("resetting token pointer to", self.ptr)
 
     def get_next_token(self):
-        if self.counter[self.tokens[self.ptr]] == 0:
-            self.refresh_pool()
-
-        token = self.tokens[self.ptr]
-        print("using token", token, self.counter[token])
-        headers = self.generate_headers(token)
-        # update token count
-        self.counter[token] -= 1
+        with self.lock:
+            if self.budget is not None:
+                self.budget.spend()
+            if self.counter[self.tokens[self.ptr]] == 0:
+                self.refresh_pool()
+
+            token = self.tokens[self.ptr]
+            print("using token", token, self.counter[token])
+            headers = self.generate_headers(token)
+            # update token count
+            self.counter[token] -= 1
 
-        return headers
+            return headers
 
     def check_limits(self):
         for t in self.tokens:
             headers = self.generate_headers(t)
-            html_response = requests.get(url="https://api.github.com/rate_limit", headers=headers)
+            html_response = requests.get(url=local_const.RATE_LIMIT_URL, headers=headers)
             html_response = json.loads(html_response.text)
             print(html_response["resources"]["core"])
         pass
@@ -83,6 +118,29 @@ def query_info(mytokenpool, myurl):
     return info
 
 
+def query_info_conditional(mytokenpool, myurl, etag=None):
+    """query_info with an ETag, returns (info, etag) and info is None if unchanged.
+
+    GitHub does not count 304 Not Modified responses against the rate limit.
+    """
+    headers = mytokenpool.get_next_token()
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    html_response = requests.get(url=myurl, headers=headers)
+    while html_response.status_code in [403, 429]:
+        print("API rate limit exceeded, sleep for 60s")
+        print("current time:", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        time.sleep(60)
+        mytokenpool.refresh_pool()
+        headers = mytokenpool.get_next_token()
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        html_response = requests.get(url=myurl, headers=headers)
+    if html_response.status_code == 304:
+        return None, etag
+    return json.loads(html_response.text), html_response.headers.get("ETag")
+
+
 def query_binary(mytokenpool, myurl):
     headers = mytokenpool.get_next_token()
     html_response = requests.get(url=myurl, headers=headers)
@@ -102,7 +160,7 @@ def query_binary(mytokenpool, myurl):
 
 def post(mytokenpool, myurl):
     headers = mytokenpool.get_next_token()
-    requests.post(url=myurl, headers=headers)
+    return requests.post(url=myurl, headers=headers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""Wheel cache shared by the local reruns of builds started around the same date.
+
+Builds are grouped in buckets of local_const.WHEEL_CACHE_BUCKET_DAYS days by run_started_at, and
+deps are resolved with `exclude-newer` at the start of the bucket, so adjacent builds and every
+order of a build resolve to the same versions. After a job installs its deps, the wheels of what
+it resolved (`uv pip freeze`) are saved in the wheelhouse of (project, bucket), and the lock is
+kept under its hash. Later jobs of the bucket install from the wheelhouse alone, which stands in
+for the package index (`--find-links` without index, works offline), and fall back to the index
+if a wheel is missing. Jobs whose deps do not resolve at the bucket start install as of their
+build start, outside of the wheelhouse. All jobs also share one uv cache.
+
+Layout: local_const.WHEEL_CACHE_DIR/
+    uv_cache/
+    {project}/{bucket}/wheels/*.whl
+    {project}/{bucket}/locks/{lock_hash}.txt
+"""
+
+import datetime
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from typing import List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import local_utils
+import process_runner
+
+
+def get_bucket_start(run_started_at: str, bucket_days: int=local_const.WHEEL_CACHE_BUCKET_DAYS) -> str:
+    """Start of the bucket of days holding run_started_at, or run_started_at itself for 0 days."""
+    if bucket_days <= 0:
+        return run_started_at
+    started_at = local_utils.timestring_to_timestamp(run_started_at)
+    epoch_days = (started_at - datetime.datetime(1970, 1, 1)).days
+    bucket_start = datetime.datetime(1970, 1, 1) + datetime.timedelta(days=epoch_days - epoch_days % bucket_days)
+    return bucket_start.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_lock_lines(freeze: str) -> List[str]:
+    """Pinned requirements of `uv pip freeze`, without packages installed from local paths (the project itself)."""
+    lines = []
+    for line in freeze.splitlines():
+        line = line.strip()
+        if line == "" or line.startswith(("#", "-e ")) or " @ " in line:
+            continue
+        lines.append(line)
+    return sorted(lines, key=str.lower)
+
+
+class WheelCache:
+    def __init__(self, project: str, bucket_start: str, root: str=local_const.WHEEL_CACHE_DIR) -> None:
+        self.root = root
+        self.bucket_dir = os.path.join(root, project, bucket_start.replace(":", "-"))
+        self.wheel_dir = os.path.join(self.bucket_dir, "wheels")
+        self.lock_dir = os.path.join(self.bucket_dir, "locks")
+
+    def has_wheels(self) -> bool:
+        return os.path.isdir(self.lock_dir) and len(os.listdir(self.lock_dir)) > 0
+
+    def get_shared_env(self) -> dict:
+        """Environment sharing the uv cache between jobs."""
+        return {
+            "UV_CACHE_DIR": os.path.join(self.root, "uv_cache"),
+            # Venvs are deleted after each job, copy files out of the cache instead of linking them.
+            "UV_LINK_MODE": "copy",
+        }
+
+    def get_offline_env(self) -> dict:
+        """Environment installing from the wheelhouse only, with uv and pip."""
+        return {
+            "UV_FIND_LINKS": self.wheel_dir,
+            "UV_NO_INDEX": "1",
+            "UV_OFFLINE": "1",
+            "PIP_FIND_LINKS": self.wheel_dir,
+            "PIP_NO_INDEX": "1",
+        }
+
+    def save(self, env: dict, cwd: str) -> str:
+        """Add the wheels of the venv of env to the wheelhouse, unless its lock is known, return the lock hash."""
+        freeze = process_runner.run(["uv", "pip", "freeze"], cwd=cwd, env=env).stdout
+        lock_lines = get_lock_lines(freeze)
+        lock = "\n".join(lock_lines) + "\n"
+        lock_hash = hashlib.sha256(lock.encode("utf-8")).hexdigest()[:16]
+        lock_file = os.path.join(self.lock_dir, f"{lock_hash}.txt")
+        if os.path.exists(lock_file):
+            return lock_hash
+        os.makedirs(self.wheel_dir, exist_ok=True)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.bucket_dir) as tmp_dir:
+            requirements_file = os.path.join(tmp_dir, "requirements.txt")
+            with open(requirements_file, "w") as f:
+                f.write(lock)
+            build_dir = os.path.join(tmp_dir, "wheels")
+            # Pinned versions, the wheels already in the wheelhouse are not downloaded again.
+            process_runner.run(
+                ["python", "-m", "pip", "wheel", "--no-deps", "--find-links", self.wheel_dir, "-r", requirements_file, "-w", build_dir],
+                cwd=cwd, env=env)
+            for name in os.listdir(build_dir):
+                if not os.path.exists(os.path.join(self.wheel_dir, name)):
+                    # Move each wheel in at once, jobs installing from the wheelhouse never see partial files.
+                    os.replace(os.path.join(build_dir, name), os.path.join(self.wheel_dir, name))
+            shutil.copy(requirements_file, lock_file + ".tmp")
+            os.replace(lock_file + ".tmp", lock_file)
+        return lock_hash
@@ -0,0 +1,100 @@
+"""Keep one partial clone of each fork across sessions, and reset it cheaply between builds.
+
+The fork is cloned once with `--filter=blob:none`, so only the blobs of checked-out commits
+are downloaded. Upstream is added as a second promisor remote and its fork branch is fetched
+(also without blobs) once per session, or again when the last fetch is older than
+local_const.UPSTREAM_FETCH_MAX_AGE. Resetting for the next build only moves the branch and HEAD
+to upstream, without checking files out: worktree_sync then replaces the files with the build
+snapshot and `git add` records them.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import List
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import local_const
+import process_runner
+
+FETCH_STAMP_FILE = "rerun_upstream_fetched_at"
+
+# Workspaces fetched from upstream in this process.
+FETCHED = set()
+FETCH_LOCK = threading.Lock()
+
+
+def git(repo_dir: str, args: List[str], check: bool=True) -> subprocess.CompletedProcess:
+    return process_runner.run(["git"] + args, cwd=repo_dir, check=check)
+
+
+class Workspace:
+    def __init__(self, codebase_dir: str, fork_clone_url: str, origin_clone_url: str=None) -> None:
+        """
+        codebase_dir: folder of the clone
+        origin_clone_url: upstream repository, None for forks that are never reset to upstream
+        """
+        self.codebase_dir = codebase_dir
+        self.fork_clone_url = fork_clone_url
+        self.origin_clone_url = origin_clone_url
+
+    def has_clone(self) -> bool:
+        if not os.path.isdir(os.path.join(self.codebase_dir, ".git")):
+            return False
+        remote = git(self.codebase_dir, ["remote", "get-url", "origin"], check=False)
+        return remote.returncode == 0 and remote.stdout.strip() == self.fork_clone_url
+
+    def ensure_clone(self) -> None:
+        """Clone the fork without blobs, or bring an existing clone up to date with the fork."""
+        if self.has_clone():
+            print(f"[workspace] Reusing {self.codebase_dir}")
+            # Drop the files of the last build of the previous session.
+            git(self.codebase_dir, ["reset", "-q", "--hard"])
+            git(self.codebase_dir, ["clean", "-fdq"])
+            git(self.codebase_dir, ["fetch", "--prune", "origin"])
+            return
+        if os.path.exists(self.codebase_dir):
+            process_runner.remove(self.codebase_dir)
+        os.makedirs(os.path.dirname(self.codebase_dir), exist_ok=True)
+        print(f"[workspace] Cloning {self.fork_clone_url} without blobs")
+        process_runner.run(["git", "clone", "--filter=blob:none", self.fork_clone_url, self.codebase_dir], capture=False)
+
+    def ensure_upstream(self) -> None:
+        if git(self.codebase_dir, ["remote", "get-url", "upstream"], check=False).returncode != 0:
+            git(self.codebase_dir, ["remote", "add", "upstream", self.origin_clone_url])
+            # Blobs missing from the partial clone may be fetched lazily from upstream too.
+            git(self.codebase_dir, ["config", "remote.upstream.promisor", "true"])
+            git(self.codebase_dir, ["config", "remote.upstream.partialclonefilter", "blob:none"])
+
+    def get_fetch_stamp_file(self) -> str:
+        git_dir = git(self.codebase_dir, ["rev-parse", "--path-format=absolute", "--git-common-dir"]).stdout.strip()
+        return os.path.join(git_dir, FETCH_STAMP_FILE)
+
+    def is_upstream_stale(self, max_age: float) -> bool:
+        stamp_file = self.get_fetch_stamp_file()
+        return self.codebase_dir not in FETCHED or not os.path.exists(stamp_file) or time.time() - os.path.getmtime(stamp_file) > max_age
+
+    def fetch_upstream(self, branch: str, max_age: float=local_const.UPSTREAM_FETCH_MAX_AGE, force: bool=False) -> None:
+        """Fetch the branch from upstream, if not fetched yet in this session or if stale."""
+        with FETCH_LOCK:
+            if not force and not self.is_upstream_stale(max_age):
+                return
+            self.ensure_upstream()
+            print(f"[workspace] Fetching upstream/{branch}")
+            git(self.codebase_dir, ["fetch", "--filter=blob:none", "upstream", f"+refs/heads/{branch}:refs/remotes/upstream/{branch}"])
+            with open(self.get_fetch_stamp_file(), "w") as f:
+                f.write(str(time.time()))
+            FETCHED.add(self.codebase_dir)
+
+    def reset_to_upstream(self, branch: str) -> None:
+        """Point branch and HEAD at upstream/branch, leaving the files and the index as they are."""
+        self.fetch_upstream(branch)
+        git(self.codebase_dir, ["update-ref", f"refs/heads/{branch}", f"refs/remotes/upstream/{branch}"])
+        git(self.codebase_dir, ["symbolic-ref", "HEAD", f"refs/heads/{branch}"])
@@ -0,0 +1,85 @@
+"""A pool of git worktrees of a fork codebase, to prepare build commits in parallel.
+
+Each worktree holds the files of the last build it prepared, so preparing the next build only
+writes the files that differ (see worktree_sync). Worktrees are added with `--no-checkout` and
+stay on a detached HEAD; the commit of a build is kept under refs/rerun/{run_id} until pushed.
+"""
+
+import os
+import queue
+import shutil
+import sys
+from typing import Dict, List, Optional
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import process_runner
+import worktree_sync
+
+
+def git(repo_dir: str, args: List[str]) -> str:
+    return process_runner.git(repo_dir, args)
+
+
+class WorktreePool:
+    def __init__(self, repo_dir: str, pool_dir: str, size: int) -> None:
+        self.repo_dir = repo_dir
+        self.pool_dir = pool_dir
+        self.free = queue.Queue()
+        os.makedirs(pool_dir, exist_ok=True)
+        # Drop worktrees whose folders were deleted.
+        git(repo_dir, ["worktree", "prune"])
+        for i in range(size):
+            path = os.path.join(pool_dir, str(i))
+            if not os.path.exists(os.path.join(path, ".git")):
+                git(repo_dir, ["worktree", "add", "--force", "--detach", "--no-checkout", path, "HEAD"])
+            self.free.put(path)
+
+    def acquire(self) -> str:
+        return self.free.get()
+
+    def release(self, path: str) -> None:
+        self.free.put(path)
+
+    def remove(self) -> None:
+        while not self.free.empty():
+            git(self.repo_dir, ["worktree", "remove", "--force", self.free.get()])
+        shutil.rmtree(self.pool_dir, ignore_errors=True)
+
+
+def commit_in_worktree(
+        worktree_dir: str,
+        zip_file: str,
+        parent: str,
+        ref: str,
+        message: str,
+        overlay_files: Optional[Dict[str, str]]=None,
+        overlay_contents: Optional[Dict[str, bytes]]=None,
+        removed_dirs: Optional[List[str]]=None,
+        ) -> str:
+    """Commit a repo zip on top of parent in a worktree as ref, return the commit sha.
+
+    Same arguments as fast_import_commit.commit_zip_snapshot.
+    """
+    overlay_files = overlay_files if overlay_files is not None else {}
+    overlay_contents = overlay_contents if overlay_contents is not None else {}
+    removed_dirs = removed_dirs if removed_dirs is not None else [".github/workflows"]
+    git(worktree_dir, ["reset", "-q", "--soft", parent])
+    worktree_sync.sync_zip_to_worktree(zip_file, worktree_dir)
+    for path in removed_dirs:
+        shutil.rmtree(os.path.join(worktree_dir, path), ignore_errors=True)
+    for path, local_path in overlay_files.items():
+        os.makedirs(os.path.dirname(os.path.join(worktree_dir, path)), exist_ok=True)
+        shutil.copy(local_path, os.path.join(worktree_dir, path))
+    for path, content in overlay_contents.items():
+        with open(os.path.join(worktree_dir, path), "wb") as f:
+            f.write(content)
+    git(worktree_dir, ["add", "-A", "."])
+    git(worktree_dir, ["commit", "-q", "--no-verify", "--allow-empty", "-m", message])
+    commit_sha = git(worktree_dir, ["rev-parse", "HEAD"])
+    git(worktree_dir, ["update-ref", ref, commit_sha])
+    return commit_sha
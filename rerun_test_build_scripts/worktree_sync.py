@@ -0,0 +1,104 @@
+"""Sync a repo zip snapshot into a git worktree, touching only the files that differ."""
+
+import os
+import shutil
+import stat
+import sys
+import zipfile
+import zlib
+from typing import List, Optional
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import zip_diff
+
+
+def get_file_crc(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def is_same_file(path: str, info: zipfile.ZipInfo) -> bool:
+    """Compare a worktree file with a zip member by size, then by CRC32 from the central directory."""
+    if os.path.islink(path) or not os.path.isfile(path):
+        return False
+    if os.path.getsize(path) != info.file_size:
+        return False
+    return get_file_crc(path) == info.CRC
+
+
+def remove_path(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def sync_zip_to_worktree(zip_file: str, worktree_dir: str, keep: Optional[List[str]]=None) -> dict:
+    """Make worktree_dir hold exactly the files of a GitHub repo zip, except the top-level paths in keep (`.git` by default).
+
+    Members are streamed from the zip with their `{owner}-{project}-{sha7}/` prefix stripped,
+    files whose content already matches are left untouched, and stale paths are deleted.
+    """
+    keep = keep if keep is not None else [".git"]
+    stats = {"written": 0, "unchanged": 0, "deleted": 0}
+    zip_files, zip_dirs = set(), set()
+    with zipfile.ZipFile(zip_file, "r") as zip_ref:
+        for info in zip_ref.infolist():
+            path = zip_diff.strip_zip_prefix(info.filename).rstrip("/")
+            if path == "" or path.split("/")[0] in keep:
+                continue
+            dest = os.path.join(worktree_dir, path)
+            if info.is_dir():
+                zip_dirs.add(path)
+                if os.path.lexists(dest) and not os.path.isdir(dest):
+                    remove_path(dest)
+                os.makedirs(dest, exist_ok=True)
+                continue
+            zip_files.add(path)
+            # A file's parents are directories even if the zip has no entries for them.
+            parent = os.path.dirname(path)
+            while parent != "" and parent not in zip_dirs:
+                zip_dirs.add(parent)
+                parent = os.path.dirname(parent)
+            if is_same_file(dest, info):
+                stats["unchanged"] += 1
+            else:
+                if os.path.isdir(dest) or os.path.islink(dest):
+                    remove_path(dest)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with zip_ref.open(info) as src, open(dest, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                stats["written"] += 1
+            # Keep the executable bit of the snapshot when the zip records unix modes.
+            zip_mode = info.external_attr >> 16
+            if zip_mode and not stat.S_ISLNK(zip_mode):
+                file_mode = os.stat(dest).st_mode
+                if (file_mode ^ zip_mode) & 0o111:
+                    os.chmod(dest, (file_mode & ~0o111) | (zip_mode & 0o111))
+
+    # Delete everything the snapshot does not have.
+    for root, dirs, files in os.walk(worktree_dir, topdown=True):
+        rel_root = os.path.relpath(root, worktree_dir)
+        rel_root = "" if rel_root == "." else rel_root
+        if rel_root == "":
+            dirs[:] = [d for d in dirs if d not in keep]
+            files = [f for f in files if f not in keep]
+        for name in files:
+            rel_path = os.path.join(rel_root, name) if rel_root else name
+            if rel_path not in zip_files:
+                os.remove(os.path.join(root, name))
+                stats["deleted"] += 1
+        stale_dirs = [d for d in dirs if (os.path.join(rel_root, d) if rel_root else d) not in zip_dirs]
+        for name in stale_dirs:
+            remove_path(os.path.join(root, name))
+            stats["deleted"] += 1
+        dirs[:] = [d for d in dirs if d not in stale_dirs]
+    return stats
@@ -0,0 +1,106 @@
+"""Diff repository zip snapshots of builds by reading only the zip central directories."""
+
+import json
+import os
+import sys
+import zipfile
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+script_dir = os.path.dirname(__file__)
+parent_dir = os.path.join(script_dir, "..", "")
+local_dir = os.path.join(script_dir, "..", "rerun_test_build_scripts")
+sys.path.append(parent_dir)
+sys.path.append(local_dir)
+
+import artifact_manifest
+import local_const
+
+ZIP_DIFF_FOLDER = "zip_diffs"
+
+
+def get_repo_zip_file(project: str, head_sha: str) -> str:
+    return os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, "repo_zips", project, f"{head_sha}.zip")
+
+
+def strip_zip_prefix(name: str) -> str:
+    """Strip the `{owner}-{project}-{sha7}/` folder GitHub zipballs put every file under."""
+    parts = name.split("/", 1)
+    return parts[1] if len(parts) == 2 else ""
+
+
+def read_zip_index(zip_file: str) -> Dict[str, Tuple[int, int]]:
+    """Map each file path in a repo zip to its (size, CRC32).
+
+    ZipFile only parses the central directory on open, so no member is decompressed.
+    """
+    index = {}
+    with zipfile.ZipFile(zip_file, "r") as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            path = strip_zip_prefix(info.filename)
+            if path == "":
+                continue
+            index[path] = (info.file_size, info.CRC)
+    return index
+
+
+def diff_zip_indexes(old_index: Dict[str, Tuple[int, int]], new_index: Dict[str, Tuple[int, int]]) -> Dict[str, List[str]]:
+    old_paths, new_paths = set(old_index), set(new_index)
+    return {
+        "added": sorted(new_paths - old_paths),
+        "removed": sorted(old_paths - new_paths),
+        "modified": sorted(path for path in old_paths & new_paths if old_index[path] != new_index[path]),
+    }
+
+
+def diff_zip_snapshots(old_zip_file: str, new_zip_file: str) -> Dict[str, List[str]]:
+    """Return added/removed/modified paths going from one repo zip to another."""
+    return diff_zip_indexes(read_zip_index(old_zip_file), read_zip_index(new_zip_file))
+
+
+def diff_project_build_sequence(project: str, dataset_file: str="lite_test_run_metadata.csv") -> List[dict]:
+    """Diff the repo zips of consecutive builds of a project, in the rerun order.
+
+    Diffs are cached per (previous sha, sha) pair, builds whose zip is missing are skipped.
+    """
+    df = pd.read_csv(os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, dataset_file))
+    df = df[df["project"] == project].sort_values(["run_started_at"], ascending=True)
+    save_folder = os.path.join(local_const.GLOBAL_RUN_DATASET_DIR, ZIP_DIFF_FOLDER, project)
+    os.makedirs(save_folder, exist_ok=True)
+
+    diffs = []
+    prev_sha, prev_index = None, None
+    for build in df.to_dict("records"):
+        head_sha = build["head_sha"]
+        zip_file = get_repo_zip_file(project, head_sha)
+        if head_sha == prev_sha or not os.path.exists(zip_file):
+            continue
+        index = None
+        if prev_sha is not None:
+            save_file = os.path.join(save_folder, f"{prev_sha}_{head_sha}.json")
+            if artifact_manifest.is_complete(save_file):
+                diff = json.load(open(save_file, "r"))
+            else:
+                # Reuse the index of the previous zip, so each zip is read once.
+                if prev_index is None:
+                    prev_index = read_zip_index(get_repo_zip_file(project, prev_sha))
+                index = read_zip_index(zip_file)
+                diff = diff_zip_indexes(prev_index, index)
+                artifact_manifest.atomic_write_json(save_file, diff)
+            diffs.append({"prev_sha": prev_sha, "head_sha": head_sha, "run_id": build["run_id"], **diff})
+        prev_sha, prev_index = head_sha, index
+    return diffs
+
+
+def runner_diff_build_snapshots(dataset_file: str="lite_test_run_metadata.csv") -> None:
+    project_meta = json.load(open("project_meta.json", "r"))
+    for project in project_meta.keys():
+        diffs = diff_project_build_sequence(project, dataset_file)
+        print(f"[zip-diff] {project}: {len(diffs)} snapshot diffs")
+
+
+if __name__ == "__main__":
+    runner_diff_build_snapshots()